@@ -29,6 +29,8 @@ mnemosyne.components = [\
           "SM2Mnemosyne"),
          ("mnemosyne.libmnemosyne.stopwatch",
           "Stopwatch"),
+         ("mnemosyne.libmnemosyne.clock",
+          "Clock"),
          ("mnemosyne.libmnemosyne.card_types.front_to_back",
           "FrontToBack"),
          ("mnemosyne.libmnemosyne.card_types.both_ways",
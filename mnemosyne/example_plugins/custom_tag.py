@@ -12,6 +12,7 @@ class CustomTag(Filter):
 
     tag_name = "my_tag"
     tag_program = ["/bin/cat", "--show-ends"]
+    has_side_effects = True
 
     """This plugin could run several times when a card is displayed,
     so we need to make sure that we run the program only once per card.
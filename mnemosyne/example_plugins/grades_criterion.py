@@ -5,6 +5,7 @@
 # The criterion itself.
 
 from mnemosyne.libmnemosyne.criterion import Criterion
+from mnemosyne.libmnemosyne.serialization import serialize, deserialize
 
 class GradesCriterion(Criterion):
 
@@ -20,10 +21,10 @@ class GradesCriterion(Criterion):
         card.active = (card.grade <= self.threshold)
 
     def data_to_string(self):
-        return repr(self.threshold)
+        return serialize(self.threshold)
 
     def set_data_from_string(self, data):
-        self.threshold = eval(data)
+        self.threshold = deserialize(data)
 
 
 # The criterion applier.
@@ -62,6 +62,8 @@ class Mnemosyne(Component):
           "DatabaseLogger"),
          ("mnemosyne.libmnemosyne.stopwatch",
           "Stopwatch"),
+         ("mnemosyne.libmnemosyne.clock",
+          "Clock"),
          ("mnemosyne.libmnemosyne.card_types.front_to_back",
           "FrontToBack"),
          ("mnemosyne.libmnemosyne.card_types.both_ways",
@@ -58,7 +58,9 @@ class MSided(CardType):
             card, card.fact.data, render_chain, **render_args)
         if "body_only" in render_args and render_args["body_only"] == True:
             return html  # Filters will be run later.
-        for filter in self.render_chain(render_chain)._filters:
+        renderer, filters, side_effects = \
+            self.render_chain(render_chain).pipeline_for_card_type(self)
+        for filter in filters:
             # EscapeToHtml introduces <br> inside css.
             if filter.__class__ != EscapeToHtml:
                 html = filter.run(html, card, fact_key=None, **render_args)
@@ -0,0 +1,77 @@
+#
+# clock.py <Peter.Bienstman@UGent.be>
+#
+
+import time
+import datetime
+
+from mnemosyne.libmnemosyne.component import Component
+
+
+class Clock(Component):
+
+    """Source of the current time for the scheduler, which also caches the
+    timezone offset, as looking it up involves 'time.localtime'.
+
+    The offset is cached for the local day containing the timestamp it was
+    looked up for, unless daylight savings time starts or ends on that day.
+    The cache is also dropped when the timezone changes, and the controller
+    calls 'invalidate' at the day rollover in 'heartbeat'.
+
+    Tests can register a subclass overriding 'time' as a fake clock.
+
+    """
+
+    component_type = "clock"
+
+    def __init__(self, component_manager):
+        Component.__init__(self, component_manager)
+        self.invalidate()
+
+    def time(self):
+        return time.time()
+
+    def invalidate(self):
+        # List of (valid_from, valid_until, offset) tuples. We keep two
+        # days, as e.g. 'adjusted_now' looks up the offset on the previous
+        # day before 'day_starts_at'.
+        self._offsets = []
+        self._timezone = (time.timezone, time.altzone, time.daylight)
+
+    def _uncached_offset_west_of_UTC(self, timestamp):
+        # As for when to use 'altzone' instead of 'timezone' if daylight
+        # savings time is active, this is a matter of big confusion
+        # among the Python developers themselves:
+        # http://bugs.python.org/issue7229
+        if time.localtime(timestamp).tm_isdst and time.daylight:
+            return time.altzone
+        else:
+            return time.timezone
+
+    def offset_west_of_UTC(self, timestamp=None):
+
+        """Returns 'time.altzone' if daylight savings time is active at
+        'timestamp', and 'time.timezone' otherwise.
+
+        """
+
+        if timestamp is None:
+            timestamp = self.time()
+        if self._timezone != (time.timezone, time.altzone, time.daylight):
+            self.invalidate()
+        for valid_from, valid_until, offset in self._offsets:
+            if valid_from <= timestamp < valid_until:
+                return offset
+        offset = self._uncached_offset_west_of_UTC(timestamp)
+        try:
+            date = datetime.date.fromtimestamp(timestamp)
+            valid_from = time.mktime(date.timetuple())
+            valid_until = time.mktime(\
+                (date + datetime.timedelta(days=1)).timetuple())
+        except (OverflowError, ValueError):
+            return offset
+        if self._uncached_offset_west_of_UTC(valid_from) == offset and \
+            self._uncached_offset_west_of_UTC(valid_until - 1) == offset:
+            self._offsets = self._offsets[-1:] + \
+                [(valid_from, valid_until, offset)]
+        return offset
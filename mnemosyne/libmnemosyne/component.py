@@ -7,7 +7,7 @@ class Component(object):
 
     """Base class of components that are registered with the component
     manager. This is a list of component types: config, log, database,
-    scheduler, stopwatch, translator, card_type, card_type_converter,
+    scheduler, stopwatch, clock, translator, card_type, card_type_converter,
     render_chain, renderer, filter, card_type_widget,
     generic_card_type_widget, ui_component, controller, main_widget,
     review_controller, review_widget, file format, plugin, hook,
@@ -106,6 +106,9 @@ class Component(object):
     def stopwatch(self):
         return self.component_manager.current("stopwatch")
 
+    def clock(self):
+        return self.component_manager.current("clock")
+
     def main_widget(self):
         return self.component_manager.current("main_widget")
 
@@ -15,6 +15,13 @@ class ComponentManager(object):
     at the same time, like schedule, database ... The idea is that the last
     one registered takes preference.
 
+    Resolving a (type, used_for) pair in 'all' can involve walking over the
+    class hierarchy, so the result is cached. The cache holds references to
+    the lists in 'self.components', so adding to or removing from one of
+    these lists in place is picked up automatically. Anything which changes
+    the structure of 'self.components' needs to go through 'register' or
+    'unregister', which bump 'generation' and clear the cache.
+
     """
 
     def __init__(self):
@@ -23,8 +30,15 @@ class ComponentManager(object):
         self.render_chain_with_id = {}
         self.study_mode_with_id = {}
         self.debug_file = None
+        self.generation = 0
+        self._resolved = {} # {(type, used_for): [component] or None}
+
+    def _invalidate(self):
+        self.generation += 1
+        self._resolved = {}
 
     def register(self, component):
+        self._invalidate()
         comp_type = component.component_type
         used_for = component.used_for
         if used_for not in self.components:
@@ -44,6 +58,7 @@ class ComponentManager(object):
             self.study_mode_with_id[component.id] = component
 
     def unregister(self, component):
+        self._invalidate()
         comp_type = component.component_type
         used_for = component.used_for
         self.components[used_for][comp_type].remove(component)
@@ -70,12 +85,24 @@ class ComponentManager(object):
 
         """For components for which there can be many active at once."""
 
+        try:
+            components = self._resolved[(comp_type, used_for)]
+        except KeyError:
+            components = self._resolve(comp_type, used_for)
+            self._resolved[(comp_type, used_for)] = components
+        # Don't hand out a shared list for a lookup without result, as the
+        # caller could modify it.
+        if components is None:
+            return []
+        return components
+
+    def _resolve(self, comp_type, used_for):
         # If 'used_for' is not a class, we can just retrieve it.
         if used_for == None or isinstance(used_for, str):
             try:
                 return self.components[used_for][comp_type]
             except:
-                return []
+                return None
         # Otherwise, we also take inheritance into account. First, we see
         # if there is a component registered for the exact type.
         try:
@@ -95,8 +122,8 @@ class ComponentManager(object):
                         try:
                             return self.components[key][comp_type]
                         except:
-                            return []
-                return []
+                            return None
+                return None
             else:
                 non_tuple_class_keys = \
                     [_key for _key in self.components.keys() if \
@@ -107,8 +134,8 @@ class ComponentManager(object):
                         try:
                             return self.components[key][comp_type]
                         except:
-                            return []
-                return []
+                            return None
+                return None
 
     def current(self, comp_type, used_for=None):
 
@@ -3,7 +3,6 @@
 #
 
 import os
-import re
 import sys
 import time
 import sqlite3
@@ -14,13 +13,13 @@ import textwrap
 from mnemosyne.libmnemosyne.translator import _
 from mnemosyne.libmnemosyne.component import Component
 from mnemosyne.libmnemosyne.schedulers.cramming import RANDOM
+from mnemosyne.libmnemosyne.serialization import serialize, deserialize
+from mnemosyne.libmnemosyne.serialization import is_serialized
 from mnemosyne.libmnemosyne.utils import rand_uuid, traceback_string
 
 HOUR = 60 * 60 # Seconds in an hour.
 DAY = 24 * HOUR # Seconds in a day.
 
-re_long_int = re.compile(r"\d+L")
-
 def config_py():
   config_py = textwrap.dedent(
   """  # Mnemosyne configuration file.
@@ -58,6 +57,12 @@ def config_py():
   # the possibility to skip this.
   backup_before_sync = True
 
+  # Set to True to use SQLite's write-ahead log. This allows e.g. the sync
+  # server, the web server and the statistics to read from the database in
+  # parallel with the reviews writing to it. Takes effect when the database
+  # is next opened.
+  wal_mode = False
+
   # Latex preamble. Note that for the pre- and postamble you need to use double
   # slashes instead of single slashes here, to have them escaped when Python
   # reads them in.
@@ -97,6 +102,9 @@ class Configuration(Component, dict):
         self.keys_to_sync = []
         self.server_only = False
         self.lock = threading.Lock()
+        # Bumped each time a setting changes, so that e.g. render chains can
+        # tell whether their cached output is still valid.
+        self.revision = 0
         self.determine_dirs()
 
     def activate(self):
@@ -146,6 +154,7 @@ class Configuration(Component, dict):
              "ui_language": "en",
              "max_backups": 10,
              "backup_before_sync": True,
+             "wal_mode": False,
              "check_for_edited_local_media_files": False,
              "interested_in_old_reps": True,
              "single_database_help_shown": False,
@@ -218,6 +227,7 @@ class Configuration(Component, dict):
                 if self.log().active:
                     self.log().edited_setting(key)
             dict.__setitem__(self, key, value)
+            self.revision += 1
 
     def load(self):
         filename = os.path.join(self.config_dir, "config.db")
@@ -234,31 +244,22 @@ class Configuration(Component, dict):
                     value text
                 );""")
                 con.commit()
-        # Quick-and-dirty system to allow us to instantiate GUI variables
-        # from the config db. The alternatives (e.g. having the frontend pass
-        # along modules to import) seem to be much more verbose and quirky.
-        try:
-            import PyQt5
-        except:
-            pass
-        try:
-            import PyQt5.QtCore
-        except:
-            pass
         # Set config settings.
+        needs_upgrade = False
         for cursor in con.execute("select key, value from config"):
-            # When importing Python 2 representations, strip the L
-            # from long integers.
-            value = re_long_int.sub(lambda x : x.group()[:-1], cursor[1])
+            if not is_serialized(cursor[1]):
+                needs_upgrade = True
             try:
-                self[cursor[0]] = eval(value)
+                self[cursor[0]] = deserialize(cursor[1])
             except Exception as e:
-                # This can fail if we are running headless now after running
-                # the GUI previously.
                 print(e)
         with self.lock:
             con.commit()
             con.close()
+        # Store the settings in the current format if they came from an
+        # older version.
+        if needs_upgrade:
+            self.save()
 
     def save(self):
         with self.lock:
@@ -267,10 +268,10 @@ class Configuration(Component, dict):
             # Make sure the entries exist.
             con.executemany\
                 ("insert or ignore into config(key, value) values(?,?)",
-                ((key, repr(value)) for key, value in self.items()))
+                ((key, serialize(value)) for key, value in self.items()))
             # Make sure they have the right data.
             con.executemany("update config set value=? where key=?",
-                ((repr(value), key) for key, value in self.items()))
+                ((serialize(value), key) for key, value in self.items()))
             con.commit()
             con.close()
 
@@ -362,6 +363,7 @@ class Configuration(Component, dict):
         # so we have to log a event here ourselves.
         if property_name in self.keys_to_sync:
             self.log().edited_setting(property_name)
+        self.revision += 1
         if property_name in ["background_colour", "alignment",
                              "hide_pronunciation_field"]:
             self[property_name][card_type.id] = property_value
@@ -410,6 +412,7 @@ class Configuration(Component, dict):
             "alignment", "hide_pronunciation_field"]:
             if card_type.id in self[property_name]:
                 del self[property_name][card_type.id]
+        self.revision += 1
 
     def machine_id(self):
         return open(os.path.join(self.config_dir, "machine.id")).\
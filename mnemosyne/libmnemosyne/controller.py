@@ -41,6 +41,10 @@ class Controller(Component):
             tag_names, check_for_duplicates=True, save=True):
         raise NotImplementedError
 
+    def create_new_cards_in_bulk(self, new_cards, check_for_duplicates=True,
+            save=True):
+        raise NotImplementedError
+
     def show_edit_card_dialog(self):
         raise NotImplementedError
 
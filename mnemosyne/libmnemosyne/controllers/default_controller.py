@@ -46,9 +46,12 @@ class DefaultController(Controller):
 
         """
 
+        # Backups are made in the background, so as not to block the GUI.
+        if self.database() and self.database().is_loaded():
+            self.database().finish_backup()
         if time.time() > self.next_rollover:
             if self.config().server_only:
-                self.database().backup()
+                self.database().backup(in_background=True)
                 self.log().dump_to_science_log()
             else:
                 self.flush_sync_server()
@@ -57,7 +60,7 @@ class DefaultController(Controller):
                     # Make sure we don't continue if e.g. the GUI or another
                     # thread holds the database.
                     return
-                self.database().backup()
+                self.database().backup(in_background=True)
                 self.log().saved_database()
                 self.log().loaded_database()
                 self.log().future_schedule()
@@ -66,6 +69,7 @@ class DefaultController(Controller):
                 self.log().activate()
                 self.config().save()
                 self.reset_study_mode()
+            self.clock().invalidate()
             self.next_rollover = self.database().start_of_day_n_days_ago(n=-1)
         if db_maintenance and \
            (time.time() > self.config()["last_db_maintenance"] + 90 * DAY):
@@ -238,6 +242,77 @@ class DefaultController(Controller):
             self.reset_study_mode()
         return cards
 
+    def create_new_cards_in_bulk(self, new_cards, check_for_duplicates=True,
+                                 save=True):
+
+        """Bulk version of 'create_new_cards', meant for importing.
+        'new_cards' is an iterable of (fact_data, card_type, grade, tag_names)
+        tuples. The facts and cards are added to the database in bulk, with
+        their log entries, and the database is saved only once at the end.
+
+        Since we can't ask the user about each duplicate here, facts with the
+        same unique fact data as an existing fact of the same card type, or
+        as an earlier fact in 'new_cards', are not added.
+
+        Returns a list with the sister cards created for each tuple, or None
+        for duplicates.
+
+        """
+
+        db = self.database()
+        result = []
+        facts = []
+        cards = []
+        cards_to_grade = []
+        unique_values_for_card_type_id = {}
+        tags_for_tag_names = {}
+        for fact_data, card_type, grade, tag_names in new_cards:
+            assert grade in [-1, 2, 3, 4, 5] # Use -1 for yet to learn cards.
+            assert card_type.is_fact_data_valid(fact_data)
+            if check_for_duplicates:
+                unique_values = unique_values_for_card_type_id.get(\
+                    card_type.id)
+                if unique_values is None:
+                    unique_values = db.unique_fact_values(card_type)
+                    unique_values_for_card_type_id[card_type.id] = \
+                        unique_values
+                if any(fact_data.get(fact_key) in unique_values[fact_key] \
+                    for fact_key in card_type.unique_fact_keys):
+                    result.append(None)
+                    continue
+                for fact_key in card_type.unique_fact_keys:
+                    if fact_key in fact_data:
+                        unique_values[fact_key].add(fact_data[fact_key])
+            tag_names = frozenset(tag_names)
+            tags = tags_for_tag_names.get(tag_names)
+            if tags is None:
+                tags = db.get_or_create_tags_with_names(\
+                    self._retain_only_child_tags(tag_names))
+                tags_for_tag_names[tag_names] = tags
+            fact = Fact(fact_data)
+            sister_cards = card_type.create_sister_cards(fact)
+            # Sister cards share their set of tags, like in
+            # 'create_new_cards', but cards from different facts don't.
+            tags = set(tags)
+            for card in sister_cards:
+                card.tags = tags
+            facts.append(fact)
+            cards.extend(sister_cards)
+            if grade >= 2:
+                cards_to_grade.append((sister_cards, grade))
+            result.append(sister_cards)
+        db.add_facts(facts)
+        db.add_cards(cards)
+        for sister_cards, grade in cards_to_grade:
+            self.scheduler().set_initial_grade(sister_cards, grade)
+            for card in sister_cards:
+                db.update_card(card, repetition_only=True)
+        if save:
+            db.save()
+        if self.review_controller().learning_ahead == True:
+            self.reset_study_mode()
+        return result
+
     def show_edit_card_dialog(self):
         self.stopwatch().pause()
         self.flush_sync_server()
@@ -340,6 +415,9 @@ class DefaultController(Controller):
                     self.review_controller().card = new_cards[0]
                 return 0
         else:
+            # Convert copies, as the cards are shared with the database's
+            # identity map and should not change if the user cancels.
+            cards_from_fact = [copy.copy(card) for card in cards_from_fact]
             for card in cards_from_fact:
                 card.card_type = new_card_type
                 card.fact = fact
@@ -441,6 +519,7 @@ _("This card has different tags than its sister cards. Update tags for current c
         w.set_progress_range(len(facts))
         w.set_progress_update_interval(len(facts)/50)
         for fact in facts:
+            old_fact_data = fact.data
             if correspondence:
                 new_fact_data = {}
                 for old_fact_key, new_fact_key in correspondence.items():
@@ -452,6 +531,10 @@ _("This card has different tags than its sister cards. Update tags for current c
                 new_fact_data = copy.copy(fact.data)
             result = self._change_card_type(fact, old_card_type,
                     new_card_type, correspondence, new_fact_data, warn)
+            if result in [-1, -2]:
+                # Don't leave unsaved changes behind in the fact object, as
+                # it can be shared with the database's identity map.
+                fact.data = old_fact_data
             if result == -1:  # Cancel.
                 w.close_progress()
                 return
@@ -633,7 +716,8 @@ _("It is recommended to put all your cards in a single database. Using tags to d
         data_dir = self.config().data_dir
         old_path = expand_path(self.config()["last_database"], data_dir)
         filename = self.main_widget().get_filename_to_open(path=old_path,
-            filter=_("Mnemosyne databases") + " (*%s)" % db.suffix)
+            filter=_("Mnemosyne databases") + " (*%s *%s.gz)" % \
+            (db.suffix, db.suffix))
         if not filename:
             self.stopwatch().unpause()
             return
@@ -647,7 +731,8 @@ _("'*.cards' files are not separate databases, but need to be imported in your c
             self.main_widget().show_information(\
                 _("The configuration database is not used to store cards."))
             return
-        if os.path.normpath(filename).startswith(\
+        # Backups are compressed, so they can only be restored, not opened.
+        if filename.endswith(".gz") or os.path.normpath(filename).startswith(\
             os.path.normpath(os.path.join(data_dir, "backups"))):
             result = self.main_widget().show_question(\
                 _("Do you want to replace your current database with one restored from this backup?\nNote that this will result in conflicts during the next sync, which need to be resolved by a full sync."),
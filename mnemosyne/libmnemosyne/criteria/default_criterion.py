@@ -3,6 +3,7 @@
 #
 
 from mnemosyne.libmnemosyne.criterion import Criterion
+from mnemosyne.libmnemosyne.serialization import serialize, deserialize
 
 
 class DefaultCriterion(Criterion):
@@ -88,17 +89,19 @@ class DefaultCriterion(Criterion):
                 (card_type.id, fact_view.id))
 
     def data_to_string(self):
-        return repr((self.deactivated_card_type_fact_view_ids,
-                     self._tag_ids_active,
-                     self._tag_ids_forbidden))
+        return serialize((self.deactivated_card_type_fact_view_ids,
+                          self._tag_ids_active,
+                          self._tag_ids_forbidden))
 
     def set_data_from_string(self, data_string):
-        data = eval(data_string)
+        data = deserialize(data_string)
         self.deactivated_card_type_fact_view_ids = data[0]
         self._tag_ids_active = data[1]
         self._tag_ids_forbidden = data[2]
 
     # To send the criteria across, we need to convert from _ids ids first.
+    # On the wire, we keep using Python literals, so as to stay compatible
+    # with older sync partners.
 
     def data_to_sync_string(self):
         active_tag_ids = set()
@@ -113,7 +116,7 @@ class DefaultCriterion(Criterion):
                      active_tag_ids, forbidden_tag_ids))
 
     def set_data_from_sync_string(self, data_string):
-        data = eval(data_string)
+        data = deserialize(data_string)
         self.deactivated_card_type_fact_view_ids = data[0]
         active_tag_ids = data[1]
         forbidden_tag_ids = data[2]
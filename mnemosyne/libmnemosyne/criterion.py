@@ -83,7 +83,7 @@ class Criterion(Component):
 
         """Convert variables to a string for storage in the database. We don't
         use pickle here as that would make it difficult for non-Python programs
-        to read the database.
+        to read the database. 'serialization.serialize' is a good choice.
 
         """
 
@@ -119,4 +119,7 @@ class CriterionApplier(Component):
     component_type = "criterion_applier"
 
     def apply_to_database(self, criterion):
+
+        """Returns the number of cards whose active state changed."""
+
         raise NotImplementedError
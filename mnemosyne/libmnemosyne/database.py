@@ -74,7 +74,10 @@ class Database(Component):
     def save(self, path=None):
         raise NotImplementedError
 
-    def backup(self):
+    def backup(self, in_background=False):
+        raise NotImplementedError
+
+    def finish_backup(self, wait=False):
         raise NotImplementedError
 
     def restore(self, path):
@@ -117,6 +120,24 @@ class Database(Component):
     def delete_tag(self, tag):
         raise NotImplementedError
 
+    def update_tags(self, tags):
+
+        """Bulk version of 'update_tag', meant to be implemented more
+        efficiently than calling 'update_tag' repeatedly.
+
+        """
+
+        raise NotImplementedError
+
+    def delete_tags(self, tags):
+
+        """Bulk version of 'delete_tag', meant to be implemented more
+        efficiently than calling 'delete_tag' repeatedly.
+
+        """
+
+        raise NotImplementedError
+
     def get_or_create_tag_with_name(self, name):
         raise NotImplementedError
 
@@ -137,9 +158,28 @@ class Database(Component):
     def add_fact(self, fact):
         raise NotImplementedError
 
+    def add_facts(self, facts):
+
+        """Bulk version of 'add_fact', meant to be implemented more
+        efficiently than calling 'add_fact' repeatedly.
+
+        """
+
+        raise NotImplementedError
+
     def fact(self, id, is_id_internal):
         raise NotImplementedError
 
+    def facts_with_ids(self, ids, is_id_internal):
+
+        """Returns an iterator over the facts with the given ids, in the same
+        order, skipping the ones which don't exist. Meant to be implemented
+        more efficiently than calling 'fact' repeatedly.
+
+        """
+
+        raise NotImplementedError
+
     def update_fact(self, fact):
         raise NotImplementedError
 
@@ -154,9 +194,28 @@ class Database(Component):
     def add_card(self, card):
         raise NotImplementedError
 
+    def add_cards(self, cards):
+
+        """Bulk version of 'add_card', meant to be implemented more
+        efficiently than calling 'add_card' repeatedly.
+
+        """
+
+        raise NotImplementedError
+
     def card(self, id, is_id_internal):
         raise NotImplementedError
 
+    def cards_with_ids(self, ids, is_id_internal):
+
+        """Returns an iterator over the cards with the given ids, in the same
+        order, skipping the ones which don't exist. Meant to be implemented
+        more efficiently than calling 'card' repeatedly.
+
+        """
+
+        raise NotImplementedError
+
     def update_card(self, card, repetition_only=False):
         raise NotImplementedError
 
@@ -258,6 +317,16 @@ class Database(Component):
 
         raise NotImplementedError
 
+    def unique_fact_values(self, card_type):
+
+        """Return a dictionary with, for each of 'card_type.unique_fact_keys',
+        the set of values of that key in the facts of this card type. Allows
+        checking a large number of facts for duplicates at once.
+
+        """
+
+        raise NotImplementedError
+
     def card_types_in_use(self):
         raise NotImplementedError
 
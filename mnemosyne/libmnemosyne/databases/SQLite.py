@@ -4,9 +4,12 @@
 
 import os
 import sys
+import gzip
 import time
 import string
+import hashlib
 import datetime
+import threading
 import copy as objcopy
 
 from openSM2sync.log_entry import EventTypes
@@ -18,7 +21,8 @@ from mnemosyne.libmnemosyne.translator import _
 from mnemosyne.libmnemosyne.database import Database
 from mnemosyne.libmnemosyne.card_type import CardType
 from mnemosyne.libmnemosyne.fact_view import FactView
-from mnemosyne.libmnemosyne.utils import traceback_string, copy
+from mnemosyne.libmnemosyne.serialization import serialize, deserialize
+from mnemosyne.libmnemosyne.utils import traceback_string, copy, copyfileobj
 from mnemosyne.libmnemosyne.utils import expand_path, contract_path
 from mnemosyne.libmnemosyne.utils import numeric_string_cmp_key, mangle
 
@@ -76,6 +80,18 @@ $pregenerated_data
     create index i_cards_2 on cards (fact_view_id); /* for card type tree */
     create index i_cards_3 on cards (_fact_id); /* for cards_from_fact */
 
+    /* Indexes for the scheduler queries. Their 'where' clauses need to
+    match those of the queries literally. The index on 'next_rep - last_rep'
+    stores the interval of each card, such that the cards due for a
+    retention rep can be read in order of increasing interval, without
+    sorting all of them. */
+
+    create index i_cards_due on cards (next_rep, last_rep, _fact_id)
+        where active=1 and grade>=2;
+    create index i_cards_interval on cards (next_rep - last_rep, next_rep,
+        _fact_id) where active=1 and grade>=2;
+    create index i_cards_grade on cards (grade, active);
+
     create table tags(
         _id integer primary key,
         id text,
@@ -201,12 +217,14 @@ pregenerated_data = """
 
 from mnemosyne.libmnemosyne.databases.SQLite_sync import SQLiteSync
 from mnemosyne.libmnemosyne.databases.SQLite_media import SQLiteMedia
+from mnemosyne.libmnemosyne.databases.SQLite_search import SQLiteSearch
 from mnemosyne.libmnemosyne.databases.SQLite_logging import SQLiteLogging
 from mnemosyne.libmnemosyne.databases.SQLite_statistics import SQLiteStatistics
+from mnemosyne.libmnemosyne.databases.identity_map import IdentityMap
 
 
 class SQLite(Database, SQLiteSync, SQLiteMedia, SQLiteLogging,
-             SQLiteStatistics):
+             SQLiteStatistics, SQLiteSearch):
 
     """Note that most of the time, commiting is done elsewhere, e.g. by
     calling save in the main controller, in order to have a better control
@@ -218,16 +236,25 @@ class SQLite(Database, SQLiteSync, SQLiteMedia, SQLiteLogging,
     mobile device which does not need this, this can be set to 'False' to save
     resources.
 
+    Cards, facts and tags are kept in a bounded identity map, such that
+    looking up the same object several times (e.g. during a single
+    repetition) returns the same live object without hitting SQL. All
+    functions below which modify these objects, either through the object
+    layer or directly through SQL, need to keep these caches coherent.
+
     """
 
-    version = "4"
+    version = "5"
     suffix = ".db"
     store_pregenerated_data = True
+    object_cache_size = 1000
 
     def __init__(self, component_manager):
         Database.__init__(self, component_manager)
         self._connection = None
         self._path = None # Needed for lazy creation of connection.
+        self._backup_thread = None
+        self._backup_result = None
         self._current_criterion = None # Cached for performance reasons.
         # Some operations have side-effects which cause additional log events,
         # like in _process_media, or when updating criteria as side effects of
@@ -240,6 +267,18 @@ class SQLite(Database, SQLiteSync, SQLiteMedia, SQLiteLogging,
         # effects to be disabled/enabled.
         self.importing = False
         self.importing_with_learning_data = False
+        self._card_cache = IdentityMap(self.object_cache_size)
+        self._fact_cache = IdentityMap(self.object_cache_size)
+        self._tag_cache = IdentityMap(self.object_cache_size)
+
+    def clear_object_caches(self):
+        self._card_cache.clear()
+        self._fact_cache.clear()
+        self._tag_cache.clear()
+
+    def object_cache_hits(self):
+        return self._card_cache.hits + self._fact_cache.hits + \
+            self._tag_cache.hits
 
     #
     # File operations.
@@ -257,10 +296,23 @@ class SQLite(Database, SQLiteSync, SQLiteMedia, SQLiteLogging,
             #self._connection = _APSW(self.component_manager, self._path)
         return self._connection
 
+    @property
+    def read_con(self):
+
+        """Connection for queries which don't modify the database. In WAL
+        mode, threads other than the one which owns 'con' get a read-only
+        connection of their own, so that they don't need to take over 'con'.
+
+        """
+
+        if not self._connection:
+            return self.con
+        return self._connection.reader()
+
     def release_connection(self):
 
         """Release the connection, so that it may be recreated in a separate
-        thread.
+        thread. Not needed for threads which only use 'read_con' in WAL mode.
 
         """
 
@@ -291,22 +343,18 @@ class SQLite(Database, SQLiteSync, SQLiteMedia, SQLiteLogging,
         # Make sure the "Untagged" tag does not show up together with
         # different tags (not sure if bug causing this has been fixed).
         untagged = self.tag("__UNTAGGED__", is_id_internal=False)
-        for cursor in self.con.execute("select _id from cards"):
-            _card_id = cursor[0]
-            _tag_ids = [cursor2[0] for cursor2 in self.con.execute(\
-                "select _tag_id from tags_for_card where _card_id=?",
-                (_card_id, ))]
-            if len(_tag_ids) > 1 and untagged._id in _tag_ids:
-                self.con.execute(\
-                    "delete from tags_for_card where _card_id=? and _tag_id=?",
-                    (_card_id, untagged._id))
+        self.con.execute("""delete from tags_for_card where _tag_id=? and
+            _card_id in (select _card_id from tags_for_card where _tag_id<>?)""",
+            (untagged._id, untagged._id))
         # Make sure no orphaned card tags exist (not sure if bug causing
         # this has been fixed).
         self.con.execute("delete from tags_for_card where _card_id is null")
+        self._card_cache.clear()
         self.main_widget().close_progress()
 
     def new(self, path):
         self.unload()
+        self.clear_object_caches()
         self._path = expand_path(path, self.config().data_dir)
         if os.path.exists(self._path):
             os.remove(self._path)
@@ -318,6 +366,7 @@ class SQLite(Database, SQLiteSync, SQLiteMedia, SQLiteLogging,
         else:
             self.con.executescript(\
                 SCHEMA.substitute(pregenerated_data=""))
+        self.create_search_index_if_needed()
         self.con.execute(\
             "insert into global_variables(key, value) values(?,?)",
             ("version", self.version))
@@ -342,6 +391,7 @@ class SQLite(Database, SQLiteSync, SQLiteMedia, SQLiteLogging,
     def load(self, path):
         if self.is_loaded():
             self.unload()
+        self.clear_object_caches()
         self._path = expand_path(path, self.config().data_dir)
         if not os.path.exists(self._path):
             return self.new(path)
@@ -363,12 +413,25 @@ class SQLite(Database, SQLiteSync, SQLiteMedia, SQLiteLogging,
                     from mnemosyne.libmnemosyne.upgrades.upgrade2 \
                         import Upgrade2
                     Upgrade2(self.component_manager).run()
+                if previous_version <= 4:
+                    from mnemosyne.libmnemosyne.upgrades.upgrade5 \
+                        import Upgrade5
+                    Upgrade5(self.component_manager).run()
             except:
                 raise RuntimeError(_("Database upgrade failed."))
         self.create_media_dir_if_needed()
         # Upgrade.
         self.con.execute("""create index if not exists
             i_cards_3 on cards (_fact_id);""")
+        self.con.execute("""create index if not exists
+            i_cards_due on cards (next_rep, last_rep, _fact_id)
+            where active=1 and grade>=2;""")
+        self.con.execute("""create index if not exists
+            i_cards_interval on cards (next_rep - last_rep, next_rep,
+            _fact_id) where active=1 and grade>=2;""")
+        self.con.execute("""create index if not exists
+            i_cards_grade on cards (grade, active);""")
+        self.create_search_index_if_needed()
         # Activate all the plugins needed for all the card types.
         # Sometimes corruption keeps the global_variables table intact,
         # but not the cards table...
@@ -413,41 +476,126 @@ class SQLite(Database, SQLiteSync, SQLiteMedia, SQLiteLogging,
                 if ctypes.windll.kernel32.GetDriveTypeW("%s\\" % drive) == 4:
                     raise RuntimeError(\
 _("Putting a database on a network drive is forbidden under Windows to avoid data corruption."))
-            copy(self._path, dest_path)
+            # Copying the file would miss what is still in the write-ahead
+            # log in WAL mode.
+            self.con.backup(dest_path, self.backup_pages_per_step)
             self._path = dest_path
         self.config()["last_database"] \
             = contract_path(path, self.config().data_dir)
         # We don't log every save, as that could result in an event after
         # card repetitions.
 
-    def backup(self):
+    # Number of pages copied in each step of an online backup, and the time
+    # a background backup sleeps in between steps. In the meantime, other
+    # connections can access the database.
+    backup_pages_per_step = 1024
+    backup_pause = 0.01
+
+    def backup(self, in_background=False):
+
+        """Create a backup through SQLite's online backup API, which copies
+        the database in steps and also picks up data which is still in the
+        write-ahead log. Backups are compressed, and their name contains a
+        hash of the uncompressed contents, so that we can return the latest
+        backup instead of creating an identical one.
+
+        If 'in_background' is set, the copy is made by a worker thread and
+        None is returned. The backup is completed by 'finish_backup'.
+
+        """
+
         self.save()
+        self.finish_backup(wait=True)
         if self.config()["max_backups"] == 0:
-            return
+            return None
         backupdir = os.path.join(self.config().data_dir, "backups")
         db_name = os.path.basename(self._path).rsplit(".", 1)[0]
-        try:
-            backupfile = db_name + "-" + \
-                datetime.datetime.today().strftime("%Y%m%d-%H%M%S.db")
-        except:  # Work around strange Android library bug.
-            from mnemosyne.libmnemosyne.utils import rand_uuid
-            backupfile = db_name + "-" + rand_uuid() + ".db"
-        backupfile = os.path.join(backupdir, backupfile)
+        files = sorted(f for f in os.listdir(backupdir) \
+            if f.startswith(db_name + "-"))
+        if not in_background:
+            return self._complete_backup(backupdir, files,
+                *self._write_backup(self.con, backupdir, db_name, files))
+        con = self.con
+
+        def run():
+            self._backup_result = (backupdir, files) + self._write_backup(\
+                con, backupdir, db_name, files, self.backup_pause)
+
+        self._backup_result = None
+        self._backup_thread = threading.Thread(target=run)
+        self._backup_thread.start()
+        return None
+
+    def finish_backup(self, wait=False):
+
+        """Complete a backup which was started in the background, if its
+        worker thread is done or if 'wait' is set. Returns the name of the
+        backup, or None if there is none or it's still being made.
+
+        """
+
+        thread = self._backup_thread
+        if thread is None or (thread.is_alive() and not wait):
+            return None
+        thread.join()
+        self._backup_thread = None
+        if self._backup_result is None:
+            return None
+        return self._complete_backup(*self._backup_result)
+
+    def _write_backup(self, con, backupdir, db_name, files, pause=None):
+
+        """Copy 'con' to a compressed backup. The copy is read only once,
+        to calculate the hash and to compress it at the same time. Since
+        this can run in a worker thread, it only touches the file system.
+
+        """
+
+        tmp_file = os.path.join(backupdir, db_name + ".tmp")
+        tmp_gz_file = tmp_file + ".gz"
+        backupfile = tmp_file
+        is_new = True
         failed = False
         try:
-            copy(self._path, backupfile)
+            con.backup(tmp_file, self.backup_pages_per_step, pause)
+            sha1 = hashlib.sha1()
+            with open(tmp_file, "rb") as source, \
+                gzip.open(tmp_gz_file, "wb", compresslevel=1) as dest:
+                for buf in iter(lambda: source.read(1024 * 1024), b""):
+                    sha1.update(buf)
+                    dest.write(buf)
+            suffix = "-" + sha1.hexdigest()[:12] + self.suffix + ".gz"
+            if files and files[-1].endswith(suffix):
+                backupfile = os.path.join(backupdir, files[-1])
+                is_new = False
+            else:
+                try:
+                    backupfile = db_name + "-" + datetime.datetime.today().\
+                        strftime("%Y%m%d-%H%M%S") + suffix
+                except:  # Work around strange Android library bug.
+                    from mnemosyne.libmnemosyne.utils import rand_uuid
+                    backupfile = db_name + "-" + rand_uuid() + suffix
+                backupfile = os.path.join(backupdir, backupfile)
+                os.replace(tmp_gz_file, backupfile)
         except:
             failed = True
+        for f in [tmp_file, tmp_gz_file]:
+            if os.path.exists(f):
+                os.remove(f)
+        return backupfile, is_new, failed
+
+    def _complete_backup(self, backupdir, files, backupfile, is_new, failed):
         if failed or not os.path.exists(backupfile) or \
           not os.stat(backupfile).st_size:
             self.main_widget().show_information(\
                 _("Warning: backup creation failed for") + " " +  backupfile)
             return None
+        if not is_new:
+            return backupfile
         for f in self.component_manager.all("hook", "after_backup"):
             f.run(backupfile)
         # Only keep the last logs.
-        files = [f for f in os.listdir(backupdir) \
-                if f.startswith(db_name + "-")]
+        files.append(os.path.basename(backupfile))
         files.sort()
         if len(files) > self.config()["max_backups"]:
             surplus = len(files) - self.config()["max_backups"]
@@ -459,7 +607,16 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
         self.abandon()
         db_path = expand_path(\
             self.config()["last_database"], self.config().data_dir)
-        copy(path, db_path)
+        # Don't let a stale write-ahead log get applied to the backup.
+        for extension in ["-wal", "-shm"]:
+            if os.path.exists(db_path + extension):
+                os.remove(db_path + extension)
+        if path.endswith(".gz"):
+            with gzip.open(path, "rb") as source, \
+                open(db_path, "wb") as dest:
+                copyfileobj(source, dest)
+        else:  # Older, uncompressed backup.
+            copy(path, db_path)
         self.load(db_path)
         # We need to indicate that a full sync needs to happen on the next
         # sync. Unfortunately, we can't do anything about the logs that have
@@ -488,13 +645,16 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
         finally:
             self._connection = None
             self._path = None
+            self.clear_object_caches()
         return True
 
     def abandon(self):
+        self.finish_backup(wait=True)
         if self._connection:
             self._connection.close()
         self._connection = None
         self._path = None
+        self.clear_object_caches()
 
     def is_loaded(self):
         return self._connection is not None
@@ -519,18 +679,29 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
             EventTypes.ADDED_FACT_VIEW, EventTypes.ADDED_CARD_TYPE)).\
             fetchone()[0] == 0
 
-    def _repr_extra_data(self, extra_data):
-        # Use simply repr(), as pickle is overkill for a simple dictionary.
+    def _serialize_extra_data(self, extra_data):
         if extra_data == {}:
             return "" # Save space.
         else:
-            return repr(extra_data)
+            return serialize(extra_data)
 
     def _construct_extra_data(self, extra_data, obj):
         if extra_data == "":
             obj.extra_data = {}
         else:
-            obj.extra_data = eval(extra_data)
+            obj.extra_data = deserialize(extra_data)
+
+    # Maximum number of ids we put in a single 'in (...)' clause, to stay well
+    # clear of sqlite's limit on the number of host parameters.
+    max_batch_size = 500
+
+    def _batches(self, ids):
+        ids = list(ids)
+        for i in range(0, len(ids), self.max_batch_size):
+            yield ids[i:i + self.max_batch_size]
+
+    def _placeholders(self, ids):
+        return ",".join("?" * len(ids))
 
     #
     # Tags.
@@ -563,8 +734,9 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
         tag.name = tag.name.replace(",", " - ")
         self.con.execute("""insert into tags(name, extra_data, id)
             values(?,?,?)""", (tag.name,
-            self._repr_extra_data(tag.extra_data), tag.id))
+            self._serialize_extra_data(tag.extra_data), tag.id))
         tag._id = self.con.last_insert_rowid()
+        self._tag_cache.put(tag)
         # No need to log creation of the __UNTAGGED__ tag during sync, nor the
         # adding of this tag to the default criterion. Each client will have
         # done so automatically.
@@ -627,6 +799,9 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
         # save some time.
 
     def tag(self, id, is_id_internal):
+        tag = self._tag_cache.get(id, is_id_internal)
+        if tag is not None:
+            return tag
         if is_id_internal:
             sql_res = self.con.execute("""select _id, id, name, extra_data
                 from tags where _id=?""", (id, )).fetchone()
@@ -636,10 +811,14 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
         tag = Tag(sql_res[2], sql_res[1])
         tag._id = sql_res[0]
         self._construct_extra_data(sql_res[3], tag)
+        self._tag_cache.put(tag)
         return tag
 
     def update_tag(self, tag):
         self.log().edited_tag(tag)
+        # Cached cards could refer to a stale copy of this tag.
+        self._tag_cache.discard_internal_id(tag._id)
+        self._card_cache.clear()
         # Corner case: change tag name into the name of an existing tag.
         new_name = tag.name
         stored_name = self.con.execute("select name from tags where _id=?",
@@ -677,35 +856,76 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
             return
         # Regular case.
         self.con.execute("""update tags set name=?, extra_data=? where
-            _id=?""", (tag.name, self._repr_extra_data(tag.extra_data),
+            _id=?""", (tag.name, self._serialize_extra_data(tag.extra_data),
              tag._id))
+        self._tag_cache.put(tag)
         if self.store_pregenerated_data:
             _card_ids_affected = [cursor[0] for cursor in self.con.execute(
                 "select _card_id from tags_for_card where _tag_id=?",
                 (tag._id, ))]
             self._update_tag_strings(_card_ids_affected)
 
+    def update_tags(self, tags):
+        # Tags which get the name of an existing tag need to be merged into
+        # that tag, which is left to 'update_tag'. The others are renamed
+        # here, and their cards get their tag strings updated in one go.
+        renamed_tags = []
+        for tag in tags:
+            stored_name = self.con.execute(\
+                "select name from tags where _id=?", (tag._id, )).fetchone()[0]
+            if tag.name != stored_name and self.con.execute("""select 1 from
+                tags where name=? limit 1""", (tag.name, )).fetchone() \
+                is not None:
+                self.update_tag(tag)
+                continue
+            self.con.execute("""update tags set name=?, extra_data=? where
+                _id=?""", (tag.name, self._serialize_extra_data(\
+                tag.extra_data), tag._id))
+            self._tag_cache.put(tag)
+            renamed_tags.append(tag)
+        if not renamed_tags:
+            return
+        self.log().edited_tags(renamed_tags)
+        # Cached cards could refer to a stale copy of these tags.
+        self._card_cache.clear()
+        if self.store_pregenerated_data:
+            self._update_tag_strings(\
+                self._card_ids_with_tags(renamed_tags))
+
+    def _card_ids_with_tags(self, tags):
+        _card_ids = set()
+        for batch in self._batches([tag._id for tag in tags]):
+            _card_ids.update(cursor[0] for cursor in self.con.execute(\
+                """select _card_id from tags_for_card where _tag_id in (%s)"""
+                % self._placeholders(batch), batch))
+        return _card_ids
+
     def _update_tag_strings(self, _card_ids):
         # To speed up the process, we don't construct the entire card object,
-        # but take shortcuts.
-        for _card_id in _card_ids:
-            tag_names = []
-            for cursor in self.con.execute("""select _tag_id from
-                tags_for_card where _card_id=?""", (_card_id, )):
-                tag_name = self.con.execute(\
-                    "select name from tags where _id=?",
-                    (cursor[0], )).fetchone()[0]
-                if tag_name != "__UNTAGGED__":
-                    tag_names.append(tag_name)
-            sorted_tag_names = sorted(tag_names, key=numeric_string_cmp_key)
-            tag_string = ", ".join(sorted_tag_names)
-            self.con.execute("update cards set tags=? where _id=?",
-                (tag_string, _card_id))
+        # but fetch the tag names for a batch of cards in a single query.
+        # Sorting happens here, as SQLite does not know about the numeric
+        # string ordering used in 'Card.tag_string'. Tag names are joined
+        # using the ASCII unit separator, which does not occur in them.
+        for batch in self._batches(set(_card_ids)):
+            tag_string_for__id = dict.fromkeys(batch, "")
+            for _card_id, tag_names in self.con.execute(\
+                """select tags_for_card._card_id, group_concat(tags.name,
+                char(31)) from tags_for_card, tags where
+                tags_for_card._tag_id=tags._id and tags.name<>'__UNTAGGED__'
+                and tags_for_card._card_id in (%s) group by
+                tags_for_card._card_id""" % self._placeholders(batch), batch):
+                tag_string_for__id[_card_id] = ", ".join(sorted(\
+                    tag_names.split("\x1f"), key=numeric_string_cmp_key))
+            self.con.executemany("update cards set tags=? where _id=?",
+                ((tag_string, _card_id) for _card_id, tag_string in \
+                tag_string_for__id.items()))
 
     def delete_tag(self, tag):
         if tag.id == "__UNTAGGED__":
             return
         self.con.execute("delete from tags where _id=?", (tag._id, ))
+        self._tag_cache.discard_internal_id(tag._id)
+        self._card_cache.clear()
         _card_ids_affected = [cursor[0] for cursor in self.con.execute(
             "select _card_id from tags_for_card where _tag_id=?",
             (tag._id, ))]
@@ -737,8 +957,47 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
         applier = self.component_manager.current("criterion_applier",
             used_for=criterion.__class__)
         applier.apply_to_database(criterion)
+        self._card_cache.clear()
         del tag
 
+    def delete_tags(self, tags):
+        tags = [tag for tag in tags if tag.id != "__UNTAGGED__"]
+        if not tags:
+            return
+        _card_ids_affected = self._card_ids_with_tags(tags)
+        for batch in self._batches([tag._id for tag in tags]):
+            self.con.execute("delete from tags where _id in (%s)" % \
+                self._placeholders(batch), batch)
+            self.con.execute("delete from tags_for_card where _tag_id in (%s)"
+                % self._placeholders(batch), batch)
+        for tag in tags:
+            self._tag_cache.discard_internal_id(tag._id)
+        self._card_cache.clear()
+        # Cards without tags left become untagged.
+        if _card_ids_affected:
+            untagged = self.get_or_create_tag_with_name("__UNTAGGED__")
+            for batch in self._batches(_card_ids_affected):
+                self.con.execute("""insert into tags_for_card(_tag_id,
+                    _card_id) select ?, _id from cards where _id in (%s) and
+                    not exists (select 1 from tags_for_card where
+                    tags_for_card._card_id=cards._id)""" % \
+                    self._placeholders(batch), [untagged._id] + batch)
+        if self.store_pregenerated_data:
+            self._update_tag_strings(_card_ids_affected)
+        self.log().deleted_tags(tags)
+        # Update the criteria and reapply the current one only once.
+        if self.syncing:
+            return
+        for criterion in self.criteria():
+            for tag in tags:
+                criterion.tag_deleted(tag)
+            self.update_criterion(criterion)
+        criterion = self.current_criterion()
+        applier = self.component_manager.current("criterion_applier",
+            used_for=criterion.__class__)
+        applier.apply_to_database(criterion)
+        self._card_cache.clear()
+
     def delete_tag_if_unused(self, tag):
         if tag.id == "__UNTAGGED__":
             return
@@ -779,15 +1038,58 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
         # Add fact to facts table.
         self.con.execute("insert into facts(id) values(?)", (fact.id, ))
         fact._id = self.con.last_insert_rowid()
+        self._strip_empty_fact_data(fact)
+        self._fact_cache.put(fact)
         # Create data_for_fact.
         self.con.executemany("""insert into data_for_fact(_fact_id, key, value)
             values(?,?,?)""", ((fact._id, fact_key, value)
-            for fact_key, value in fact.data.items() if value))
+            for fact_key, value in fact.data.items()))
         self.log().added_fact(fact)
         # Process media files.
         self._process_media(fact)
 
+    def add_facts(self, facts):
+
+        """Bulk version of 'add_fact', which uses a fixed number of queries
+        for all the facts together. We assign the _ids ourselves, which is
+        safe as we are the only connection writing to the database.
+
+        """
+
+        facts = list(facts)
+        _id = self.con.execute("select max(_id) from facts").fetchone()[0]
+        if _id is None:
+            _id = 0
+        for fact in facts:
+            _id += 1
+            fact._id = _id
+            self._strip_empty_fact_data(fact)
+            self._fact_cache.put(fact)
+        self.con.executemany("insert into facts(_id, id) values(?,?)",
+            ((fact._id, fact.id) for fact in facts))
+        self.con.executemany("""insert into data_for_fact(_fact_id, key, value)
+            values(?,?,?)""", ((fact._id, fact_key, value) for fact in facts
+            for fact_key, value in fact.data.items()))
+        self.log().added_facts(facts)
+        for fact in facts:
+            self._process_media(fact)
+
+    def _strip_empty_fact_data(self, fact):
+
+        """Empty fields are not stored, so remove them from the fact object
+        too, such that a cached fact looks the same as one read back from the
+        database.
+
+        """
+
+        if not all(fact.data.values()):
+            fact.data = dict((fact_key, value) for fact_key, value \
+                in fact.data.items() if value)
+
     def fact(self, id, is_id_internal):
+        fact = self._fact_cache.get(id, is_id_internal)
+        if fact is not None:
+            return fact
         if is_id_internal:
             sql_res = self.con.execute("""select _id, id, extra_data from
                 facts where _id=?""", (id, )).fetchone()
@@ -802,21 +1104,65 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
         fact = Fact(fact_data, id=sql_res[1])
         fact._id = sql_res[0]
         self._construct_extra_data(sql_res[2], fact)
+        self._fact_cache.put(fact)
         return fact
 
+    def facts_with_ids(self, ids, is_id_internal):
+
+        """Bulk version of 'fact', which only needs two queries per batch of
+        facts, as opposed to two queries per fact. Facts which no longer
+        exist are skipped.
+
+        """
+
+        for batch in self._batches(ids):
+            fact_for_id = {}
+            for id in batch:
+                fact = self._fact_cache.get(id, is_id_internal)
+                if fact is not None:
+                    fact_for_id[id] = fact
+            missing_ids = [id for id in batch if id not in fact_for_id]
+            fact_for__id = {}
+            for sql_res in self.con.execute("""select _id, id, extra_data
+                from facts where %s in (%s)""" % ("_id" if is_id_internal \
+                else "id", self._placeholders(missing_ids)), missing_ids):
+                fact = Fact({}, id=sql_res[1])
+                fact._id = sql_res[0]
+                self._construct_extra_data(sql_res[2], fact)
+                fact_for__id[fact._id] = fact
+                fact_for_id[sql_res[0] if is_id_internal else sql_res[1]] = \
+                    fact
+            _fact_ids = list(fact_for__id.keys())
+            for _fact_id, key, value in self.con.execute("""select _fact_id,
+                key, value from data_for_fact where _fact_id in (%s)""" % \
+                self._placeholders(_fact_ids), _fact_ids):
+                fact_for__id[_fact_id].data[key] = value
+            for fact in fact_for__id.values():
+                self._fact_cache.put(fact)
+            for id in batch:
+                if id in fact_for_id:
+                    yield fact_for_id[id]
+
     def update_fact(self, fact):
+        self._strip_empty_fact_data(fact)
+        self._fact_cache.put(fact)
+        # Cached cards could refer to a different copy of this fact.
+        self._card_cache.discard_if(lambda card: \
+            card.fact._id == fact._id and card.fact is not fact)
         # Delete data_for_fact and recreate it.
         self.con.execute("delete from data_for_fact where _fact_id=?",
             (fact._id, ))
         self.con.executemany("""insert into data_for_fact(_fact_id, key, value)
             values(?,?,?)""", ((fact._id, key, value)
-                for key, value in fact.data.items() if value))
+                for key, value in fact.data.items()))
         self.log().edited_fact(fact)
         # Process media files.
         self._process_media(fact)
 
     def delete_fact(self, fact):
         self.con.execute("delete from facts where _id=?", (fact._id, ))
+        self._fact_cache.discard_internal_id(fact._id)
+        self._card_cache.discard_if(lambda card: card.fact._id == fact._id)
         self.con.execute("delete from data_for_fact where _fact_id=?",
             (fact._id, ))
         self.log().deleted_fact(fact)
@@ -846,9 +1192,10 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
             card.easiness, card.acq_reps, card.ret_reps, card.lapses,
             card.acq_reps_since_lapse, card.ret_reps_since_lapse,
             card.creation_time, card.modification_time,
-            self._repr_extra_data(card.extra_data), card.scheduler_data,
+            self._serialize_extra_data(card.extra_data), card.scheduler_data,
             card.active,))
         card._id = self.con.last_insert_rowid()
+        self._card_cache.put(card)
         if self.store_pregenerated_data:
             self.con.execute(\
                 "update cards set question=?, answer=?, tags=? where _id=?",
@@ -863,20 +1210,57 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
                 _card_id) values(?,?)""", (tag._id, card._id))
         self.log().added_card(card)
 
-    def card(self, id, is_id_internal):
-        query = """select _id, id, card_type_id, _fact_id, fact_view_id,
-            grade, next_rep, last_rep, easiness, acq_reps, ret_reps, lapses,
-            acq_reps_since_lapse, ret_reps_since_lapse, creation_time,
-            modification_time, extra_data, scheduler_data, active from cards
-            where """
-        if is_id_internal:
-            sql_res = self.con.execute(query + "_id=?", (id, )).fetchone()
+    def add_cards(self, cards):
+
+        """Bulk version of 'add_card', which inserts the cards, their
+        pregenerated data and their tags using a fixed number of queries.
+
+        """
+
+        cards = list(cards)
+        criterion = self.current_criterion()
+        _id = self.con.execute("select max(_id) from cards").fetchone()[0]
+        if _id is None:
+            _id = 0
+        for card in cards:
+            if len(card.tags) == 0:
+                card.tags.add(self.get_or_create_tag_with_name("__UNTAGGED__"))
+            criterion.apply_to_card(card)
+            _id += 1
+            card._id = _id
+            self._card_cache.put(card)
+        def values(card):
+            return (card._id, card.id, card.card_type.id, card.fact._id,
+                card.fact_view.id, card.grade, card.next_rep, card.last_rep,
+                card.easiness, card.acq_reps, card.ret_reps, card.lapses,
+                card.acq_reps_since_lapse, card.ret_reps_since_lapse,
+                card.creation_time, card.modification_time,
+                self._serialize_extra_data(card.extra_data),
+                card.scheduler_data, card.active)
+        if self.store_pregenerated_data:
+            self.con.executemany("insert into cards(" + self._card_columns +
+                ", question, answer, tags) values(" + ",".join("?" * 22) +
+                ")", (values(card) + (card.question("plain_text"),
+                card.answer("plain_text"), card.tag_string()) \
+                for card in cards))
         else:
-            sql_res = self.con.execute(query + "id=?", (id, )).fetchone()
-        if sql_res is None or sql_res[3] is None:
-            from mnemosyne.libmnemosyne.utils import MnemosyneError
-            raise MnemosyneError
-        fact = self.fact(sql_res[3], is_id_internal=True)
+            self.con.executemany("insert into cards(" + self._card_columns +
+                ") values(" + ",".join("?" * 19) + ")",
+                (values(card) for card in cards))
+        self.con.executemany("""insert into tags_for_card(_tag_id,
+            _card_id) values(?,?)""", ((tag._id, card._id) for card in cards
+            for tag in card.tags))
+        self.log().added_cards(cards)
+
+    _card_columns = """_id, id, card_type_id, _fact_id, fact_view_id,
+        grade, next_rep, last_rep, easiness, acq_reps, ret_reps, lapses,
+        acq_reps_since_lapse, ret_reps_since_lapse, creation_time,
+        modification_time, extra_data, scheduler_data, active"""
+
+    def _card_from_sql_res(self, sql_res, fact):
+
+        """Construct a card without tags from a row of 'cards'."""
+
         # Note that for the card type, we turn to the component manager as
         # opposed to this database, as we would otherwise miss the built-in
         # system card types
@@ -901,11 +1285,80 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
         self._construct_extra_data(sql_res[16], card)
         card.scheduler_data = sql_res[17]
         card.active = sql_res[18]
+        return card
+
+    def card(self, id, is_id_internal):
+        card = self._card_cache.get(id, is_id_internal)
+        if card is not None:
+            return card
+        query = "select " + self._card_columns + " from cards where "
+        if is_id_internal:
+            sql_res = self.con.execute(query + "_id=?", (id, )).fetchone()
+        else:
+            sql_res = self.con.execute(query + "id=?", (id, )).fetchone()
+        if sql_res is None or sql_res[3] is None:
+            from mnemosyne.libmnemosyne.utils import MnemosyneError
+            raise MnemosyneError
+        fact = self.fact(sql_res[3], is_id_internal=True)
+        card = self._card_from_sql_res(sql_res, fact)
         for cursor in self.con.execute("""select _tag_id from tags_for_card
             where _card_id=?""", (card._id, )):
             card.tags.add(self.tag(cursor[0], is_id_internal=True))
+        self._card_cache.put(card)
         return card
 
+    def cards_with_ids(self, ids, is_id_internal):
+
+        """Bulk version of 'card', which hydrates a batch of cards using a
+        fixed number of set-based queries (cards, facts, fact data and tags),
+        as opposed to several queries per card. The cards are yielded in the
+        order of 'ids', skipping cards which no longer exist.
+
+        Cards, facts and tags which are already in the identity map are
+        taken from there.
+
+        """
+
+        for batch in self._batches(ids):
+            card_for_id = {}
+            for id in batch:
+                card = self._card_cache.get(id, is_id_internal)
+                if card is not None:
+                    card_for_id[id] = card
+            missing_ids = [id for id in batch if id not in card_for_id]
+            sql_results = [sql_res for sql_res in self.con.execute(\
+                "select " + self._card_columns + " from cards where %s in (%s)"
+                % ("_id" if is_id_internal else "id",
+                self._placeholders(missing_ids)), missing_ids) \
+                if sql_res[3] is not None]
+            fact_for__id = dict((fact._id, fact) for fact in \
+                self.facts_with_ids(set(sql_res[3] for sql_res in \
+                sql_results), is_id_internal=True))
+            card_for__id = {}
+            for sql_res in sql_results:
+                card = self._card_from_sql_res(sql_res,
+                    fact_for__id[sql_res[3]])
+                card_for__id[card._id] = card
+                card_for_id[card._id if is_id_internal else card.id] = card
+            _card_ids = list(card_for__id.keys())
+            for _card_id, _tag_id, id, name, extra_data in self.con.execute(\
+                """select tags_for_card._card_id, tags._id, tags.id,
+                tags.name, tags.extra_data from tags_for_card, tags where
+                tags_for_card._tag_id=tags._id and tags_for_card._card_id
+                in (%s)""" % self._placeholders(_card_ids), _card_ids):
+                tag = self._tag_cache.get(_tag_id, is_id_internal=True)
+                if tag is None:
+                    tag = Tag(name, id)
+                    tag._id = _tag_id
+                    self._construct_extra_data(extra_data, tag)
+                    self._tag_cache.put(tag)
+                card_for__id[_card_id].tags.add(tag)
+            for card in card_for__id.values():
+                self._card_cache.put(card)
+            for id in batch:
+                if id in card_for_id:
+                    yield card_for_id[id]
+
     def update_card(self, card, repetition_only=False):
         # The card should at least have the __UNTAGGED__ tag. This allows for
         # an easy and fast implementation of applying criteria.
@@ -913,6 +1366,7 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
            card.tags.add(self.get_or_create_tag_with_name("__UNTAGGED__"))
         if not repetition_only:
             self.current_criterion().apply_to_card(card)
+        self._card_cache.put(card)
         self.con.execute("""update cards set grade=?, next_rep=?, last_rep=?,
             easiness=?, acq_reps=?, ret_reps=?, lapses=?,
             acq_reps_since_lapse=?, ret_reps_since_lapse=?,
@@ -927,7 +1381,7 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
             fact_view_id=?, creation_time=?, modification_time=?, extra_data=?
             where _id=?""", (card.card_type.id, card.fact._id,
             card.fact_view.id, card.creation_time, card.modification_time,
-            self._repr_extra_data(card.extra_data), card._id))
+            self._serialize_extra_data(card.extra_data), card._id))
         if self.store_pregenerated_data:
             self.con.execute(\
                 "update cards set question=?, answer=?, tags=? where _id=?",
@@ -951,8 +1405,10 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
             # A card which was created and deleted before a sync, so that
             # it has incomplete information.
             self.con.execute("delete from cards where id=?", (card.id, ))
+            self._card_cache.discard_id(card.id)
         else:
             self.con.execute("delete from cards where _id=?", (card._id, ))
+            self._card_cache.discard_internal_id(card._id)
             self.con.execute("delete from tags_for_card where _card_id=?",
                              (card._id, ))
         if not self.syncing and check_for_unused_tags:
@@ -991,6 +1447,8 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
         arguments = ((tag._id, _card_id) for _card_id in _card_ids)
         self.con.executemany("""insert into tags_for_card(_tag_id, _card_id)
             values(?,?)""", arguments)
+        for _card_id in _card_ids:
+            self._card_cache.discard_internal_id(_card_id)
         if self.store_pregenerated_data:
             self._update_tag_strings(_card_ids)
         # We don't call 'self.log.edited_card(card)', which would require us to
@@ -1017,6 +1475,8 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
             _card_id in set(_card_ids).difference(_card_ids_tagged))
         self.con.executemany("""insert into tags_for_card(_tag_id, _card_id)
             values(?,?)""", arguments)
+        for _card_id in _card_ids:
+            self._card_cache.discard_internal_id(_card_id)
         self.delete_tag_if_unused(tag)
         if self.store_pregenerated_data:
             self._update_tag_strings(_card_ids)
@@ -1042,12 +1502,13 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
             a_fact_keys, q_fact_key_decorators, a_fact_key_decorators,
             a_on_top_of_q, type_answer, extra_data)
             values(?,?,?,?,?,?,?,?,?)""",
-            (fact_view.id, fact_view.name, repr(fact_view.q_fact_keys),
-            repr(fact_view.a_fact_keys),
-            repr(fact_view.q_fact_key_decorators),
-            repr(fact_view.a_fact_key_decorators), fact_view.a_on_top_of_q,
-            fact_view.type_answer,
-            self._repr_extra_data(fact_view.extra_data)))
+            (fact_view.id, fact_view.name,
+            serialize(fact_view.q_fact_keys),
+            serialize(fact_view.a_fact_keys),
+            serialize(fact_view.q_fact_key_decorators),
+            serialize(fact_view.a_fact_key_decorators),
+            fact_view.a_on_top_of_q, fact_view.type_answer,
+            self._serialize_extra_data(fact_view.extra_data)))
         self.log().added_fact_view(fact_view)
 
     def fact_view(self, id, is_id_internal):
@@ -1058,10 +1519,10 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
             a_on_top_of_q, type_answer, extra_data from fact_views
             where id=?""", (id, )).fetchone()
         fact_view = FactView(sql_res[1], sql_res[0])
-        fact_view.q_fact_keys = eval(sql_res[2])
-        fact_view.a_fact_keys = eval(sql_res[3])
-        fact_view.q_fact_key_decorators = eval(sql_res[4])
-        fact_view.a_fact_key_decorators = eval(sql_res[5])
+        fact_view.q_fact_keys = deserialize(sql_res[2])
+        fact_view.a_fact_keys = deserialize(sql_res[3])
+        fact_view.q_fact_key_decorators = deserialize(sql_res[4])
+        fact_view.a_fact_key_decorators = deserialize(sql_res[5])
         fact_view.a_on_top_of_q = bool(sql_res[6])
         fact_view.type_answer = bool(sql_res[7])
         self._construct_extra_data(sql_res[8], fact_view)
@@ -1071,16 +1532,19 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
         self.con.execute("""update fact_views set name=?, q_fact_keys=?,
             a_fact_keys=?, q_fact_key_decorators=?, a_fact_key_decorators=?,
             a_on_top_of_q=?, type_answer=?, extra_data=? where id=?""",
-            (fact_view.name, repr(fact_view.q_fact_keys),
-            repr(fact_view.a_fact_keys), repr(fact_view.q_fact_key_decorators),
-            repr(fact_view.a_fact_key_decorators), fact_view.a_on_top_of_q,
-            fact_view.type_answer,
-            self._repr_extra_data(fact_view.extra_data), fact_view.id))
+            (fact_view.name, serialize(fact_view.q_fact_keys),
+            serialize(fact_view.a_fact_keys),
+            serialize(fact_view.q_fact_key_decorators),
+            serialize(fact_view.a_fact_key_decorators),
+            fact_view.a_on_top_of_q, fact_view.type_answer,
+            self._serialize_extra_data(fact_view.extra_data), fact_view.id))
+        self._card_cache.clear()
         self.log().edited_fact_view(fact_view)
 
     def delete_fact_view(self, fact_view):
         self.con.execute("delete from fact_views where id=?",
             (fact_view.id, ))
+        self._card_cache.clear()
         self.log().deleted_fact_view(fact_view)
         del fact_view
 
@@ -1126,12 +1590,12 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
             fact_keys_and_names, unique_fact_keys, required_fact_keys,
             fact_view_ids, keyboard_shortcuts, extra_data)
             values (?,?,?,?,?,?,?,?)""", (card_type.id,
-            card_type.name, repr(card_type.fact_keys_and_names),
-            repr(card_type.unique_fact_keys),
-            repr(card_type.required_fact_keys),
-            repr([fact_view.id for fact_view in card_type.fact_views]),
-            repr(card_type.keyboard_shortcuts),
-            self._repr_extra_data(card_type.extra_data)))
+            card_type.name, serialize(card_type.fact_keys_and_names),
+            serialize(card_type.unique_fact_keys),
+            serialize(card_type.required_fact_keys),
+            serialize([fact_view.id for fact_view in card_type.fact_views]),
+            serialize(card_type.keyboard_shortcuts),
+            self._serialize_extra_data(card_type.extra_data)))
         # When we are syncing/merging, make sure we correctly insert the
         # class in the inheritance hierarchy.
         card_type = self.card_type(card_type.id, is_id_internal=False)
@@ -1185,15 +1649,16 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
             (id, )).fetchone()
         card_type = type(mangle(id), (parent.__class__, ),
             {"name": sql_res[0], "id": id})(self.component_manager)
-        card_type.fact_keys_and_names = eval(sql_res[1])
-        card_type.unique_fact_keys = eval(sql_res[2])
-        card_type.required_fact_keys = eval(sql_res[3])
-        card_type.keyboard_shortcuts = eval(sql_res[5])
+        card_type.fact_keys_and_names = deserialize(sql_res[1])
+        card_type.unique_fact_keys = deserialize(sql_res[2])
+        card_type.required_fact_keys = deserialize(sql_res[3])
+        card_type.keyboard_shortcuts = deserialize(sql_res[5])
         self._construct_extra_data(sql_res[6], card_type)
         if "hidden_from_UI" in card_type.extra_data:
             card_type.hidden_from_UI = card_type.extra_data["hidden_from_UI"]
         card_type.fact_views = [self.fact_view(fact_view_id,
-            is_id_internal=False) for fact_view_id in eval(sql_res[4])]
+            is_id_internal=False) for fact_view_id in \
+            deserialize(sql_res[4])]
         return card_type
 
     def is_user_card_type(self, card_type):
@@ -1216,14 +1681,15 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
         self.con.execute("""update card_types set name=?,
             fact_keys_and_names=?, unique_fact_keys=?, required_fact_keys=?,
             fact_view_ids=?, keyboard_shortcuts=?, extra_data=? where id=?""",
-            (card_type.name, repr(card_type.fact_keys_and_names),
-            repr(card_type.unique_fact_keys),
-            repr(card_type.required_fact_keys),
-            repr([fact_view.id for fact_view in card_type.fact_views]),
-            repr(card_type.keyboard_shortcuts),
-            self._repr_extra_data(card_type.extra_data), card_type.id))
+            (card_type.name, serialize(card_type.fact_keys_and_names),
+            serialize(card_type.unique_fact_keys),
+            serialize(card_type.required_fact_keys),
+            serialize([fact_view.id for fact_view in card_type.fact_views]),
+            serialize(card_type.keyboard_shortcuts),
+            self._serialize_extra_data(card_type.extra_data), card_type.id))
         self.component_manager.unregister(card_type)
         self.component_manager.register(card_type)
+        self._card_cache.clear()
         self.log().edited_card_type(card_type)
 
     def delete_card_type(self, card_type):
@@ -1232,6 +1698,7 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
         self.con.execute("delete from card_types where id=?",
             (card_type.id, ))
         self.component_manager.unregister(card_type)
+        self._card_cache.clear()
         self.log().deleted_card_type(card_type)
         # When syncing, don't bother to check for updates to criteria here, as
         # there will be separate log events coming later to deal with this.
@@ -1302,6 +1769,7 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
         applier = self.component_manager.current("criterion_applier",
             used_for=criterion.__class__)
         applier.apply_to_database(criterion)
+        self._card_cache.clear()
 
     def current_criterion(self):
         return self._current_criterion
@@ -1354,6 +1822,15 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
                 facts.append(self.fact(_fact_id, is_id_internal=True))
         return facts
 
+    def unique_fact_values(self, card_type):
+        values = {}
+        for fact_key in card_type.unique_fact_keys:
+            values[fact_key] = set(cursor[0] for cursor in self.con.execute(\
+                """select distinct value from data_for_fact where key=? and
+                _fact_id in (select _fact_id from cards where
+                card_type_id=?)""", (fact_key, card_type.id)))
+        return values
+
     def tag_all_duplicates(self):
         # Find the _fact_ids of the candidate duplicates, i.e. not yet taking
         # into account that duplicates in different card types are allowed and
@@ -1560,6 +2037,7 @@ _("Putting a database on a network drive is forbidden under Windows to avoid dat
     def set_scheduler_data(self, scheduler_data):
         self.con.execute("update cards set scheduler_data=?",
             (scheduler_data, ))
+        self._card_cache.clear()
 
     def cards_with_scheduler_data(self, scheduler_data, sort_key="",
                                   limit=-1, max_ret_reps=-1):
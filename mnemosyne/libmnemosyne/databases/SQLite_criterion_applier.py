@@ -11,45 +11,63 @@ class DefaultCriterionApplier(CriterionApplier):
     used_for = DefaultCriterion
 
     def apply_to_database(self, criterion):
+
+        """The cards which should be active are collected in a temporary
+        table, such that we only need to touch the cards whose active state
+        actually changes, instead of resetting all of them.
+
+        """
+
         if len(criterion._tag_ids_forbidden) != 0:
             assert len(criterion._tag_ids_active) != 0
         db = self.database()
-        # If every tag is active, take a shortcut.
+        db.con.execute("""create temp table if not exists _criterion_tags(
+            _tag_id integer primary key, active boolean)""")
+        db.con.execute("""create temp table if not exists
+            _criterion_card_types(card_type_id text, fact_view_id text)""")
+        db.con.execute("""create temp table if not exists
+            _criterion_active_cards(_card_id integer primary key)""")
+        db.con.execute("delete from _criterion_tags")
+        db.con.execute("delete from _criterion_card_types")
+        db.con.execute("delete from _criterion_active_cards")
+        db.con.executemany(\
+            "insert into _criterion_tags(_tag_id, active) values(?,1)",
+            ((_tag_id, ) for _tag_id in criterion._tag_ids_active))
+        db.con.executemany("""insert or replace into _criterion_tags(_tag_id,
+            active) values(?,0)""",
+            ((_tag_id, ) for _tag_id in criterion._tag_ids_forbidden))
+        db.con.executemany("""insert into _criterion_card_types(card_type_id,
+            fact_view_id) values(?,?)""",
+            criterion.deactivated_card_type_fact_view_ids)
+        # Turn on active tags. If every tag is active, take a shortcut.
         tag_count = db.con.execute("select count() from tags").fetchone()[0]
         if len(criterion._tag_ids_active) == tag_count:
-            db.con.execute("update cards set active=1")
+            db.con.execute("""insert into _criterion_active_cards(_card_id)
+                select _id from cards""")
         else:
-            # Turn off everything.
-            db.con.execute("update cards set active=0")
-            # Turn on active tags.
-            command = """update cards set active=1 where _id in
-                (select _card_id from tags_for_card where _tag_id in ("""
-            args = []
-            for _tag_id in criterion._tag_ids_active:
-                command += "?,"
-                args.append(_tag_id)
-            command = command.rsplit(",", 1)[0] + "))"
-            if criterion._tag_ids_active:
-                db.con.execute(command, args)
+            db.con.execute("""insert or ignore into
+                _criterion_active_cards(_card_id) select _card_id from
+                tags_for_card join _criterion_tags on
+                tags_for_card._tag_id=_criterion_tags._tag_id
+                where _criterion_tags.active=1""")
         # Turn off inactive card types and views.
-        command = "update cards set active=0 where "
-        args = []
-        for card_type_id, fact_view_id in \
-                criterion.deactivated_card_type_fact_view_ids:
-            command += "(cards.fact_view_id=? and cards.card_type_id=?)"
-            command += " or "
-            args.append(fact_view_id)
-            args.append(card_type_id)
-        command = command.rsplit("or ", 1)[0]
         if criterion.deactivated_card_type_fact_view_ids:
-            db.con.execute(command, args)
+            db.con.execute("""delete from _criterion_active_cards where
+                _card_id in (select _id from cards join _criterion_card_types
+                on cards.card_type_id=_criterion_card_types.card_type_id and
+                cards.fact_view_id=_criterion_card_types.fact_view_id)""")
         # Turn off forbidden tags.
-        command = """update cards set active=0 where _id in (select _card_id
-            from tags_for_card where _tag_id in ("""
-        args = []
-        for _tag_id in criterion._tag_ids_forbidden:
-            command += "?,"
-            args.append(_tag_id)
-        command = command.rsplit(",", 1)[0] + "))"
         if criterion._tag_ids_forbidden:
-            db.con.execute(command, args)
+            db.con.execute("""delete from _criterion_active_cards where
+                _card_id in (select _card_id from tags_for_card join
+                _criterion_tags on
+                tags_for_card._tag_id=_criterion_tags._tag_id
+                where _criterion_tags.active=0)""")
+        # Only update the cards which change state.
+        changed = db.con.execute("""update cards set active=1 where
+            active is not 1 and _id in
+            (select _card_id from _criterion_active_cards)""").rowcount
+        changed += db.con.execute("""update cards set active=0 where
+            active is not 0 and _id not in
+            (select _card_id from _criterion_active_cards)""").rowcount
+        return changed
@@ -66,10 +66,10 @@ class SQLiteLogging(object):
 
         timestamp = int(time.time())
         scheduled_count = 0
-        for n in range(1, 8):
+        for count in self.scheduler().card_counts_scheduled_n_days_from_now(\
+            list(range(1, 8))):
             timestamp += DAY
-            scheduled_count += \
-                self.scheduler().card_count_scheduled_n_days_from_now(n)
+            scheduled_count += count
             self.con.execute("""insert into log(event_type, timestamp,
                 object_id, acq_reps,ret_reps, lapses) values(?,?,?,?,?,?)""",
                 (EventTypes.LOADED_DATABASE, timestamp,
@@ -81,6 +81,12 @@ class SQLiteLogging(object):
             "insert into log(event_type, timestamp, object_id) values(?,?,?)",
             (EventTypes.ADDED_CARD, int(timestamp), card_id))
 
+    def log_added_cards(self, timestamp, card_ids):
+        self.con.executemany(\
+            "insert into log(event_type, timestamp, object_id) values(?,?,?)",
+            ((EventTypes.ADDED_CARD, int(timestamp), card_id) \
+            for card_id in card_ids))
+
     def log_edited_card(self, timestamp, card_id):
         self.con.execute(\
             "insert into log(event_type, timestamp, object_id) values(?,?,?)",
@@ -121,6 +127,18 @@ class SQLiteLogging(object):
             "insert into log(event_type, timestamp, object_id) values(?,?,?)",
             (EventTypes.DELETED_TAG, int(timestamp), tag_id))
 
+    def log_edited_tags(self, timestamp, tag_ids):
+        self.con.executemany(\
+            "insert into log(event_type, timestamp, object_id) values(?,?,?)",
+            ((EventTypes.EDITED_TAG, int(timestamp), tag_id) \
+            for tag_id in tag_ids))
+
+    def log_deleted_tags(self, timestamp, tag_ids):
+        self.con.executemany(\
+            "insert into log(event_type, timestamp, object_id) values(?,?,?)",
+            ((EventTypes.DELETED_TAG, int(timestamp), tag_id) \
+            for tag_id in tag_ids))
+
     def log_added_media_file(self, timestamp, filename):
         self.con.execute(\
             "insert into log(event_type, timestamp, object_id) values(?,?,?)",
@@ -141,6 +159,12 @@ class SQLiteLogging(object):
             "insert into log(event_type, timestamp, object_id) values(?,?,?)",
             (EventTypes.ADDED_FACT, int(timestamp), fact_id))
 
+    def log_added_facts(self, timestamp, fact_ids):
+        self.con.executemany(\
+            "insert into log(event_type, timestamp, object_id) values(?,?,?)",
+            ((EventTypes.ADDED_FACT, int(timestamp), fact_id) \
+            for fact_id in fact_ids))
+
     def log_edited_fact(self, timestamp, fact_id):
         self.con.execute(\
             "insert into log(event_type, timestamp, object_id) values(?,?,?)",
@@ -309,6 +333,7 @@ class SQLiteLogging(object):
     def change_card_id(self, card, new_id):
         self.con.execute("update cards set id=? where _id=?",
             (new_id, card._id))
+        self._card_cache.discard_internal_id(card._id)
 
     def update_card_after_log_import(self, id, creation_time, offset):
         sql_res = self.con.execute("""select _id, acq_reps, lapses,
@@ -322,6 +347,7 @@ class SQLiteLogging(object):
             modification_time=?, acq_reps=?, acq_reps_since_lapse=?
             where _id=?""", (creation_time, creation_time, acq_reps,
             acq_reps_since_lapse, sql_res[0]))
+        self._card_cache.discard_internal_id(sql_res[0])
 
     def remove_card_log_entries_since(self, index):
         # Note that it is only safe to use this in case theses entries have
@@ -104,9 +104,16 @@ media_dir + ".\n" + _("Check your file permissions and make sure the directory i
             "dynamically_create_media_files") if f.is_working() == True]
         if len(creators) == 0:
             return
-        for cursor in self.con.execute("select value from data_for_fact"):
-            for creator in creators:
-                creator.run(cursor[0])
+        data = [cursor[0] for cursor in \
+            self.con.execute("select value from data_for_fact")]
+        for creator in creators:
+            # Creators which can do better than one piece of data at a time,
+            # e.g. by creating the files in parallel, provide 'run_batch'.
+            if hasattr(creator, "run_batch"):
+                creator.run_batch(data)
+            else:
+                for value in data:
+                    creator.run(value)
 
     def active_dynamic_media_files(self):
         # Other media files, e.g. latex.
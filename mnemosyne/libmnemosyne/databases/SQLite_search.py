@@ -0,0 +1,214 @@
+#
+# SQLite_search.py <Peter.Bienstman@UGent.be>
+#
+
+import re
+
+SEARCH_INDEX = """
+    create virtual table if not exists cards_fts using fts5(question, answer,
+        tags, content='cards', content_rowid='_id', tokenize='trigram');
+"""
+
+SEARCH_TRIGGERS = """
+    create trigger if not exists cards_fts_insert after insert on cards begin
+        insert into cards_fts(rowid, question, answer, tags)
+            values(new._id, new.question, new.answer, new.tags);
+    end;
+    create trigger if not exists cards_fts_delete after delete on cards begin
+        insert into cards_fts(cards_fts, rowid, question, answer, tags)
+            values('delete', old._id, old.question, old.answer, old.tags);
+    end;
+    create trigger if not exists cards_fts_update after update of question,
+        answer, tags on cards when old.question is not new.question or
+        old.answer is not new.answer or old.tags is not new.tags begin
+        insert into cards_fts(cards_fts, rowid, question, answer, tags)
+            values('delete', old._id, old.question, old.answer, old.tags);
+        insert into cards_fts(rowid, question, answer, tags)
+            values(new._id, new.question, new.answer, new.tags);
+    end;
+"""
+
+SEARCH_TRIGGER_NAMES = ("cards_fts_insert", "cards_fts_delete",
+    "cards_fts_update")
+
+re_search_term = re.compile(r"\"([^\"]*)\"|(\S+)")
+
+# The trigram tokenizer cannot find shorter terms.
+MIN_INDEXED_TERM_LENGTH = 3
+
+# Rank of a card in the last search, see 'search_rank_statements'.
+SEARCH_RANK = \
+    "(select rank from search_ranks where search_ranks._id=cards._id)"
+
+
+class SQLiteSearch(object):
+
+    """Code to be injected into the SQLite database class through inheritance,
+    so that SQLite.py does not becomes too large.
+
+    A search string is split into terms: text between double quotes is a
+    single term, all other words are separate terms. A card matches if each
+    term occurs somewhere in its pregenerated question, answer or tag string.
+
+    Searching uses a full text index if the SQLite library supports FTS5
+    with the trigram tokenizer, which can find any part of a word, also in
+    languages which don't separate words by spaces. This index is an
+    external content table which is kept up to date by triggers, so that it
+    does not need to be maintained explicitly by any of the functions which
+    modify cards.
+
+    Terms shorter than three characters cannot be looked up in the index and
+    use a 'like' query instead. We also fall back to 'like' queries if the
+    index is not available, or if the search string contains the SQL
+    wildcards '%' or '_'. Note that 'like' only ignores the case of ASCII
+    characters, whereas the index ignores the case of all characters.
+
+    """
+
+    has_search_index = False
+
+    def _fts5_available(self):
+        try:
+            self.con.execute("""create virtual table temp._fts5_test using
+                fts5(text, tokenize='trigram')""")
+        except Exception:
+            return False
+        self.con.execute("drop table temp._fts5_test")
+        return True
+
+    def create_search_index_if_needed(self):
+        self.has_search_index = False
+        if not self.store_pregenerated_data:
+            return
+        trigger_count = self.con.execute("""select count() from sqlite_master
+            where type='trigger' and name in (?,?,?)""",
+            SEARCH_TRIGGER_NAMES).fetchone()[0]
+        if not self._fts5_available():
+            # Make sure the triggers don't break writing to the cards table.
+            # The index gets rebuilt when the database is opened again with
+            # an SQLite library which does have FTS5.
+            for name in SEARCH_TRIGGER_NAMES:
+                self.con.execute("drop trigger if exists %s" % name)
+            return
+        index_sql = self.con.execute("""select sql from sqlite_master
+            where type='table' and name='cards_fts'""").fetchone()
+        if index_sql and "trigram" not in index_sql[0]:
+            # Created with a different tokenizer.
+            self.con.execute("drop table cards_fts")
+            index_sql = None
+        if not index_sql or trigger_count != len(SEARCH_TRIGGER_NAMES):
+            self.con.executescript(SEARCH_INDEX + SEARCH_TRIGGERS)
+            self.con.execute(\
+                "insert into cards_fts(cards_fts) values('rebuild')")
+        self.has_search_index = True
+
+    def _use_search_index(self, search_string):
+        return self.has_search_index and "%" not in search_string \
+            and "_" not in search_string
+
+    def search_terms(self, search_string):
+        terms = []
+        for phrase, word in re_search_term.findall(search_string):
+            if phrase.strip():
+                terms.append(phrase)
+            elif word:
+                terms.append(word)
+        return terms
+
+    def fts_query(self, terms):
+
+        """Returns an FTS5 query for the terms which can be looked up in the
+        index, or an empty string if there are none.
+
+        """
+
+        return " ".join("\"%s\"" % term.replace("\"", "\"\"") for term in \
+            terms if len(term) >= MIN_INDEXED_TERM_LENGTH)
+
+    def like_condition(self, terms):
+
+        """Returns an SQL condition selecting the rows of the cards table (or
+        of the index, which has the same column names) which contain all
+        'terms'.
+
+        """
+
+        conditions = []
+        for term in terms:
+            term = term.replace("'", "''")
+            conditions.append("(question like '%%%s%%' or answer like "
+                "'%%%s%%' or tags like '%%%s%%')" % (term, term, term))
+        return " and ".join(conditions) if conditions else "1"
+
+    def _index_condition(self, search_string):
+
+        """Returns a condition on the index selecting the cards which match
+        'search_string', or None if the index cannot be used.
+
+        """
+
+        if not self._use_search_index(search_string):
+            return None
+        terms = self.search_terms(search_string)
+        query = self.fts_query(terms)
+        if not query:
+            return None
+        return "cards_fts match '%s' and %s" % (query.replace("'", "''"),
+            self.like_condition([term for term in terms \
+            if len(term) < MIN_INDEXED_TERM_LENGTH]))
+
+    def search_condition(self, search_string, use_search_index=True):
+
+        """Returns an SQL condition on the cards table selecting the cards
+        which match 'search_string', e.g. to be used as a filter in the card
+        browser. Set 'use_search_index' to False if the condition is to be
+        evaluated by an SQLite library which lacks FTS5.
+
+        """
+
+        if use_search_index:
+            condition = self._index_condition(search_string)
+            if condition:
+                return "_id in (select rowid from cards_fts where %s)" \
+                    % condition
+        return self.like_condition(self.search_terms(search_string))
+
+    def search_rank_statements(self, search_string):
+
+        """Returns the SQL statements which store the rank of the cards
+        matching 'search_string' in the temporary table 'search_ranks' of the
+        connection which executes them, or an empty list if the cards cannot
+        be ranked. The cards table can then be ordered by SEARCH_RANK, the
+        best matches first.
+
+        Ordering by the rank in the index directly would calculate the rank
+        of each card in a separate query, which is very slow for searches
+        with many matches.
+
+        """
+
+        condition = self._index_condition(search_string)
+        if not condition:
+            return []
+        return ["""create temp table if not exists search_ranks(
+            _id integer primary key, rank real)""",
+            "delete from search_ranks",
+            """insert into search_ranks select rowid, rank from cards_fts
+            where %s""" % condition]
+
+    def internal_ids_of_cards_matching(self, search_string, limit=-1):
+
+        """Returns the _ids of the cards matching 'search_string', the best
+        matches first if we have a full text index.
+
+        """
+
+        condition = self._index_condition(search_string)
+        if condition:
+            return [cursor[0] for cursor in self.con.execute(\
+                """select rowid from cards_fts where %s order by rank
+                limit ?""" % condition, (limit, ))]
+        return [cursor[0] for cursor in self.con.execute(\
+            "select _id from cards where %s limit ?" % \
+            self.search_condition(search_string, use_search_index=False),
+            (limit, ))]
@@ -19,33 +19,46 @@ class SQLiteStatistics(object):
     """
 
     def tag_count(self):
-        return self.con.execute("select count() from tags").fetchone()[0]
+        return self.read_con.execute("select count() from tags").fetchone()[0]
 
     def fact_count(self):
-        return self.con.execute("select count() from facts").fetchone()[0]
+        return self.read_con.execute("select count() from facts").fetchone()[0]
 
     def card_count(self):
-        return self.con.execute("""select count() from cards""").fetchone()[0]
+        return self.read_con.execute("""select count() from cards""").\
+            fetchone()[0]
 
     def non_memorised_count(self):
-        return self.con.execute("""select count() from cards
+        return self.read_con.execute("""select count() from cards
             where active=1 and grade<2""").fetchone()[0]
 
     def scheduled_count(self, timestamp):
-        count = self.con.execute("""select count() from cards
+        count = self.read_con.execute("""select count() from cards
             where active=1 and grade>=2 and ?>=next_rep""",
             (timestamp, )).fetchone()[0]
         return count
 
     def active_count(self):
-        return self.con.execute("""select count() from cards
+        return self.read_con.execute("""select count() from cards
             where active=1""").fetchone()[0]
 
+    def scheduled_non_memorised_and_active_count(self, timestamp):
+
+        """Same as 'scheduled_count', 'non_memorised_count' and
+        'active_count' together, but in a single pass over the cards.
+
+        """
+
+        scheduled, non_memorised, active = self.read_con.execute(\
+            """select sum(grade>=2 and ?>=next_rep), sum(grade<2), count()
+            from cards where active=1""", (timestamp, )).fetchone()
+        return scheduled or 0, non_memorised or 0, active
+
     def easinesses(self, active_only):
         query = "select easiness from cards where grade>=0"
         if active_only:
             query += " and active=1"
-        return [cursor[0] for cursor in self.con.execute(query)]
+        return [cursor[0] for cursor in self.read_con.execute(query)]
 
     def easinesses_for_tag(self, tag, active_only):
         query = """select cards.easiness from cards, tags_for_card where
@@ -53,20 +66,20 @@ class SQLiteStatistics(object):
             tags_for_card._tag_id=?"""
         if active_only:
             query += " and cards.active=1"
-        return [cursor[0] for cursor in self.con.execute(query,
+        return [cursor[0] for cursor in self.read_con.execute(query,
             (tag._id, ))]
 
     def card_count_for_fact_view(self, fact_view, active_only):
         query = "select count() from cards where fact_view_id=?"
         if active_only:
             query += " and active=1"
-        return self.con.execute(query, (fact_view.id, )).fetchone()[0]
+        return self.read_con.execute(query, (fact_view.id, )).fetchone()[0]
 
     def card_count_for_grade(self, grade, active_only):
         query = "select count() from cards where grade=?"
         if active_only:
             query += " and active=1"
-        return self.con.execute(query, (grade, )).fetchone()[0]
+        return self.read_con.execute(query, (grade, )).fetchone()[0]
 
     def card_count_for_tags(self, tags, active_only):
 
@@ -87,7 +100,14 @@ class SQLiteStatistics(object):
             query += "_tag_id=? or "
             args.append(tag._id)
         query = query.rsplit("or ", 1)[0]
-        return self.con.execute(query, args).fetchone()[0]
+        return self.read_con.execute(query, args).fetchone()[0]
+
+    def card_and_tag_ids(self):
+
+        """Return all (_card_id, _tag_id) pairs, sorted by _card_id."""
+
+        return self.read_con.execute("""select _card_id, _tag_id from
+            tags_for_card order by _card_id""")
 
     def card_count_for_grade_and_tag(self, grade, tag, active_only):
         query = """select count() from cards, tags_for_card where
@@ -95,7 +115,7 @@ class SQLiteStatistics(object):
             and grade=?"""
         if active_only:
             query += " and cards.active=1"
-        return self.con.execute(query, (tag._id, grade)).fetchone()[0]
+        return self.read_con.execute(query, (tag._id, grade)).fetchone()[0]
 
     def sister_card_count_scheduled_between(self, card, start, stop):
 
@@ -125,7 +145,7 @@ class SQLiteStatistics(object):
         #    ?<=next_rep and next_rep<? and _id<>?"""
         #return self.con.execute(query, (start, stop, card._id)).fetchone()[0]
 
-        _card_ids = [cursor[0] for cursor in self.con.execute(\
+        _card_ids = [cursor[0] for cursor in self.read_con.execute(\
             "select _id from cards where _fact_id=?", (card.fact._id, ))]
         if len(_card_ids) == 1: # No sister cards
             return 0
@@ -135,16 +155,44 @@ class SQLiteStatistics(object):
                 query += str(_card_id) + ","
         query = query[:-1] + """)"""
         count = 0
-        for cursor in self.con.execute(query):
+        for cursor in self.read_con.execute(query):
             if cursor[0] == True and cursor[1] >= 2 \
                 and start <= cursor[2] < stop:
                 count += 1
         return count
 
+    def sister_card_next_reps(self, card):
+
+        """Return the next_rep of all active sister cards with grade >= 2, in
+        ascending order.
+
+        """
+
+        return [cursor[0] for cursor in self.read_con.execute(\
+            """select next_rep from cards where _fact_id=? and _id<>?
+            and active=1 and grade>=2 order by next_rep""",
+            (card.fact._id, card._id))]
+
+    def card_count_scheduled_per_day(self, start, days):
+
+        """Return a list with the number of active cards with grade >= 2
+        scheduled on each of the 'days' days starting at 'start', using a
+        single query.
+
+        """
+
+        counts = [0] * days
+        for cursor in self.read_con.execute(\
+            """select (next_rep - ?) / ?, count() from cards where active=1
+            and grade>=2 and ?<=next_rep and next_rep<? group by 1""",
+            (start, DAY, start, start + days * DAY)):
+            counts[int(cursor[0])] += cursor[1]
+        return counts
+
     def card_count_scheduled_between(self, start, stop):
-        return self.con.execute(\
+        return self.read_con.execute(\
             """select count() from cards where grade>=2
-            and ?<=next_rep and next_rep<? and active='1'""",
+            and ?<=next_rep and next_rep<? and active=1""",
             (start, stop)).fetchone()[0]
 
     def start_of_day_n_days_ago(self, n):
@@ -166,8 +214,8 @@ class SQLiteStatistics(object):
         # scheduled that was projected in the future during database load
         # events. For each machine, we take the largest number in the logs,
         # i.e. those at the start of the day.
-        for cursor in self.con.execute("""select acq_reps, object_id from log
-            where ?<=timestamp and timestamp<? and (event_type=? or
+        for cursor in self.read_con.execute("""select acq_reps, object_id from
+            log where ?<=timestamp and timestamp<? and (event_type=? or
             event_type=?)""", (start_of_day, start_of_day + DAY,
             EventTypes.LOADED_DATABASE, EventTypes.SAVED_DATABASE)):
             count = cursor[0]
@@ -204,7 +252,7 @@ class SQLiteStatistics(object):
 
     def card_count_added_n_days_ago(self, n):
         start_of_day = self.start_of_day_n_days_ago(n)
-        return self.con.execute(\
+        return self.read_con.execute(\
             """select count() from log where ?<=timestamp and timestamp<?
             and event_type=?""",
             (start_of_day, start_of_day + DAY, EventTypes.ADDED_CARD)).\
@@ -212,7 +260,7 @@ class SQLiteStatistics(object):
 
     def card_count_learned_n_days_ago(self, n):
         start_of_day = self.start_of_day_n_days_ago(n)
-        return self.con.execute(\
+        return self.read_con.execute(\
             """select count() from log where ?<=timestamp and timestamp<?
             and event_type=? and grade>=2 and ret_reps==0""",
             (start_of_day, start_of_day + DAY, EventTypes.REPETITION)).\
@@ -220,14 +268,14 @@ class SQLiteStatistics(object):
 
     def retention_score_n_days_ago(self, n):
         start_of_day = self.start_of_day_n_days_ago(n)
-        scheduled_cards_seen = self.con.execute(\
+        scheduled_cards_seen = self.read_con.execute(\
             """select count() from log where ?<=timestamp and timestamp<?
             and event_type=? and scheduled_interval!=0""",
             (start_of_day, start_of_day + DAY, EventTypes.REPETITION)).\
             fetchone()[0]
         if scheduled_cards_seen == 0:
             return 0
-        scheduled_cards_correct = self.con.execute(\
+        scheduled_cards_correct = self.read_con.execute(\
             """select count() from log where ?<=timestamp and timestamp<?
             and event_type=? and scheduled_interval!=0 and grade>=2""",
             (start_of_day, start_of_day + DAY, EventTypes.REPETITION)).\
@@ -235,7 +283,7 @@ class SQLiteStatistics(object):
         return 100.0 * scheduled_cards_correct / scheduled_cards_seen
 
     def average_thinking_time(self, card):
-        result = self.con.execute(\
+        result = self.read_con.execute(\
             """select avg(thinking_time) from log where object_id=?
             and event_type=?""",
             (card.id, EventTypes.REPETITION)).fetchone()[0]
@@ -245,7 +293,7 @@ class SQLiteStatistics(object):
             return 0
 
     def total_thinking_time(self, card):
-        result = self.con.execute(\
+        result = self.read_con.execute(\
             """select sum(thinking_time) from log where object_id=?
             and event_type=?""",
             (card.id, EventTypes.REPETITION)).fetchone()[0]
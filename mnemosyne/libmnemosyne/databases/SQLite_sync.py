@@ -7,6 +7,7 @@
 import os
 import re
 import time
+import itertools
 import sqlite3
 
 from openSM2sync.log_entry import LogEntry
@@ -18,6 +19,7 @@ from mnemosyne.libmnemosyne.card import Card
 from mnemosyne.libmnemosyne.translator import _
 from mnemosyne.libmnemosyne.card_type import CardType
 from mnemosyne.libmnemosyne.fact_view import FactView
+from mnemosyne.libmnemosyne.serialization import deserialize
 from mnemosyne.libmnemosyne.utils import MnemosyneError
 from mnemosyne.libmnemosyne.utils import normalise_path, expand_path
 
@@ -127,6 +129,7 @@ class SQLiteSync(object):
             applier = self.component_manager.current("criterion_applier",
                 used_for=criterion.__class__)
             applier.apply_to_database(criterion)
+            self._card_cache.clear()
         # Now we can update the last log index.
         self.con.execute(\
             "update partnerships set _last_log_id=? where partner=?",
@@ -158,19 +161,18 @@ class SQLiteSync(object):
 
         _id = self.last_log_index_synced_for(partner)
         if interested_in_old_reps:
-            return (self._log_entry(cursor) for cursor in self.con.execute(\
+            return self._log_entries(self.con.execute(\
                 "select * from log where _id>?", (_id, )))
         else:
-            return (self._log_entry(cursor) for cursor in self.con.execute(\
+            return self._log_entries(self.con.execute(\
                 "select * from log where _id>? and event_type!=?",
                 (_id, EventTypes.REPETITION)))
 
     def all_log_entries(self, interested_in_old_reps=True):
         if interested_in_old_reps:
-            return (self._log_entry(cursor) for cursor in self.con.execute(\
-                "select * from log"))
+            return self._log_entries(self.con.execute("select * from log"))
         else:
-            return (self._log_entry(cursor) for cursor in self.con.execute(\
+            return self._log_entries(self.con.execute(\
                 "select * from log where event_type!=?",
                 (EventTypes.REPETITION, )))
 
@@ -260,7 +262,8 @@ class SQLiteSync(object):
         # Fact views.
         active_objects["fact_view_ids"] = []
         for card_type_id in active_objects["card_type_ids"]:
-            active_objects["fact_view_ids"] += eval(self.con.execute(\
+            active_objects["fact_view_ids"] += \
+                deserialize(self.con.execute(\
                 "select fact_view_ids from card_types where id=?",
                 (card_type_id, )).fetchone()[0])
         # Media files for active cards.
@@ -275,9 +278,42 @@ class SQLiteSync(object):
     def set_extra_tags_on_import(self, tags):
         self.extra_tags_on_import = tags
 
-    def _log_entry(self, sql_res):
+    def _log_entries(self, cursor):
 
-        """Create log entry object in the format openSM2sync expects."""
+        """Iterate over the log entries corresponding to the rows in 'cursor'.
+        The rows are processed in batches, such that the cards and facts
+        they refer to can be loaded in bulk.
+
+        """
+
+        while True:
+            sql_results = list(itertools.islice(cursor, self.max_batch_size))
+            if not sql_results:
+                return
+            card_ids, fact_ids = set(), set()
+            for sql_res in sql_results:
+                if sql_res[1] in (EventTypes.ADDED_CARD,
+                    EventTypes.EDITED_CARD):
+                    card_ids.add(sql_res[3])
+                elif sql_res[1] in (EventTypes.ADDED_FACT,
+                    EventTypes.EDITED_FACT):
+                    fact_ids.add(sql_res[3])
+            card_with_id = dict((card.id, card) for card in \
+                self.cards_with_ids(card_ids, is_id_internal=False))
+            fact_with_id = dict((fact.id, fact) for fact in \
+                self.facts_with_ids(fact_ids, is_id_internal=False))
+            for sql_res in sql_results:
+                yield self._log_entry(sql_res, card_with_id, fact_with_id)
+
+    def _log_entry(self, sql_res, card_with_id=None, fact_with_id=None):
+
+        """Create log entry object in the format openSM2sync expects.
+
+        'card_with_id' and 'fact_with_id' are optional dictionaries with
+        preloaded objects (see '_log_entries'). An object missing from them
+        has been deleted at a later stage.
+
+        """
 
         log_entry = LogEntry()
         log_entry["type"] = sql_res[1]
@@ -292,7 +328,12 @@ class SQLiteSync(object):
             log_entry["n_mem"] = sql_res[7]
             log_entry["act"] = sql_res[8]
         elif event_type in (EventTypes.ADDED_CARD, EventTypes.EDITED_CARD):
-            if self.has_card_with_id(log_entry["o_id"]):
+            if card_with_id is None:
+                card_with_id = {}
+                if self.has_card_with_id(log_entry["o_id"]):
+                    card_with_id[log_entry["o_id"]] = \
+                        self.card(log_entry["o_id"], is_id_internal=False)
+            if log_entry["o_id"] in card_with_id:
                 # Note that some of these values (e.g. the repetition count) we
                 # could in theory calculate from the previous state and the
                 # grade. However, we send the entire state of the card across
@@ -300,7 +341,7 @@ class SQLiteSync(object):
                 # because of conflict resolution.
                 # Note that we deliberately do not send across 'active', as
                 # this is controlled by the remote client.
-                card = self.card(log_entry["o_id"], is_id_internal=False)
+                card = card_with_id[log_entry["o_id"]]
                 if self.sync_partner_info.get("capabilities") == "cards":
                     log_entry["f"] = card.question("sync_to_card_only_client")
                     log_entry["b"] = card.answer("sync_to_card_only_client")
@@ -356,8 +397,13 @@ class SQLiteSync(object):
             if self.sync_partner_info.get("capabilities") == "cards":
                 # The accompanying ADDED_CARD and EDITED_CARD events suffice.
                 return None
-            if self.has_fact_with_id(log_entry["o_id"]):
-                fact = self.fact(log_entry["o_id"], is_id_internal=False)
+            if fact_with_id is None:
+                fact_with_id = {}
+                if self.has_fact_with_id(log_entry["o_id"]):
+                    fact_with_id[log_entry["o_id"]] = \
+                        self.fact(log_entry["o_id"], is_id_internal=False)
+            if log_entry["o_id"] in fact_with_id:
+                fact = fact_with_id[log_entry["o_id"]]
                 for fact_key, value in fact.data.items():
                     log_entry[fact_key] = value
             else: # The object has been deleted at a later stage.
@@ -454,7 +500,7 @@ class SQLiteSync(object):
         # Create tag object.
         tag = Tag(log_entry["name"], log_entry["o_id"])
         if "extra" in log_entry:
-            tag.extra_data = eval(log_entry["extra"])
+            tag.extra_data = deserialize(log_entry["extra"])
         # Make sure to create _id fields as well, otherwise database
         # operations or their side effects could fail.
         if log_entry["type"] != EventTypes.ADDED_TAG:
@@ -512,7 +558,7 @@ class SQLiteSync(object):
                 card.last_rep = orig_card.last_rep
                 card.modification_time = int(time.time())
                 if "extra" in log_entry:
-                    card.extra_data = eval(log_entry["extra"])
+                    card.extra_data = deserialize(log_entry["extra"])
                 card.tags = orig_card.tags
                 for tag_id in log_entry["tags"].split(","):
                     card.tags.add(self.tag(tag_id, is_id_internal=False))
@@ -633,7 +679,7 @@ class SQLiteSync(object):
         if "sch_data" in log_entry:
             card.scheduler_data = log_entry["sch_data"]
         if "extra" in log_entry:
-            card.extra_data = eval(log_entry["extra"])
+            card.extra_data = deserialize(log_entry["extra"])
         return card
 
     def apply_repetition(self, log_entry):
@@ -654,6 +700,7 @@ class SQLiteSync(object):
             card.ret_reps, card.lapses, card.acq_reps_since_lapse,
             card.ret_reps_since_lapse, card.last_rep, card.next_rep,
             card.scheduler_data, card.id))
+        self._card_cache.discard_id(card.id)
 
     def add_media_file(self, log_entry):
 
@@ -721,14 +768,16 @@ class SQLiteSync(object):
             return FactView("irrelevant", log_entry["o_id"])
         # Create fact view object.
         fact_view = FactView(log_entry["name"], log_entry["o_id"])
-        fact_view.q_fact_keys = eval(log_entry["q_fact_keys"])
-        fact_view.a_fact_keys = eval(log_entry["a_fact_keys"])
-        fact_view.q_fact_key_decorators = eval(log_entry["q_fact_key_decorators"])
-        fact_view.a_fact_key_decorators = eval(log_entry["a_fact_key_decorators"])
-        fact_view.a_on_top_of_q = bool(eval(log_entry["a_on_top_of_q"]))
-        fact_view.type_answer = bool(eval(log_entry["type_answer"]))
+        fact_view.q_fact_keys = deserialize(log_entry["q_fact_keys"])
+        fact_view.a_fact_keys = deserialize(log_entry["a_fact_keys"])
+        fact_view.q_fact_key_decorators = \
+            deserialize(log_entry["q_fact_key_decorators"])
+        fact_view.a_fact_key_decorators = \
+            deserialize(log_entry["a_fact_key_decorators"])
+        fact_view.a_on_top_of_q = bool(deserialize(log_entry["a_on_top_of_q"]))
+        fact_view.type_answer = bool(deserialize(log_entry["type_answer"]))
         if "extra" in log_entry:
-            fact_view.extra_data = eval(log_entry["extra"])
+            fact_view.extra_data = deserialize(log_entry["extra"])
         return fact_view
 
     def add_card_type_from_log_entry(self, log_entry):
@@ -778,16 +827,19 @@ class SQLiteSync(object):
         card_type = CardType(self.component_manager)
         card_type.id = log_entry["o_id"]
         card_type.name = log_entry["name"]
-        card_type.fact_keys_and_names = eval(log_entry["fact_keys_and_names"])
+        card_type.fact_keys_and_names = \
+            deserialize(log_entry["fact_keys_and_names"])
         card_type.fact_views = []
-        for fact_view_id in eval(log_entry["fact_views"]):
+        for fact_view_id in deserialize(log_entry["fact_views"]):
             card_type.fact_views.append(self.fact_view(fact_view_id,
                 is_id_internal=False))
-        card_type.unique_fact_keys = eval(log_entry["unique_fact_keys"])
-        card_type.required_fact_keys = eval(log_entry["required_fact_keys"])
-        card_type.keyboard_shortcuts = eval(log_entry["keyboard_shortcuts"])
+        card_type.unique_fact_keys = deserialize(log_entry["unique_fact_keys"])
+        card_type.required_fact_keys = \
+            deserialize(log_entry["required_fact_keys"])
+        card_type.keyboard_shortcuts = \
+            deserialize(log_entry["keyboard_shortcuts"])
         if "extra" in log_entry:
-            card_type.extra_data = eval(log_entry["extra"])
+            card_type.extra_data = deserialize(log_entry["extra"])
         return card_type
 
     def criterion_from_log_entry(self, log_entry):
@@ -893,7 +945,7 @@ class SQLiteSync(object):
             elif event_type == EventTypes.DELETED_CRITERION:
                 self.delete_criterion(self.criterion_from_log_entry(log_entry))
             elif event_type == EventTypes.EDITED_SETTING:
-                key, value = log_entry["o_id"], eval(log_entry["value"])
+                key, value = log_entry["o_id"], deserialize(log_entry["value"])
                 if key in self.config().keys_to_sync:
                     self.config()[key] = value
                     for card_type in self.card_types():
@@ -8,14 +8,71 @@
 #
 
 import os
+import re
 import sys
 import time
 import sqlite3
+import threading
+from urllib.request import pathname2url
 
 from mnemosyne.libmnemosyne.translator import _
 from mnemosyne.libmnemosyne.component import Component
 
 
+re_quoted = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+
+
+def normalise_sql(sql):
+
+    """Collapse whitespace outside of quoted literals, so that the same query
+    written in different ways maps to the same statement.
+
+    """
+
+    parts = re_quoted.split(sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = " ".join(parts[i].split())
+    return "".join(parts).strip()
+
+
+class QueryProfiler(object):
+
+    """Keeps track of the number of calls, and the total and maximum time
+    spent in 'execute' for each normalised query. Note that for a select, the
+    time to fetch all but the first row is not included.
+
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock() # Readers live in other threads.
+        self.reset()
+
+    def reset(self):
+        self.stats = {} # {sql: [count, total_time, max_time]}
+
+    def record(self, sql, duration):
+        with self.lock:
+            stats = self.stats.get(sql)
+            if stats is None:
+                self.stats[sql] = [1, duration, duration]
+            else:
+                stats[0] += 1
+                stats[1] += duration
+                if duration > stats[2]:
+                    stats[2] = duration
+
+    def dump(self, number_of_queries=20):
+        print("   count    total(s)      max(s)  query")
+        for sql, (count, total, maximum) in sorted(self.stats.items(),
+            key=lambda x: x[1][1], reverse=True)[:number_of_queries]:
+            print("%8d %11.4f %11.4f  %s" % (count, total, maximum, sql))
+
+
+# Shared between connections, such that we have the statistics for an entire
+# session.
+profiler = QueryProfiler()
+
+
 class _Sqlite3Cursor(object):
 
     def __init__(self, cursor):
@@ -27,6 +84,10 @@ class _Sqlite3Cursor(object):
     def fetchall(self):
         return self.cursor.fetchall()
 
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
     def __iter__(self):
         return self
 
@@ -34,10 +95,35 @@ class _Sqlite3Cursor(object):
         return next(self.cursor)
 
 
+class _Sqlite3Reader(object):
+
+    """Read-only connection, to be used by a single thread."""
+
+    def __init__(self, path, normalise):
+        self.normalise = normalise
+        # Closing happens from the writer's thread.
+        self.connection = sqlite3.connect("file:%s?mode=ro" % \
+            pathname2url(os.path.abspath(path)), uri=True,
+            check_same_thread=False)
+
+    def execute(self, sql, *args):
+        sql = self.normalise(sql)
+        t = time.perf_counter()
+        cursor = self.connection.execute(sql, *args)
+        profiler.record(sql, time.perf_counter() - t)
+        return _Sqlite3Cursor(cursor)
+
+    def close(self):
+        return self.connection.close()
+
+
 class _Sqlite3(Component):
 
     DEBUG = False
 
+    # sqlite3 keeps the prepared statements for this many different queries.
+    statement_cache_size = 256
+
     def __init__(self, component_manager, path):
         Component.__init__(self, component_manager)
         self._cursor = None
@@ -50,9 +136,21 @@ class _Sqlite3(Component):
                 self.main_widget().show_error(_\
 ("Putting a database on a network drive is forbidden under Windows to avoid data corruption. Mnemosyne will now close."))
                 sys.exit(-1)
-        self.connection = sqlite3.connect(path)
-        # http://www.mail-archive.com/sqlite-users@sqlite.org/msg34453.html
-        self.connection.execute("pragma journal_mode = persist;")
+        self.path = path
+        self.thread_id = threading.get_ident()
+        self.connection = sqlite3.connect(path,
+            cached_statements=self.statement_cache_size)
+        self._normalised_sql = {}
+        self.is_wal = False
+        if self.config()["wal_mode"] == True:
+            # Can fail e.g. on network file systems.
+            self.is_wal = self.connection.execute(\
+                "pragma journal_mode = wal;").fetchone()[0] == "wal"
+        if not self.is_wal:
+            # http://www.mail-archive.com/sqlite-users@sqlite.org/msg34453.html
+            self.connection.execute("pragma journal_mode = persist;")
+        self._readers = {} # By thread id.
+        self._readers_lock = threading.Lock()
         # Should only be used to speed up the test suite.
         if self.config()["asynchronous_database"] == True:
             self.connection.execute("pragma synchronous = off;")
@@ -65,24 +163,92 @@ class _Sqlite3(Component):
         if self.DEBUG:
             print(("took %.3f secs" % (time.time() - t)))
 
+    def _normalise(self, sql):
+        normalised_sql = self._normalised_sql.get(sql)
+        if normalised_sql is None:
+            # Queries with e.g. a variable number of placeholders could
+            # otherwise make this grow without bounds.
+            if len(self._normalised_sql) > 10 * self.statement_cache_size:
+                self._normalised_sql = {}
+            normalised_sql = normalise_sql(sql)
+            self._normalised_sql[sql] = normalised_sql
+        return normalised_sql
+
     def execute(self, sql, *args):
+        sql = self._normalise(sql)
         if self.DEBUG:
             print((sql, args))
-            t = time.time()
+        t = time.perf_counter()
         self._cursor = self.connection.execute(sql, *args)
+        duration = time.perf_counter() - t
+        profiler.record(sql, duration)
         if self.DEBUG:
-            print(("took %.3f secs" % (time.time() - t)))
+            print(("took %.3f secs" % duration))
         return _Sqlite3Cursor(self._cursor)
 
     def executemany(self, sql, *args):
+        sql = self._normalise(sql)
         if self.DEBUG:
             print((sql, args))
-            t = time.time()
+        t = time.perf_counter()
         self._cursor = self.connection.executemany(sql, *args)
+        duration = time.perf_counter() - t
+        profiler.record(sql, duration)
         if self.DEBUG:
-            print(("took %.3f secs" % (time.time() - t)))
+            print(("took %.3f secs" % duration))
         return _Sqlite3Cursor(self._cursor)
 
+    def backup(self, path, pages, pause=None):
+
+        """Copy the database to 'path' using the online backup API, 'pages'
+        pages at a time. Threads other than the one which created this
+        connection copy from a connection of their own, which only sees
+        committed data. If 'pause' is set, we sleep that many seconds after
+        each step, so that other connections can get at the database.
+
+        """
+
+        if threading.get_ident() == self.thread_id:
+            source = self.connection
+        else:
+            source = sqlite3.connect(self.path)
+        progress = None
+        if pause:
+            progress = lambda status, remaining, total: time.sleep(pause)
+        target = sqlite3.connect(path)
+        try:
+            source.backup(target, pages=pages, progress=progress)
+        finally:
+            target.close()
+            if source is not self.connection:
+                source.close()
+
+    def reader(self):
+
+        """Connection for read-only queries from the calling thread. In WAL
+        mode, each thread other than the one which created this connection
+        gets a read-only connection of its own, which can read in parallel
+        with this one. The creating thread always gets this connection, such
+        that it sees its own uncommitted changes.
+
+        """
+
+        thread_id = threading.get_ident()
+        if not self.is_wal or thread_id == self.thread_id:
+            return self
+        with self._readers_lock:
+            reader = self._readers.get(thread_id)
+            if reader is None:
+                # Clean up after threads which have finished.
+                alive_ids = set(thread.ident for thread in \
+                    threading.enumerate())
+                for id in list(self._readers.keys()):
+                    if id not in alive_ids:
+                        self._readers.pop(id).close()
+                reader = _Sqlite3Reader(self.path, self._normalise)
+                self._readers[thread_id] = reader
+        return reader
+
     def last_insert_rowid(self):
         return self._cursor.lastrowid
 
@@ -90,5 +256,9 @@ class _Sqlite3(Component):
         return self.connection.commit()
 
     def close(self):
+        with self._readers_lock:
+            for reader in self._readers.values():
+                reader.close()
+            self._readers = {}
         del self._cursor
         return self.connection.close()
\ No newline at end of file
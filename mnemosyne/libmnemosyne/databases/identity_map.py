@@ -0,0 +1,79 @@
+#
+# identity_map.py <Peter.Bienstman@UGent.be>
+#
+
+import collections
+
+
+class IdentityMap(object):
+
+    """Bounded cache of objects (cards, facts, tags) loaded from the database,
+    such that repeated lookups return the same live object without having to
+    go back to SQL. When full, the least recently used object is evicted.
+
+    Objects are stored under their internal '_id', but can also be retrieved
+    using their external 'id' (as it was when the object was stored).
+
+    It is the responsibility of the database to keep this cache coherent, by
+    storing objects when they are written to the database, and by discarding
+    objects affected by SQL statements which bypass the object layer.
+
+    'hits' and 'misses' are kept for benchmarking purposes.
+
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._object_for__id = collections.OrderedDict()
+        self._id_for_id = {}
+
+    def get(self, id, is_id_internal):
+        if is_id_internal:
+            _id = id
+        else:
+            _id = self._id_for_id.get(id)
+        entry = self._object_for__id.get(_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._object_for__id.move_to_end(_id)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, obj):
+        if obj._id is None:
+            return
+        self.discard_internal_id(obj._id)
+        self._object_for__id[obj._id] = (obj, obj.id)
+        self._id_for_id[obj.id] = obj._id
+        while len(self._object_for__id) > self.max_size:
+            _id, (evicted, id) = self._object_for__id.popitem(last=False)
+            self._forget_id(id, _id)
+
+    def _forget_id(self, id, _id):
+        if self._id_for_id.get(id) == _id:
+            del self._id_for_id[id]
+
+    def discard_internal_id(self, _id):
+        entry = self._object_for__id.pop(_id, None)
+        if entry is not None:
+            self._forget_id(entry[1], _id)
+
+    def discard_id(self, id):
+        _id = self._id_for_id.get(id)
+        if _id is not None:
+            self.discard_internal_id(_id)
+
+    def discard_if(self, predicate):
+        for _id in [_id for _id, (obj, id) in \
+            self._object_for__id.items() if predicate(obj)]:
+            self.discard_internal_id(_id)
+
+    def clear(self):
+        self._object_for__id.clear()
+        self._id_for_id.clear()
+
+    def __len__(self):
+        return len(self._object_for__id)
@@ -33,13 +33,14 @@ class CuecardWcu(FileFormat, MediaPreprocessor):
         card_type = self.card_type_with_id("1")
         tag_names = [tag_name.strip() for \
             tag_name in extra_tag_names.split(",") if tag_name.strip()]
+        new_cards = []
         for element in tree.getroot().findall("Card"):
             fact_data = {"f": element.attrib["Question"],
                 "b": element.attrib["Answer"]}
             self.preprocess_media(fact_data, tag_names)
-            card = self.controller().create_new_cards(fact_data, card_type,
-                grade=-1, tag_names=tag_names,
-                check_for_duplicates=False, save=False)[0]
+            new_cards.append((fact_data, card_type, -1, list(tag_names)))
             if _("MISSING_MEDIA") in tag_names:
                 tag_names.remove(_("MISSING_MEDIA"))
+        self.controller().create_new_cards_in_bulk(new_cards,
+            check_for_duplicates=False, save=False)
         self.warned_about_missing_media = False
@@ -113,8 +113,8 @@ class Mnemosyne2Cards(FileFormat):
             log_entry["fname"] = media_filename
             xml_file.write(str(xml_format.repr_log_entry(log_entry)))
             w.increase_progress(1)
-        for _fact_id in active_objects["_fact_ids"]:
-            fact = db.fact(_fact_id, is_id_internal=True)
+        for fact in db.facts_with_ids(active_objects["_fact_ids"],
+                                      is_id_internal=True):
             log_entry = LogEntry()
             log_entry["type"] = EventTypes.ADDED_FACT
             log_entry["o_id"] = fact.id
@@ -122,8 +122,8 @@ class Mnemosyne2Cards(FileFormat):
                 log_entry[fact_key] = value
             xml_file.write(xml_format.repr_log_entry(log_entry))
             w.increase_progress(1)
-        for _card_id in active_objects["_card_ids"]:
-            card = db.card(_card_id, is_id_internal=True)
+        for card in db.cards_with_ids(active_objects["_card_ids"],
+                                      is_id_internal=True):
             log_entry = LogEntry()
             log_entry["type"] = EventTypes.ADDED_CARD
             log_entry["o_id"] = card.id
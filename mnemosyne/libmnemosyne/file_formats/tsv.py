@@ -80,17 +80,18 @@ class Tsv(FileFormat, MediaPreprocessor):
         # Now that we know all the data is well-formed, create the cards.
         tag_names = [tag_name.strip() for \
             tag_name in extra_tag_names.split(",") if tag_name.strip()]
+        new_cards = []
         for fact_data in facts_data:
             if len(list(fact_data.keys())) == 2:
                 card_type = self.card_type_with_id("1")
             else:
                 card_type = self.card_type_with_id("3")
             self.preprocess_media(fact_data, tag_names)
-            print(fact_data)
-            self.controller().create_new_cards(fact_data, card_type, grade=-1,
-                tag_names=tag_names, check_for_duplicates=False, save=False)
+            new_cards.append((fact_data, card_type, -1, list(tag_names)))
             if _("MISSING_MEDIA") in tag_names:
                 tag_names.remove(_("MISSING_MEDIA"))
+        self.controller().create_new_cards_in_bulk(new_cards,
+            check_for_duplicates=False, save=False)
         self.warned_about_missing_media = False
 
     def process_string_for_text_export(self, text):
@@ -109,8 +110,8 @@ class Tsv(FileFormat, MediaPreprocessor):
         w.set_progress_range(number_of_cards)
         w.set_progress_update_interval(number_of_cards/50)
         outfile = open(filename, "w", encoding="utf-8")
-        for _card_id, _fact_id in db.active_cards():
-            card = db.card(_card_id, is_id_internal=True)
+        _card_ids = [_card_id for _card_id, _fact_id in db.active_cards()]
+        for card in db.cards_with_ids(_card_ids, is_id_internal=True):
             q = self.process_string_for_text_export(\
                 card.question(render_chain="plain_text"))
             a = self.process_string_for_text_export(\
@@ -16,10 +16,17 @@ class Filter(Component):
     The filters are executed in the order they are listed in the RenderChain.
     If you really need to make sure that your filter runs before the
     rest, set 'in_front=True' as argument in 'render_chain.register_filter'.
+
+    Render chains cache their output, so the result of 'run' should only
+    depend on its arguments and on the configuration. Filters which do more
+    than transforming the text, like playing a sound, should set
+    'has_side_effects = True', which disables the cache of the render chains
+    they are in.
     
     """
 
     component_type = "filter"
+    has_side_effects = False
 
     def run(self, text, card, fact_key, **render_args):
         raise NotImplementedError
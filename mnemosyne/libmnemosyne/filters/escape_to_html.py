@@ -2,8 +2,50 @@
 # escape_to_html.py <Peter.Bienstman@UGent.be>
 #
 
+import re
+import bisect
+
 from mnemosyne.libmnemosyne.filter import Filter
 
+# Tags inside which newlines are not replaced by <br>, and newlines.
+re_block_or_newline = re.compile(\
+    r"<(/?)(?:ul|table|latex|script|textarea)|[\n\r]")
+re_angle_bracket = re.compile(r"[<>]")
+
+# Length added to the text by replacing a newline with <br>.
+GROWTH = len("<br>") - 1
+
+
+class _NextUnreplaced(object):
+
+    """Finds the first position in a sorted list of positions of a character
+    which has not been replaced yet, skipping over the replaced ones like a
+    disjoint set.
+
+    """
+
+    def __init__(self, positions):
+        self.positions = positions
+        self._next = list(range(len(positions) + 1))
+
+    def pop(self, start):
+
+        """Return and mark as replaced the first position >= 'start', or
+        None if there is none.
+
+        """
+
+        i = bisect.bisect_left(self.positions, start)
+        root = i
+        while self._next[root] != root:
+            root = self._next[root]
+        while self._next[i] != root:
+            self._next[i], i = root, self._next[i]
+        if root == len(self.positions):
+            return None
+        self._next[root] = root + 1
+        return self.positions[root]
+
 
 class EscapeToHtml(Filter):
 
@@ -15,39 +57,92 @@ class EscapeToHtml(Filter):
         lower_text = text.lower()
         linebreak_positions = []
         escape_breaks = True
-        for i in range(len(text)):
-            for tag in ["ul", "table", "latex", "script", "textarea"]:
-                if lower_text[i:].startswith("<" + tag):
-                    escape_breaks = False
-                if lower_text[i:].startswith("</" + tag):
-                    escape_breaks = True
-            if (lower_text[i] == "\n" or lower_text[i] == "\r") \
-                and escape_breaks:
-                linebreak_positions.append(i)
-        for linebreak_position in linebreak_positions:
-            text = text[:linebreak_position] + text[linebreak_position:]\
-                .replace("\n", "<br>", 1).replace("\r", "<br>", 1)
+        for match in re_block_or_newline.finditer(lower_text):
+            i = match.start()
+            if i >= len(text):
+                break
+            if match.group(1) is None: # Newline.
+                if escape_breaks:
+                    linebreak_positions.append(i)
+            else:
+                escape_breaks = (match.group(1) == "/")
+        if "\r" not in text and len(lower_text) == len(text) and \
+            len(linebreak_positions) == text.count("\n"):
+            text = text.replace("\n", "<br>")
+        elif linebreak_positions:
+            text = self._replace_linebreaks(text, linebreak_positions)
         # Escape hanging <.
         hanging = []
         open = 0
         pending = 0
-        for i in range(len(text)):
+        for match in re_angle_bracket.finditer(text):
+            i = match.start()
             if text[i] == "<":
                 if open != 0:
                     hanging.append(pending)
-                    pending = i
-                    continue
-                open += 1
                 pending = i
-            elif text[i] == ">":
-                if open > 0:
-                    open -= 1
+                open = 1
+            else:
+                open = 0
         if open != 0:
             hanging.append(pending)
-        new_text = ""
-        for i in range(len(text)):
-            if i in hanging:
-                new_text += "&lt;"
+        if not hanging:
+            return text
+        pieces = []
+        start = 0
+        for i in hanging:
+            pieces.append(text[start:i])
+            pieces.append("&lt;")
+            start = i + 1
+        pieces.append(text[start:])
+        return "".join(pieces)
+
+    def _replace_linebreaks(self, text, linebreak_positions):
+
+        """Replace newlines by <br> in the same way as the original algorithm
+        did, which for each position 'p' in 'linebreak_positions' did
+
+            text = text[:p] + text[p:].replace("\\n", "<br>", 1)\\
+                .replace("\\r", "<br>", 1)
+
+        Note that these positions are not corrected for the text growing
+        after each replacement, which for \\r\\n or newlines inside e.g. latex
+        tags affects which newlines are replaced. Rather than building a new
+        string for each position, we keep track of the replaced positions in
+        the original text.
+
+        """
+
+        newlines = _NextUnreplaced(\
+            [i for i, c in enumerate(text) if c == "\n"])
+        carriage_returns = _NextUnreplaced(\
+            [i for i, c in enumerate(text) if c == "\r"])
+        replaced = [] # Sorted positions in the original text.
+        for p in linebreak_positions:
+            # Find the character in the original text covering position 'p'
+            # in the current text, i.e. after the replacements so far. The
+            # replaced character at 'replaced[i]' now starts at position
+            # 'replaced[i] + GROWTH * i'.
+            low, high = 0, len(replaced)
+            while low < high:
+                middle = (low + high) // 2
+                if replaced[middle] + GROWTH * (middle + 1) < p:
+                    low = middle + 1
+                else:
+                    high = middle
+            if low < len(replaced) and replaced[low] + GROWTH * low <= p:
+                start = replaced[low] # Inside a <br>, which has no newlines.
             else:
-                new_text += text[i]
-        return new_text
+                start = p - GROWTH * low
+            for positions in (newlines, carriage_returns):
+                i = positions.pop(start)
+                if i is not None:
+                    bisect.insort(replaced, i)
+        pieces = []
+        start = 0
+        for i in replaced:
+            pieces.append(text[start:i])
+            pieces.append("<br>")
+            start = i + 1
+        pieces.append(text[start:])
+        return "".join(pieces)
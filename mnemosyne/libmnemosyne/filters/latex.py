@@ -4,14 +4,16 @@
 
 import os
 import re
+import shutil
+import tempfile
 import subprocess as sp
+import concurrent.futures
 try:
     from hashlib import md5
 except ImportError:
     from md5 import md5
 
 from mnemosyne.libmnemosyne.hook import Hook
-from mnemosyne.libmnemosyne.utils import copy
 from mnemosyne.libmnemosyne.translator import _
 from mnemosyne.libmnemosyne.filter import Filter
 
@@ -44,52 +46,109 @@ class Latex(Filter):
             " ".join(self.config()["latex"])
         return md5(hash_input.encode("utf-8")).hexdigest() + ".png"
 
+    # Maximum number of latex commands processed at the same time. Each of
+    # them runs latex and then dvipng in a separate process.
+    max_parallel_jobs = os.cpu_count() or 1
+
     def create_latex_img_file(self, latex_command):
 
         """Creates png file from a latex command if needed. Returns path name
         relative to the media dir, to be stored in the media database (hence
-        with the linux path name convention). Also returns a boolean saying
-        whether the img file was newly created or still in the cache (needed
-        to speed up syncing).
+        with the linux path name convention), or None if there was a problem.
+
+        """
+
+        return self.create_latex_img_files([latex_command])[latex_command]
+
+    def create_latex_img_files(self, latex_commands):
+
+        """Same as 'create_latex_img_file', but for a list of latex commands,
+        returning a dictionary {latex_command: relative path name or None}.
+
+        Commands which result in the same image file are only processed once,
+        and missing images are created in parallel.
 
         """
 
-        img_name = self.latex_img_filename(latex_command)
         latex_dir = os.path.join(self.database().media_dir(), "_latex")
-        filename = os.path.join(latex_dir, img_name)
-        rel_filename = "_latex" + "/" + img_name  # To be stored in database.
-        if not os.path.exists(filename):
+        img_name_for_command = {}
+        command_for_img_name = {}
+        for latex_command in latex_commands:
+            img_name = self.latex_img_filename(latex_command)
+            img_name_for_command[latex_command] = img_name
+            if img_name not in command_for_img_name and not \
+                os.path.exists(os.path.join(latex_dir, img_name)):
+                command_for_img_name[img_name] = latex_command
+        failed_img_names = set()
+        if command_for_img_name:
             if not os.path.exists(latex_dir):
                 os.makedirs(latex_dir)
-            previous_dir = os.getcwd()
-            os.chdir(latex_dir)
-            if os.path.exists("tmp1.png"):
-                os.remove("tmp1.png")
-            if os.path.exists("tmp.dvi"):
-                os.remove("tmp.dvi")
-            if os.path.exists("tmp.aux"):
-                os.remove("tmp.aux")
-            f = open("tmp.tex", "w", encoding="utf-8")
-            print(self.config()["latex_preamble"], file=f)
-            print(latex_command, file=f)
-            print(self.config()["latex_postamble"], file=f)
-            f.close()
-            in_file = "tmp.tex"
-            self._call_cmd(self.config()["latex"] + [in_file],
-                           "latex_out.txt", in_file)
-            self._call_cmd(self.config()["dvipng"], "dvipng_out.txt")
-            if not os.path.exists("tmp1.png"):
-                return None
-            copy("tmp1.png", img_name)
-            self.log().added_media_file(rel_filename)
-            os.chdir(previous_dir)
-        return rel_filename
-
-    def _call_cmd(self, cmd, out_file, in_file=None):
+            failed_img_names = self._create_missing_latex_img_files(\
+                command_for_img_name, latex_dir)
+        # Path names to be stored in the database.
+        return dict((latex_command, None if img_name in failed_img_names \
+            else "_latex" + "/" + img_name) for latex_command, img_name \
+            in img_name_for_command.items())
+
+    def _create_missing_latex_img_files(self, command_for_img_name,
+                                        latex_dir):
+        # The jobs run in other threads, so we don't let them touch the
+        # configuration or the database.
+        settings = (self.config()["latex_preamble"],
+            self.config()["latex_postamble"], self.config()["latex"],
+            self.config()["dvipng"])
+        jobs = [(latex_command, img_name, latex_dir, settings) for \
+            img_name, latex_command in command_for_img_name.items()]
+        if len(jobs) == 1:
+            results = [self._create_latex_img_file(*jobs[0])]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=\
+                min(self.max_parallel_jobs, len(jobs))) as executor:
+                results = list(executor.map(\
+                    lambda job: self._create_latex_img_file(*job), jobs))
+        failed_img_names = set()
+        for img_name, created in zip(command_for_img_name, results):
+            if created:
+                self.log().added_media_file("_latex" + "/" + img_name)
+            else:
+                failed_img_names.add(img_name)
+        return failed_img_names
+
+    def _create_latex_img_file(self, latex_command, img_name, latex_dir,
+                               settings):
+
+        """Runs latex and dvipng in a temporary directory of its own, such
+        that several of these can run at the same time, and moves the image
+        to 'latex_dir'. Returns whether that succeeded.
+
+        """
+
+        preamble, postamble, latex, dvipng = settings
+        tmp_dir = tempfile.mkdtemp(dir=latex_dir)
+        try:
+            in_file = os.path.join(tmp_dir, "tmp.tex")
+            with open(in_file, "w", encoding="utf-8") as f:
+                print(preamble, file=f)
+                print(latex_command, file=f)
+                print(postamble, file=f)
+            self._call_cmd(latex + ["tmp.tex"],
+                os.path.join(tmp_dir, "latex_out.txt"), in_file, tmp_dir)
+            self._call_cmd(dvipng, os.path.join(tmp_dir, "dvipng_out.txt"),
+                cwd=tmp_dir)
+            png_file = os.path.join(tmp_dir, "tmp1.png")
+            if not os.path.exists(png_file):
+                return False
+            os.replace(png_file, os.path.join(latex_dir, img_name))
+            return True
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _call_cmd(self, cmd, out_file, in_file=None, cwd=None):
         """ Used to call latex or dvipng. """
         try:
             with open(out_file, "wb") as f:
-                sp.check_call(cmd, stdout=f, stderr=sp.STDOUT, timeout=60)
+                sp.check_call(cmd, stdout=f, stderr=sp.STDOUT, timeout=60,
+                              cwd=cwd)
         except PermissionError:
             print("Permission denied.")
         except FileNotFoundError:
@@ -111,7 +170,9 @@ class Latex(Filter):
 
         """Transform the latex tags to image tags."""
 
-        img_file = self.create_latex_img_file(latex_command)
+        return self._img_tag(self.create_latex_img_file(latex_command))
+
+    def _img_tag(self, img_file):
         if not img_file:
             return "<b>" + \
             _("Problem with latex. Are latex and dvipng installed?") + "</b>"
@@ -126,21 +187,41 @@ class Latex(Filter):
         """The actual filter code called on the question or answer text."""
 
         # Process <latex>...</latex> tags.
-        for match in re1.finditer(text):
-            img_tag = self.process_latex_img_tag(match.group(1))
+        matches = list(re1.finditer(text))
+        img_files = self.create_latex_img_files(\
+            [match.group(1) for match in matches])
+        for match in matches:
+            img_tag = self._img_tag(img_files[match.group(1)])
             text = text.replace(match.group(), img_tag)
         # Process <$>...</$> (equation) tags.
-        for match in re2.finditer(text):
-            img_tag = self.process_latex_img_tag("$" + match.group(1) + "$")
+        matches = list(re2.finditer(text))
+        img_files = self.create_latex_img_files(\
+            ["$" + match.group(1) + "$" for match in matches])
+        for match in matches:
+            img_tag = self._img_tag(img_files["$" + match.group(1) + "$"])
             text = text.replace(match.group(), img_tag)
         # Process <$$>...</$$> (displaymath) tags.
-        for match in re3.finditer(text):
-            img_tag = self.process_latex_img_tag("\\begin{displaymath}" \
-                       + match.group(1) + "\\end{displaymath}")
+        matches = list(re3.finditer(text))
+        img_files = self.create_latex_img_files(\
+            [self._displaymath(match.group(1)) for match in matches])
+        for match in matches:
+            img_tag = self._img_tag(img_files[\
+                self._displaymath(match.group(1))])
             text = text.replace(match.group(), "<center>" \
                        + img_tag + "</center>")
         return text
 
+    def _displaymath(self, latex_command):
+        return "\\begin{displaymath}" + latex_command + "\\end{displaymath}"
+
+    def latex_commands(self, text):
+
+        """Return the latex commands for all the latex tags in 'text'."""
+
+        return [match.group(1) for match in re1.finditer(text)] + \
+            ["$" + match.group(1) + "$" for match in re2.finditer(text)] + \
+            [self._displaymath(match.group(1)) for match in re3.finditer(text)]
+
 
 class CheckForUpdatedLatexFiles(Hook):
 
@@ -165,6 +246,19 @@ class CheckForUpdatedLatexFiles(Hook):
     def run(self, data):
         self.latex.run(data, None, None)
 
+    def run_batch(self, data_list):
+
+        """Create the images for all the latex tags in 'data_list' in one go,
+        such that they can be created in parallel.
+
+        """
+
+        latex_commands = {}
+        for data in data_list:
+            for latex_command in self.latex.latex_commands(data):
+                latex_commands[latex_command] = None
+        self.latex.create_latex_img_files(list(latex_commands))
+
 
 class LatexFilenamesFromData(Hook):
 
@@ -179,19 +273,8 @@ class LatexFilenamesFromData(Hook):
         self.latex = Latex(component_manager)
 
     def run(self, data):
-        filenames = set()
-        # Process <latex>...</latex> tags.
-        for match in re1.finditer(data):
-            filenames.add(self.latex.create_latex_img_file(match.group(1)))
-        # Process <$>...</$> (equation) tags.
-        for match in re2.finditer(data):
-            filenames.add(\
-                self.latex.create_latex_img_file("$" + match.group(1) + "$"))
-        # Process <$$>...</$$> (displaymath) tags.
-        for match in re3.finditer(data):
-            filenames.add(self.latex.create_latex_img_file(\
-                "\\begin{displaymath}" + match.group(1) + \
-                "\\end{displaymath}"))
+        filenames = set(self.latex.create_latex_img_files(\
+            self.latex.latex_commands(data)).values())
         # Check if there were Latex problems.
         if None in filenames:
             self.main_widget().show_error(\
@@ -210,6 +293,9 @@ class DeleteUnusedLatexFiles(Hook):
         import shutil
         if os.path.exists(latex_dir):
             shutil.rmtree(latex_dir)
+        # Make sure the images get recreated on the next render.
+        for render_chain in self.component_manager.all("render_chain"):
+            render_chain.clear_cache()
 
 
 class PreprocessClozeLatex(Hook):
@@ -2,9 +2,17 @@
 # non_latin_font_size_increase.py <Peter.Bienstman@UGent.be>
 #
 
+import re
+
 from mnemosyne.libmnemosyne.filter import Filter
 from mnemosyne.libmnemosyne.card_types.vocabulary import Vocabulary
 
+# Runs of characters outside of the planes in 'is_in_latin_plane', and the
+# tokens which change the state of 'NonLatinFontSizeIncrease.run'.
+NON_LATIN = "[^\u0001-\u04fe\u1e01-\u1efe\u1f01-\u1ffe]"
+re_non_latin = re.compile(NON_LATIN)
+re_token = re.compile("<protect>|</protect>|[<>]|" + NON_LATIN + "+")
+
 
 class NonLatinFontSizeIncrease(Filter):
 
@@ -39,6 +47,9 @@ class NonLatinFontSizeIncrease(Filter):
             return text
         if fact_key not in card.card_type.fact_key_format_proxies():
             return text
+        # Most fields don't contain any non-latin characters at all.
+        if not re_non_latin.search(text):
+            return text.replace("<protect>", "").replace("</protect>", "")
         proxy_key = card.card_type.fact_key_format_proxies()[fact_key]
         font_string = self.config().card_type_property(\
             "font", card.card_type, proxy_key)
@@ -52,40 +63,45 @@ class NonLatinFontSizeIncrease(Filter):
             base_font_size = self.main_widget().default_font_size()
         non_latin_size = base_font_size + \
             self.config()["non_latin_font_size_increase"]
-        new_text = ""
+        new_text = []
         in_tag = False
         in_protect = 0
         in_unicode_substring = False
-        for i in range(len(text)):
-            if not self.is_in_latin_plane(text[i]) and not in_protect:
+        pos = 0
+        for match in re_token.finditer(text):
+            token = match.group()
+            # Latin characters before the token close the font tag.
+            if match.start() != pos and in_unicode_substring:
+                new_text.append("</font>")
+                in_unicode_substring = False
+            new_text.append(text[pos:match.start()])
+            pos = match.end()
+            if token[0] not in "<>":
                 # Don't substitute within XML tags or file names get
                 # messed up.
-                if in_tag or in_unicode_substring == True:
-                    new_text += text[i]
-                else:
+                if not (in_protect or in_tag or in_unicode_substring):
                     in_unicode_substring = True
-                    new_text += "<font style=\"font-size:" + \
-                        str(non_latin_size) + "pt\">" + text[i]
-            else:
-                # First check for tag start/end.
-                if text[i] == "<":
-                    in_tag = True
-                elif text[i] == ">":
-                    in_tag = False
-                # Test for <protect> tags.
-                if text[i:].startswith("<protect>"):
-                    in_protect += 1
-                elif text[i:].startswith("</protect>"):
-                    in_protect = max(0, in_protect - 1)
-                # Close tag.
-                if in_unicode_substring == True:
-                    in_unicode_substring = False
-                    new_text += "</font>" + text[i]
-                else:
-                    new_text += text[i]
+                    new_text.append("<font style=\"font-size:" + \
+                        str(non_latin_size) + "pt\">")
+                new_text.append(token)
+                continue
+            # Tag start/end or <protect> tags.
+            if token == "<protect>":
+                in_protect += 1
+            elif token == "</protect>":
+                in_protect = max(0, in_protect - 1)
+            in_tag = (token == "<")
+            if in_unicode_substring:
+                in_unicode_substring = False
+                new_text.append("</font>")
+            new_text.append(token)
+        if pos != len(text) and in_unicode_substring:
+            new_text.append("</font>")
+        new_text.append(text[pos:])
         # Make sure to close the last tag.
         if not self.is_in_latin_plane(text[-1]) and not in_protect:
-            new_text += "</font>"
+            new_text.append("</font>")
+        new_text = "".join(new_text)
         # Now we can strip all the <protect> tags.
         new_text = new_text.replace("<protect>", "").replace("</protect>", "")
         return new_text
@@ -22,6 +22,7 @@ class Hook(Component):
                                                extra argument: card
        'dynamically_create_media_files'        in SQLite_sync
                                                extra argument: data
+                                               optional: run_batch(data_list)
        'delete_unused_media_files'             in SQLite_sync
        'preprocess_cloze'                      in cloze.py
        'postprocess_q_a_cloze'                 in cloze.py
@@ -70,6 +70,10 @@ class Logger(Component):
     def added_card(self, card):
         pass
 
+    def added_cards(self, cards):
+        for card in cards:
+            self.added_card(card)
+
     def edited_card(self, card):
         pass
 
@@ -89,6 +93,14 @@ class Logger(Component):
     def deleted_tag(self, tag):
         pass
 
+    def edited_tags(self, tags):
+        for tag in tags:
+            self.edited_tag(tag)
+
+    def deleted_tags(self, tags):
+        for tag in tags:
+            self.deleted_tag(tag)
+
     def added_media_file(self, filename):
         pass
 
@@ -101,6 +113,10 @@ class Logger(Component):
     def added_fact(self, fact):
         pass
 
+    def added_facts(self, facts):
+        for fact in facts:
+            self.added_fact(fact)
+
     def edited_fact(self, fact):
         pass
 
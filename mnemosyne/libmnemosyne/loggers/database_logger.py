@@ -61,6 +61,10 @@ class DatabaseLogger(Logger):
     def added_card(self, card):
         self.database().log_added_card(self.timestamp, card.id)
 
+    def added_cards(self, cards):
+        self.database().log_added_cards(self.timestamp,
+            [card.id for card in cards])
+
     def edited_card(self, card):
         self.database().log_edited_card(self.timestamp, card.id)
 
@@ -84,6 +88,14 @@ class DatabaseLogger(Logger):
     def deleted_tag(self, tag):
         self.database().log_deleted_tag(self.timestamp, tag.id)
 
+    def edited_tags(self, tags):
+        self.database().log_edited_tags(self.timestamp,
+            [tag.id for tag in tags])
+
+    def deleted_tags(self, tags):
+        self.database().log_deleted_tags(self.timestamp,
+            [tag.id for tag in tags])
+
     def added_media_file(self, filename):
         self.database().log_added_media_file(self.timestamp, filename)
 
@@ -96,6 +108,10 @@ class DatabaseLogger(Logger):
     def added_fact(self, fact):
         self.database().log_added_fact(self.timestamp, fact.id)
 
+    def added_facts(self, facts):
+        self.database().log_added_facts(self.timestamp,
+            [fact.id for fact in facts])
+
     def edited_fact(self, fact):
         self.database().log_edited_fact(self.timestamp, fact.id)
 
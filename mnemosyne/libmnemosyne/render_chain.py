@@ -4,6 +4,7 @@
 
 import copy
 import string
+import collections
 
 from mnemosyne.libmnemosyne.component import Component
 
@@ -35,6 +36,20 @@ class RenderChain(Component):
 
     Each client should have a render chain with id="default" on startup.
 
+    The rendered output is kept in a bounded cache, keyed by the fact data
+    as returned by the card type, the card type and fact view, the render
+    arguments and the revision of the configuration. Editing a fact changes
+    its data and therefore the key, so the cache does not need to be told
+    about that. The cache is not used if one of the filters has side
+    effects, except when rendering with 'no_side_effects=True'. 'cache_hits'
+    and 'cache_misses' are kept for benchmarking purposes.
+
+    Which renderer and filters to use for a card type is looked up once and
+    then kept in 'pipeline_for_card_type'. Both this and the cached output
+    are cleared when filters or renderers are added or removed, or when
+    components such as card types or plugins are registered or unregistered,
+    as tracked by the 'generation' of the component manager.
+
     """
 
     component_type = "render_chain"
@@ -45,20 +60,40 @@ class RenderChain(Component):
     filters = []
     renderers = []
 
+    cache_size = 500
+
     def __init__(self, component_manager):
         # To have an nice syntax when defining renderers, we do the
         # instantiation here.
         Component.__init__(self, component_manager)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = collections.OrderedDict()
         self._filters = []
         for filter in self.filters:
             self._filters.append(filter(component_manager))
         self._renderers = []
         self._renderer_for_card_type = {}
+        self._pipelines = {} # {card_type: (renderer, filters, side_effects)}
+        self._pipelines_generation = None
         for renderer in self.renderers:
             renderer = renderer(component_manager)
             self._renderers.append(renderer)
             self._renderer_for_card_type[renderer.used_for] = renderer
 
+    def clear_cache(self):
+        self._cache.clear()
+
+    def _chain_changed(self):
+        self._pipelines = {}
+        self.clear_cache()
+
+    def cache_hit_rate(self):
+        lookups = self.cache_hits + self.cache_misses
+        if lookups == 0:
+            return 0
+        return 100.0 * self.cache_hits / lookups
+
     def register_filter_at_front(self, filter_class, after=[]):
 
         """Register a filter at the very front of the render chain, but after
@@ -77,6 +112,7 @@ class RenderChain(Component):
             if self._filters[i].__class__.__name__ in after:
                 pos = i + 1
         self._filters.insert(pos, filter)
+        self._chain_changed()
 
     def register_filter_at_back(self, filter_class, before=[]):
 
@@ -96,6 +132,7 @@ class RenderChain(Component):
             if self._filters[i].__class__.__name__ in before:
                 pos = i
         self._filters.insert(pos, filter)
+        self._chain_changed()
 
     def register_filter(self, filter_class, in_front=False):
 
@@ -119,6 +156,7 @@ class RenderChain(Component):
             if isinstance(filter, filter_class):
                 self._filters.remove(filter)
                 break
+        self._chain_changed()
 
     def register_renderer(self, renderer_class):
 
@@ -126,6 +164,7 @@ class RenderChain(Component):
 
         renderer = renderer_class(self.component_manager)
         self._renderer_for_card_type[renderer.used_for] = renderer
+        self._chain_changed()
 
     def unregister_renderer(self, renderer_class):
 
@@ -135,16 +174,41 @@ class RenderChain(Component):
             if isinstance(renderer, renderer_class):
                 del self._renderer_for_card_type[card_type]
                 break
+        self._chain_changed()
 
     def renderer_for_card_type(self, card_type):
+        return self.pipeline_for_card_type(card_type)[0]
+
+    def _uncached_renderer_for_card_type(self, card_type):
         if card_type in self._renderer_for_card_type:
             return self._renderer_for_card_type[card_type]
         if "::" in card_type.id:
             parent_id, child_id = card_type.id.rsplit("::", 1)
             parent = self.database().card_type(parent_id, is_id_internal=-1)
-            return self.renderer_for_card_type(parent)
+            return self._uncached_renderer_for_card_type(parent)
         return self._renderer_for_card_type[None]
 
+    def pipeline_for_card_type(self, card_type):
+
+        """Return the renderer and the filters to use for 'card_type', and
+        whether any of these filters has side effects.
+
+        """
+
+        if self._pipelines_generation != self.component_manager.generation:
+            # Card types could also have been renamed, which changes the
+            # output of e.g. the Anki renderer, so clear the cache too.
+            self._chain_changed()
+            self._pipelines_generation = self.component_manager.generation
+        try:
+            return self._pipelines[card_type]
+        except KeyError:
+            filters = tuple(self._filters)
+            pipeline = (self._uncached_renderer_for_card_type(card_type),
+                filters, any(filter.has_side_effects for filter in filters))
+            self._pipelines[card_type] = pipeline
+            return pipeline
+
     def render_question(self, card, **render_args):
         fact_keys = card.fact_view.q_fact_keys
         decorators = card.fact_view.q_fact_key_decorators
@@ -166,21 +230,46 @@ class RenderChain(Component):
         return self._render(card, fact_keys, decorators, **render_args)
 
     def _render(self, card, fact_keys, decorators, **render_args):
+        fact_data = card.card_type.fact_data(card)
+        renderer, filters, side_effects = \
+            self.pipeline_for_card_type(card.card_type)
+        if not side_effects or render_args.get("no_side_effects", False):
+            key = (card.card_type.id, card.fact_view.id, tuple(fact_keys),
+                repr(sorted(decorators.items())),
+                repr(sorted(render_args.items())),
+                tuple(sorted(fact_data.items())), self.config().revision)
+            try:
+                result = self._cache[key]
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return result
+            except KeyError:
+                self.cache_misses += 1
+            result = self._uncached_render(card, fact_data, fact_keys,
+                decorators, renderer, filters, **render_args)
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return result
+        return self._uncached_render(card, fact_data, fact_keys, decorators,
+            renderer, filters, **render_args)
+
+    def _uncached_render(self, card, fact_data, fact_keys, decorators,
+                         renderer, filters, **render_args):
         # Note that the filters run only on the data, not on the full content
         # generated by the renderer, which would be much slower.
-        fact_data = copy.copy(card.card_type.fact_data(card))
+        fact_data = copy.copy(fact_data)
         for fact_key in fact_keys:
             if fact_key == "__line__":
                 fact_data[fact_key] = "<hr id=answer>"
             if fact_key not in fact_data:  # Optional key.
                 continue
-            for filter in self._filters:
+            for filter in filters:
                 fact_data[fact_key] = filter.run(fact_data[fact_key],
                     card, fact_key, **render_args)
             if fact_key in decorators:
                 fact_data[fact_key] = string.Template(\
                     decorators[fact_key]).safe_substitute(fact_data)
-        renderer = self.renderer_for_card_type(card.card_type)
         return renderer.render(\
             fact_data, fact_keys, card.card_type, **render_args)
 
@@ -1,4 +1,4 @@
-from anki.template.template import Template
+from anki.template.template import Template, CompiledTemplate
 from anki.template.view import View
 
 def render(template, context=None, **kwargs):
@@ -83,17 +83,7 @@ class Template:
             section, section_name, inner = match.group(0, 1, 2)
             section_name = section_name.strip()
 
-            # check for cloze
-            val = None
-            m = re.match("c[qa]:(\d+):(.+)", section_name)
-            if m:
-                # get full field text
-                txt = get_or_attr(context, m.group(2), None)
-                m = re.search(clozeReg%m.group(1), txt)
-                if m:
-                    val = m.group(1)
-            else:
-                val = get_or_attr(context, section_name, None)
+            val = self.section_value(section_name, context)
 
             replacer = ''
             inverted = section[2] == "^"
@@ -104,6 +94,21 @@ class Template:
 
         return template
 
+    def section_value(self, section_name, context):
+        """Returns the value deciding whether a section is shown."""
+        # check for cloze
+        val = None
+        m = re.match("c[qa]:(\d+):(.+)", section_name)
+        if m:
+            # get full field text
+            txt = get_or_attr(context, m.group(2), None)
+            m = re.search(clozeReg%m.group(1), txt)
+            if m:
+                val = m.group(1)
+        else:
+            val = get_or_attr(context, section_name, None)
+        return val
+
     def render_tags(self, template, context):
         """Renders all the tags in a template for a context."""
         while 1:
@@ -210,3 +215,83 @@ class Template:
             return
         self.compile_regexps()
         return ''
+
+
+class CompiledTemplate(Template):
+    """A template which is parsed once, so that rendering it for a context
+    only needs to look up the values of its sections and tags.
+
+    The result is the same as that of Template.render. Since the latter
+    keeps on expanding tags until none are left, we fall back to it when a
+    value contains braces and could therefore form a new tag, and for
+    templates which change the delimiters.
+    """
+
+    # Placeholder for the n-th tag while parsing.
+    placeholder_re = re.compile("\0(\\d+)\0")
+
+    def __init__(self, template):
+        Template.__init__(self, template)
+        self.section_names = sorted(set(name.strip() for name in \
+            re.findall(r"\{\{[\#|^]([^\}]*)\}\}", template)))
+        self.compilable = "\0" not in template and "{{=" not in template
+        self.evaluated_sections = set()
+        # Parsed templates, keyed by which sections are shown.
+        self.parsed = {}
+
+    def render(self, context):
+        if not self.compilable:
+            return Template(self.template, context).render()
+        try:
+            key = tuple(bool(Template.section_value(self, name, context)) \
+                for name in self.section_names)
+        except TypeError: # Cloze section for a missing field.
+            return Template(self.template, context).render()
+        if key not in self.parsed:
+            self.parsed[key] = self.parse(context)
+        if self.parsed[key] is None:
+            return Template(self.template, context).render()
+        pieces, tags = self.parsed[key]
+        values = []
+        for func, tag_name in tags:
+            try:
+                value = func(self, tag_name, context)
+            except (SyntaxError, KeyError):
+                return "{{invalid template}}"
+            if "{" in value or "}" in value:
+                return Template(self.template, context).render()
+            values.append(value)
+        result = [pieces[0]]
+        for i in range(1, len(pieces), 2):
+            result.append(values[pieces[i]])
+            result.append(pieces[i + 1])
+        return "".join(result)
+
+    def section_value(self, section_name, context):
+        self.evaluated_sections.add(section_name)
+        return Template.section_value(self, section_name, context)
+
+    def parse(self, context):
+        """Expands the sections for this context and splits the result into
+        literal text and tags, by running the render_tags loop with
+        placeholders instead of values. Returns None if the template cannot
+        be parsed like this.
+        """
+        self.evaluated_sections = set()
+        template = self.render_sections(self.template, context)
+        if not self.evaluated_sections.issubset(self.section_names):
+            return None
+        tags = []
+        while 1:
+            match = self.tag_re.search(template)
+            if match is None:
+                break
+            tag, tag_type, tag_name = match.group(0, 1, 2)
+            if "\0" in tag or tag_type not in modifiers or tag_type == "=":
+                return None
+            template = template.replace(tag, "\0%d\0" % len(tags))
+            tags.append((modifiers[tag_type], tag_name.strip()))
+        pieces = self.placeholder_re.split(template)
+        for i in range(1, len(pieces), 2):
+            pieces[i] = int(pieces[i])
+        return pieces, tags
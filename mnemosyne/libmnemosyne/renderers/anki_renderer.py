@@ -7,7 +7,7 @@ import copy
 
 from mnemosyne.libmnemosyne.renderer import Renderer
 from mnemosyne.libmnemosyne.card_types.M_sided import MSided
-from mnemosyne.libmnemosyne.renderers.anki.template import render as _render
+from mnemosyne.libmnemosyne.renderers.anki.template import CompiledTemplate
 
 
 class AnkiRenderer(Renderer):
@@ -16,40 +16,53 @@ class AnkiRenderer(Renderer):
 
     used_for = MSided
 
-    def render(self, card, filtered_fact_data, render_chain, **render_args):
-        card_type = card.card_type
+    def __init__(self, component_manager):
+        Renderer.__init__(self, component_manager)
+        # Compiled templates, together with the Anki template they were
+        # created from: {(card_type.id, fact_view.id, ord, render_QA,
+        # browser, split_answer): (anki_template, compiled_template)}
+        self._templates = {}
+        # Style for each fact key name which has a font set, together with
+        # the configuration revision and the fact keys they were created for:
+        # {card_type.id: (revision, fact_keys_and_names, styles)}
+        self._styles = {}
+
+    def update(self, card_type):
+        for key in list(self._templates.keys()):
+            if key[0] == card_type.id:
+                del self._templates[key]
+        self._styles.pop(card_type.id, None)
+
+    def compiled_template(self, card, render_chain, **render_args):
         extra_data = card.fact_view.extra_data
-        extra_data["ord"] = card.extra_data["ord"]
-        fields = {}
-        for fact_key, fact_key_name in card_type.fact_keys_and_names:
-            fields[fact_key_name] = filtered_fact_data.get(fact_key, "")
-        fields["Tags"] = "" # Mnemosyne shows tags elsewhere.
-        fields["Type"] = card_type.name
-        fields["Deck"] = ""
-        fields["Subdeck"] = ""
-        fields["Card"] = card.fact_view.name
-        fields["c%d" % (extra_data["ord"] + 1)] = "1"
-        # Determine template.
+        browser = render_chain in ["plain_text", "card_browser"]
         if render_args["render_QA"] == "Q":
-            if render_chain in ["plain_text", "card_browser"] \
-               and extra_data["bqfmt"]:
+            if browser and extra_data["bqfmt"]:
                 template = extra_data["bqfmt"]
             else:
                 template = extra_data["qfmt"]
+            split_answer = False
+        else:
+            if browser and extra_data["bafmt"]:
+                template = extra_data["bafmt"]
+            else:
+                template = extra_data["afmt"]
+            split_answer = browser or \
+                self.config()["QA_split"] != "single_window"
+        key = (card.card_type.id, card.fact_view.id, extra_data["ord"],
+               render_args["render_QA"], browser, split_answer)
+        if key in self._templates and self._templates[key][0] == template:
+            return self._templates[key][1]
+        anki_template = template
+        if render_args["render_QA"] == "Q":
             template = re.sub("{{(?!type:)(.*?)cloze:", r"{{\1cq-%d:" \
                                 % (extra_data["ord"] + 1), template)
             template = template.replace("<%cloze:", "<%%cq:%d:" % (
                     extra_data["ord"] + 1))
         else:
-            if render_chain in ["plain_text", "card_browser"] and \
-               extra_data["bafmt"]:
-                    template = extra_data["bafmt"]
-            else:
-                template = extra_data["afmt"]
             # If possible, strip the question part from the template, so that
             # we can display Q and A in a separate window.
-            if self.config()["QA_split"] != "single_window" or \
-               render_chain in ["plain_text", "card_browser"]:
+            if split_answer:
                 if "<hr id=answer>" in template:
                     template = template.split("<hr id=answer>", 1)[1].strip()
             # Deal with clozes.
@@ -57,11 +70,25 @@ class AnkiRenderer(Renderer):
                               % (extra_data["ord"]+1), template)
             template = template.replace("<%cloze:", "<%%ca:%d:" % (
                     extra_data["ord"] + 1))
-            if "FrontSide" in render_args:
-                fields["FrontSide"] = render_args["FrontSide"].\
-                    replace("audio src", "audio_off src")
-        # Determine colours and fonts.
-        for fact_key, fact_key_name in card.card_type.fact_keys_and_names:
+        # Hide {{type:...}} fields.
+        template = re.sub("{{type:.+}}", "", template)
+        # Hide {{hint:...}} fields in card browser.
+        if browser:
+            template = re.sub("{{hint:.+}}", "", template)
+        compiled_template = CompiledTemplate(template)
+        self._templates[key] = (anki_template, compiled_template)
+        return compiled_template
+
+    def styles(self, card_type):
+        revision = self.config().revision
+        if card_type.id in self._styles:
+            cached_revision, fact_keys_and_names, styles = \
+                self._styles[card_type.id]
+            if cached_revision == revision and \
+               fact_keys_and_names == card_type.fact_keys_and_names:
+                return styles
+        styles = {}
+        for fact_key, fact_key_name in card_type.fact_keys_and_names:
             style = ""
             colour = self.config().card_type_property(\
                 "font_colour", card_type, fact_key)
@@ -69,7 +96,7 @@ class AnkiRenderer(Renderer):
                 colour_string = ("%X" % colour)[2:] # Strip alpha.
                 style += "color: #%s; " % colour_string
             font_string = self.config().card_type_property(\
-                "font", card.card_type, fact_key)
+                "font", card_type, fact_key)
             if font_string:
                 if font_string.count(",") == 10:
                     family,size,x,x,w,i,u,s,x,x,x = font_string.split(",")
@@ -89,14 +116,33 @@ class AnkiRenderer(Renderer):
                     style += "text-decoration: underline; "
                 if s == "1":
                     style += "text-decoration: line-through; "
-                fields[fact_key_name] = "<span style=\"%s\">%s</span>" % \
-                    (style, fields[fact_key_name])
-        # Hide {{type:...}} fields.
-        template = re.sub("{{type:.+}}", "", template)
-        # Hide {{hint:...}} fields in card browser.
-        if render_chain in ["plain_text", "card_browser"]:
-            template = re.sub("{{hint:.+}}", "", template)
-        body = _render(template, fields)
+                styles[fact_key_name] = style
+        self._styles[card_type.id] = \
+            (revision, list(card_type.fact_keys_and_names), styles)
+        return styles
+
+    def render(self, card, filtered_fact_data, render_chain, **render_args):
+        card_type = card.card_type
+        extra_data = card.fact_view.extra_data
+        extra_data["ord"] = card.extra_data["ord"]
+        fields = {}
+        for fact_key, fact_key_name in card_type.fact_keys_and_names:
+            fields[fact_key_name] = filtered_fact_data.get(fact_key, "")
+        fields["Tags"] = "" # Mnemosyne shows tags elsewhere.
+        fields["Type"] = card_type.name
+        fields["Deck"] = ""
+        fields["Subdeck"] = ""
+        fields["Card"] = card.fact_view.name
+        fields["c%d" % (extra_data["ord"] + 1)] = "1"
+        if render_args["render_QA"] == "A" and "FrontSide" in render_args:
+            fields["FrontSide"] = render_args["FrontSide"].\
+                replace("audio src", "audio_off src")
+        # Determine colours and fonts.
+        for fact_key_name, style in self.styles(card_type).items():
+            fields[fact_key_name] = "<span style=\"%s\">%s</span>" % \
+                (style, fields[fact_key_name])
+        template = self.compiled_template(card, render_chain, **render_args)
+        body = template.render(fields)
         # Some heuristic to have a decent display in the card browser.
         if render_chain in ["plain_text", "card_browser"] or \
            ("body_only" in render_args and render_args["body_only"] == True):
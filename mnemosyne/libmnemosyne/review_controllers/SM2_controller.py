@@ -175,10 +175,8 @@ _("You have finished your scheduled reviews. Now, learn as many failed or new ca
         return self.scheduled_count, self.non_memorised_count, self.active_count
 
     def reload_counters(self):
-        sch = self.scheduler()
-        self.scheduled_count = sch.scheduled_count()
-        self.non_memorised_count = sch.non_memorised_count()
-        self.active_count = sch.active_count()
+        self.scheduled_count, self.non_memorised_count, self.active_count = \
+            self.scheduler().scheduled_non_memorised_and_active_count()
 
     def update_counters(self, previous_grade, new_grade):
         if self.scheduled_count is None:
@@ -282,23 +280,23 @@ _("You have finished your scheduled reviews. Now, learn as many failed or new ca
         else:
             w.set_grades_title(_("Grade your answer:"))
         # Set tooltips and texts for the grade buttons.
+        if self._state == "SELECT GRADE" and \
+           self.config()["show_intervals"] in ["tooltips", "buttons"]:
+            import math
+            days_for_grade = [int(math.ceil(interval / (24.0 * 60 * 60))) \
+                for interval in self.scheduler().interval_previews(self.card)]
         for grade in range(0,6):
             # Tooltip.
             if self._state == "SELECT GRADE" and \
                self.config()["show_intervals"] == "tooltips":
-                import math
-                interval = self.scheduler().process_answer(self.card, \
-                    grade, dry_run=True)
-                days = int(math.ceil(interval / (24.0 * 60 * 60)))
                 w.set_grade_tooltip(grade, _(self.tooltip[phase][grade]) + \
-                    self.next_rep_string(days))
+                    self.next_rep_string(days_for_grade[grade]))
             else:
                 w.set_grade_tooltip(grade, _(self.tooltip[phase][grade]))
             # Button text.
             if self._state == "SELECT GRADE" and \
                self.config()["show_intervals"] == "buttons":
-                w.set_grade_text(grade, self.scheduler().process_answer(\
-                                        self.card, grade, dry_run=True))
+                w.set_grade_text(grade, str(days_for_grade[grade]))
             else:
                 w.set_grade_text(grade, str(grade))
 
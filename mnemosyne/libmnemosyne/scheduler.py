@@ -90,6 +90,16 @@ class Scheduler(Component):
     def grade_answer(self, card, new_grade, dry_run=False):
         raise NotImplementedError
 
+    def interval_previews(self, card):
+
+        """Return the intervals 'card' would get for each of the grades 0 to
+        5, e.g. to show them on the grade buttons.
+
+        """
+
+        return [self.grade_answer(card, grade, dry_run=True) \
+            for grade in range(0, 6)]
+
     def scheduled_count(self):
         raise NotImplementedError
 
@@ -99,6 +109,10 @@ class Scheduler(Component):
     def active_count(self):
         raise NotImplementedError
 
+    def scheduled_non_memorised_and_active_count(self):
+        return self.scheduled_count(), self.non_memorised_count(), \
+            self.active_count()
+
     def card_count_scheduled_n_days_from_now(self, n):
 
         """Yesterday: n=-1, today: n=0, tomorrow: n=1, ... .
@@ -109,6 +123,15 @@ class Scheduler(Component):
 
         raise NotImplementedError
 
+    def card_counts_scheduled_n_days_from_now(self, days):
+
+        """Same as 'card_count_scheduled_n_days_from_now', but for a list of
+        days, which schedulers can implement more efficiently.
+
+        """
+
+        return [self.card_count_scheduled_n_days_from_now(n) for n in days]
+
     def next_rep_to_interval_string(self, next_rep, now=None):
 
         """Converts next_rep to a string like 'tomorrow', 'in 2 weeks', ...
@@ -2,13 +2,14 @@
 # SM2_mnemosyne.py <Peter.Bienstman@UGent.be>
 #
 
-import time
+import bisect
 import random
 import calendar
 import datetime
 
 from mnemosyne.libmnemosyne.translator import _
 from mnemosyne.libmnemosyne.scheduler import Scheduler
+from mnemosyne.libmnemosyne.schedulers.card_queue import CardQueue
 
 HOUR = 60 * 60 # Seconds in an hour.
 DAY = 24 * HOUR # Seconds in a day.
@@ -34,6 +35,17 @@ class SM2Mnemosyne(Scheduler):
 
     name = "SM2 Mnemosyne"
 
+    # Number of cards fetched at the same time for the scheduled cards and
+    # for learning ahead, as a trade-off between memory usage and redoing the
+    # query. It doubles each time the queue runs out in the same stage, up to
+    # 'max_refill_size', so that long sessions need fewer queries.
+    refill_size = 50
+    max_refill_size = 800
+
+    def __init__(self, component_manager):
+        Scheduler.__init__(self, component_manager)
+        self._interval_previews = {}
+
     def midnight_UTC(self, timestamp):
 
         """Round a timestamp to a value with resolution of a day, storing it
@@ -74,7 +86,7 @@ class SM2Mnemosyne(Scheduler):
         """
 
         if now == None:
-            now = time.time()
+            now = self.clock().time()
         # The larger 'day_starts_at', the later the card should become due,
         # i.e. larger than 'next_card', so the more 'now' should be decreased.
         now -= self.config()["day_starts_at"] * HOUR
@@ -82,14 +94,7 @@ class SM2Mnemosyne(Scheduler):
         # This number is positive for the US, where a card should become
         # due later than in Europe, so 'now' should be decreased by this
         # offset.
-        # As for when to use 'altzone' instead of 'timezone' if daylight
-        # savings time is active, this is a matter of big confusion
-        # among the Python developers themselves:
-        # http://bugs.python.org/issue7229
-        if time.localtime(now).tm_isdst and time.daylight:
-            now -= time.altzone
-        else:
-            now -= time.timezone
+        now -= self.clock().offset_west_of_UTC(now)
         return int(now)
 
     def true_scheduled_interval(self, card):
@@ -111,26 +116,24 @@ class SM2Mnemosyne(Scheduler):
                     "Internal error: interval not zero.")
             return interval
         interval += self.config()["day_starts_at"] * HOUR
-        if time.localtime(time.time()).tm_isdst and time.daylight:
-            interval += time.altzone
-        else:
-            interval += time.timezone
+        interval += self.clock().offset_west_of_UTC()
         return int(interval)
 
     def reset(self, new_only=False):
 
-        """'_card_ids_in_queue' contains the _ids of the cards making up the
-        queue.
+        """'_card_ids_in_queue' is a CardQueue containing the _ids of the
+        cards making up the queue.
 
-        The corresponding fact._ids are also stored in '_fact_ids_in_queue',
-        which is needed to make sure that no sister cards can be together in
-        the queue at any time.
+        The corresponding fact._ids are also stored in the set
+        '_fact_ids_in_queue', which is needed to make sure that no sister
+        cards can be together in the queue at any time.
 
         '_fact_ids_memorised' has a different function and persists over the
         different stages invocations of 'rebuild_queue'. It can be used to
         control whether or not memorising a card will prevent a sister card
         from being pulled out of the 'unseen' pile, even after the queue has
-        been rebuilt.
+        been rebuilt. '_memorised_count' counts the memorisations themselves,
+        to warn the user about learning too many cards.
 
         '_card_id_last' is stored to avoid showing the same card twice in a
         row.
@@ -140,10 +143,12 @@ class SM2Mnemosyne(Scheduler):
 
         """
 
-        self._card_ids_in_queue = []
-        self._fact_ids_in_queue = []
-        self._fact_ids_memorised = []
+        self._card_ids_in_queue = CardQueue()
+        self._fact_ids_in_queue = set()
+        self._fact_ids_memorised = set()
+        self._memorised_count = 0
         self._card_id_last = None
+        self._refill_size = self.refill_size
         self.new_only = new_only
         if self.new_only == False:
             self.stage = 1
@@ -163,7 +168,7 @@ class SM2Mnemosyne(Scheduler):
 
         new_interval = self.calculate_initial_interval(grade)
         new_interval += self.calculate_interval_noise(new_interval)
-        last_rep = int(time.time())
+        last_rep = int(self.clock().time())
         next_rep = self.midnight_UTC(last_rep + new_interval)
         for card in cards:
             card.grade = grade
@@ -206,16 +211,23 @@ class SM2Mnemosyne(Scheduler):
 
         """
 
-        while self.database().sister_card_count_scheduled_between\
-            (card, card.next_rep, card.next_rep + DAY):
+        # Fetch the sister cards in a single query, instead of querying the
+        # database again for each day we shift.
+        next_reps = self.database().sister_card_next_reps(card)
+        if not next_reps:
+            return
+        index = bisect.bisect_left(next_reps, card.next_rep)
+        while index < len(next_reps) and \
+            next_reps[index] < card.next_rep + DAY:
             card.next_rep += DAY
+            index = bisect.bisect_left(next_reps, card.next_rep, index)
 
     def rebuild_queue(self, learn_ahead=False):
         db = self.database()
         if not db.is_loaded() or not db.active_count():
             return
-        self._card_ids_in_queue = []
-        self._fact_ids_in_queue = []
+        self._card_ids_in_queue = CardQueue()
+        self._fact_ids_in_queue = set()
 
         # Stage 1
         #
@@ -223,8 +235,6 @@ class SM2Mnemosyne(Scheduler):
         # first do those that have the shortest interval, as being a day
         # late on an interval of 2 could be much worse than being a day late
         # on an interval of 50.
-        # Fetch maximum 50 cards at the same time, as a trade-off between
-        # memory usage and redoing the query.
         if self.stage == 1:
             if self.config()["shown_backlog_help"] == False:
                 if db.scheduled_count(self.adjusted_now() - DAY) != 0:
@@ -236,11 +246,14 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
             else:
                 sort_key = "interval"
             for _card_id, _fact_id in db.cards_due_for_ret_rep(\
-                    self.adjusted_now(), sort_key=sort_key, limit=50):
+                    self.adjusted_now(), sort_key=sort_key,
+                    limit=self._refill_size):
                 self._card_ids_in_queue.append(_card_id)
-                self._fact_ids_in_queue.append(_fact_id)
+                self._fact_ids_in_queue.add(_fact_id)
             if len(self._card_ids_in_queue):
+                self._grow_refill_size()
                 return
+            self._refill_size = self.refill_size
             self.stage = 2
 
         # Stage 2
@@ -256,7 +269,7 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
                 if _fact_id not in self._fact_ids_in_queue:
                     if non_memorised_in_queue < limit:
                         self._card_ids_in_queue.append(_card_id)
-                        self._fact_ids_in_queue.append(_fact_id)
+                        self._fact_ids_in_queue.add(_fact_id)
                         non_memorised_in_queue += 1
                     if non_memorised_in_queue == limit:
                         break
@@ -266,11 +279,11 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
                     if non_memorised_in_queue < limit:
                         self._card_ids_in_queue.append(_card_id)
                         self._card_ids_in_queue.append(_card_id)
-                        self._fact_ids_in_queue.append(_fact_id)
+                        self._fact_ids_in_queue.add(_fact_id)
                         non_memorised_in_queue += 1
                     if non_memorised_in_queue == limit:
                         break
-            random.shuffle(self._card_ids_in_queue)
+            self._card_ids_in_queue.shuffle()
             # Only stop when we reach the non memorised limit. Otherwise, keep
             # going to add some extra cards to get more spread.
             if non_memorised_in_queue == limit:
@@ -290,7 +303,7 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
                 if _fact_id not in self._fact_ids_in_queue:
                     if non_memorised_in_queue < limit:
                         self._card_ids_in_queue.append(_card_id)
-                        self._fact_ids_in_queue.append(_fact_id)
+                        self._fact_ids_in_queue.add(_fact_id)
                         non_memorised_in_queue += 1
                     if non_memorised_in_queue == limit:
                         break
@@ -299,11 +312,11 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
                     if non_memorised_in_queue < limit:
                         self._card_ids_in_queue.append(_card_id)
                         self._card_ids_in_queue.append(_card_id)
-                        self._fact_ids_in_queue.append(_fact_id)
+                        self._fact_ids_in_queue.add(_fact_id)
                         non_memorised_in_queue += 1
                     if non_memorised_in_queue == limit:
                         break
-            random.shuffle(self._card_ids_in_queue)
+            self._card_ids_in_queue.shuffle()
             # Only stop when we reach the grade 0 limit. Otherwise, keep
             # going to add some extra cards to get more spread.
             if non_memorised_in_queue == limit:
@@ -329,7 +342,7 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
                 if _fact_id not in self._fact_ids_in_queue \
                     and _fact_id not in self._fact_ids_memorised:
                     self._card_ids_in_queue.append(_card_id)
-                    self._fact_ids_in_queue.append(_fact_id)
+                    self._fact_ids_in_queue.add(_fact_id)
                     non_memorised_in_queue += 1
                     if non_memorised_in_queue == limit:
                         if self.new_only == False:
@@ -343,7 +356,7 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
                         sort_key=sort_key, limit=min(limit, 50)):
                     if _fact_id not in self._fact_ids_in_queue:
                         self._card_ids_in_queue.append(_card_id)
-                        self._fact_ids_in_queue.append(_fact_id)
+                        self._fact_ids_in_queue.add(_fact_id)
                         non_memorised_in_queue += 1
                         if non_memorised_in_queue == limit:
                             if self.new_only == False:
@@ -361,8 +374,8 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
         # to learn. The user can signal that he wants to learn ahead by
         # calling rebuild_queue with 'learn_ahead' set to True.
         # Don't shuffle this queue, as it's more useful to review the
-        # earliest scheduled cards first. We only put 50 cards at the same
-        # time into the queue, in order to save memory.
+        # earliest scheduled cards first. We only put a limited number of
+        # cards at the same time into the queue, in order to save memory.
         if learn_ahead == False:
             if self.new_only == False:
                 self.stage = 2
@@ -370,20 +383,20 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
                 self.stage = 3
             return
         for _card_id, _fact_id in db.cards_learn_ahead(self.adjusted_now(),
-                sort_key="next_rep", limit=50):
+                sort_key="next_rep", limit=self._refill_size):
             self._card_ids_in_queue.append(_card_id)
+        self._grow_refill_size()
         # Relearn cards which we got wrong during learn ahead.
         self.stage = 2
 
+    def _grow_refill_size(self):
+        self._refill_size = min(2 * self._refill_size, self.max_refill_size)
+
     def is_in_queue(self, card):
         return card._id in self._card_ids_in_queue
 
     def remove_from_queue_if_present(self, card):
-        try:
-            self._card_ids_in_queue.remove(card._id)
-            self._card_ids_in_queue.remove(card._id)
-        except:
-            pass
+        self._card_ids_in_queue.remove_all(card._id)
 
     def next_card(self, learn_ahead=False):
         db = self.database()
@@ -392,7 +405,7 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
             self.rebuild_queue(learn_ahead)
             if len(self._card_ids_in_queue) == 0:
                 return None
-        _card_id = self._card_ids_in_queue.pop(0)
+        _card_id = self._card_ids_in_queue.pop_first()
         # Make sure we don't show the same card twice in succession.
         if self._card_id_last:
             while _card_id == self._card_id_last:
@@ -402,9 +415,10 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
                     self.rebuild_queue(learn_ahead)
                     if len(self._card_ids_in_queue) == 0:
                         return None
-                    if set(self._card_ids_in_queue) == set([_card_id]):
+                    if self._card_ids_in_queue.distinct_card_ids() == \
+                        set([_card_id]):
                         return db.card(_card_id, is_id_internal=True)
-                _card_id = self._card_ids_in_queue.pop(0)
+                _card_id = self._card_ids_in_queue.pop_first()
         self._card_id_last = _card_id
         return db.card(_card_id, is_id_internal=True)
 
@@ -419,7 +433,7 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
         # second copy from the queue in 'grade_answer', so we can't prefetch
         # if that second copy happens to be the one coming up.
         if self._card_ids_in_queue and \
-            card_to_grade._id == self._card_ids_in_queue[0]:
+            card_to_grade._id == self._card_ids_in_queue.first():
             return False
         # Make sure there are enough cards left to find one which is not a
         # duplicate.
@@ -431,6 +445,20 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
 
         return 1.0
 
+    def interval_previews(self, card):
+        # The previews only depend on the state of the card, on the day and
+        # on the time the card was shown, which is used for the actual
+        # interval. They can be reused when redrawing the grade buttons.
+        key = (card._id, card.grade, card.easiness, card.last_rep,
+            card.next_rep, self.adjusted_now() // DAY,
+            int(self.stopwatch().start_time))
+        if key not in self._interval_previews:
+            if len(self._interval_previews) > 100:
+                self._interval_previews.clear()
+            self._interval_previews[key] = \
+                Scheduler.interval_previews(self, card)
+        return self._interval_previews[key]
+
     def grade_answer(self, card, new_grade, dry_run=False):
         # The dry run mode is typically used to determine the intervals
         # for the different grades, so we don't want any side effects
@@ -458,7 +486,8 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
         # If we memorise a card, keep track of its fact, so that we can avoid
         # pulling a sister card from the 'unseen' pile.
         if not dry_run and card.grade < 2 and new_grade >= 2:
-            self._fact_ids_memorised.append(card.fact._id)
+            self._fact_ids_memorised.add(card.fact._id)
+            self._memorised_count += 1
         if card.grade == -1: # Unseen card.
             actual_interval = 0
         else:
@@ -552,14 +581,14 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
         # Update card properties. 'last_rep' is the time the card was graded,
         # not when it was shown.
         card.grade = new_grade
-        card.last_rep = int(time.time())
+        card.last_rep = int(self.clock().time())
         if new_grade >= 2:
             card.next_rep = self.midnight_UTC(card.last_rep + new_interval)
             self.avoid_sister_cards(card)
         else:
             card.next_rep = card.last_rep
         # Warn if we learned a lot of new cards.
-        if len(self._fact_ids_memorised) == 15 and \
+        if self._memorised_count == 15 and \
             self.warned_about_too_many_cards == False:
             self.main_widget().show_information(\
         _("You've memorised 15 new or failed cards.") + " " +\
@@ -583,6 +612,10 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
     def active_count(self):
         return self.database().active_count()
 
+    def scheduled_non_memorised_and_active_count(self):
+        return self.database().scheduled_non_memorised_and_active_count(\
+            self.adjusted_now())
+
     def card_count_scheduled_n_days_from_now(self, n):
 
         """Yesterday: n=-1, today: n=0, tomorrow: n=1, ... .
@@ -598,6 +631,23 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
         else:
             return self.database().card_count_scheduled_n_days_ago(-n)
 
+    def card_counts_scheduled_n_days_from_now(self, days):
+        # Get the histogram of all future days in a single query.
+        future_days = [n for n in days if n > 0]
+        if future_days:
+            first_day = min(future_days)
+            counts = self.database().card_count_scheduled_per_day(\
+                self.adjusted_now() + (first_day - 1) * DAY,
+                max(future_days) - first_day + 1)
+        result = []
+        for n in days:
+            if n > 0:
+                result.append(counts[n - first_day])
+            else:
+                result.append(\
+                    self.database().card_count_scheduled_n_days_ago(-n))
+        return result
+
     def next_rep_to_interval_string(self, next_rep, now=None):
 
         """Converts next_rep to a string like 'tomorrow', 'in 2 weeks', ...
@@ -644,7 +694,7 @@ _("You appear to have missed some reviews. Don't worry too much about this backl
         """
 
         if now is None:
-            now = time.time()
+            now = self.clock().time()
         # To perform the calculation, we need to 'snap' the two timestamps
         # to midnight UTC before calculating the interval.
         now = self.midnight_UTC(\
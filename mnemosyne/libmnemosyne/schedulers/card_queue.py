@@ -0,0 +1,111 @@
+#
+# card_queue.py <Peter.Bienstman@UGent.be>
+#
+
+import random
+import collections
+
+
+class CardQueue(object):
+
+    """Queue of card _ids used by the schedulers, in which a card can occur
+    more than once (e.g. cards with grade 0 are shown twice).
+
+    Cards are taken from the front in the order in which they were added, and
+    membership tests are done on a dictionary of copy counts instead of by
+    scanning the queue.
+
+    Removing a card does not touch the deque, but marks the first copies of
+    that card as dead. These are dropped when they reach the front. This works
+    because cards are only ever added at the back, so dead copies of a card
+    always come before its live copies.
+
+    """
+
+    def __init__(self, _card_ids=()):
+        self._deque = collections.deque()
+        self._count_for__id = {} # Number of live copies.
+        self._dead_for__id = {} # Number of dead copies still in the deque.
+        self._length = 0
+        for _card_id in _card_ids:
+            self.append(_card_id)
+
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, _card_id):
+        return _card_id in self._count_for__id
+
+    def __iter__(self):
+
+        """Iterate over the live copies, in order."""
+
+        dead_for__id = dict(self._dead_for__id)
+        for _card_id in self._deque:
+            if dead_for__id.get(_card_id):
+                dead_for__id[_card_id] -= 1
+            else:
+                yield _card_id
+
+    def append(self, _card_id):
+        self._deque.append(_card_id)
+        self._count_for__id[_card_id] = \
+            self._count_for__id.get(_card_id, 0) + 1
+        self._length += 1
+
+    def _drop_dead_copies_at_front(self):
+        while self._deque:
+            _card_id = self._deque[0]
+            dead = self._dead_for__id.get(_card_id)
+            if not dead:
+                return
+            self._deque.popleft()
+            if dead == 1:
+                del self._dead_for__id[_card_id]
+            else:
+                self._dead_for__id[_card_id] = dead - 1
+
+    def first(self):
+        self._drop_dead_copies_at_front()
+        return self._deque[0]
+
+    def pop_first(self):
+        self._drop_dead_copies_at_front()
+        _card_id = self._deque.popleft()
+        self._discard_count(_card_id, 1)
+        return _card_id
+
+    def _discard_count(self, _card_id, number):
+        count = self._count_for__id[_card_id] - number
+        if count == 0:
+            del self._count_for__id[_card_id]
+        else:
+            self._count_for__id[_card_id] = count
+        self._length -= number
+
+    def remove(self, _card_id):
+
+        """Remove the first copy of a card, raising ValueError if the card is
+        not in the queue, like list.remove.
+
+        """
+
+        if _card_id not in self._count_for__id:
+            raise ValueError("card not in queue")
+        self._dead_for__id[_card_id] = self._dead_for__id.get(_card_id, 0) + 1
+        self._discard_count(_card_id, 1)
+
+    def remove_all(self, _card_id):
+        count = self._count_for__id.get(_card_id, 0)
+        if count:
+            self._dead_for__id[_card_id] = \
+                self._dead_for__id.get(_card_id, 0) + count
+            self._discard_count(_card_id, count)
+
+    def distinct_card_ids(self):
+        return set(self._count_for__id)
+
+    def shuffle(self):
+        _card_ids = list(self)
+        random.shuffle(_card_ids)
+        self.__init__(_card_ids)
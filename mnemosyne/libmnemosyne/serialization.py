@@ -0,0 +1,131 @@
+#
+# serialization.py <Peter.Bienstman@UGent.be>
+#
+
+"""Conversion of the structured data we keep in the database and in config.db
+(extra data, fact view and card type definitions, criteria, config values) to
+and from strings.
+
+Strings are stored as JSON, preceded by a format prefix which allows for
+future versions of the format. Python types which JSON lacks (tuples, sets,
+dictionaries with non-string keys and bytes) are encoded as single-key
+objects with a '!'-tag.
+
+Strings in the legacy format, i.e. as created by repr(), are still accepted,
+but only literals are parsed (as with ast.literal_eval), such that data coming
+from a database or from a sync partner can never execute code.
+
+"""
+
+import re
+import ast
+import json
+import base64
+
+PREFIX = "json1:"
+
+_TAGS = ("!t", "!s", "!d", "!b")
+
+re_long_int = re.compile(r"(?<![\w.'\"])(\d+)L\b")
+re_byte_array = re.compile(r"^PyQt\d\.QtCore\.QByteArray\((.*)\)$", re.DOTALL)
+
+
+def _sorted(items):
+    # Sort when possible, such that the output does not depend on hash
+    # ordering.
+    try:
+        return sorted(items)
+    except TypeError:
+        return list(items)
+
+
+def _encode(obj):
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, list):
+        return [_encode(x) for x in obj]
+    if isinstance(obj, tuple):
+        return {"!t": [_encode(x) for x in obj]}
+    if isinstance(obj, (set, frozenset)):
+        return {"!s": [_encode(x) for x in _sorted(obj)]}
+    if isinstance(obj, dict):
+        if all(isinstance(key, str) for key in obj) and \
+            not (len(obj) == 1 and list(obj.keys())[0] in _TAGS):
+            return dict((key, _encode(value)) for key, value in obj.items())
+        return {"!d": [[_encode(key), _encode(value)] for key, value \
+            in obj.items()]}
+    if isinstance(obj, (bytes, bytearray)):
+        return {"!b": base64.b64encode(bytes(obj)).decode("ascii")}
+    if type(obj).__name__ == "QByteArray":  # Window geometry in config.db.
+        return {"!b": base64.b64encode(bytes(obj.data())).decode("ascii")}
+    raise TypeError("Cannot serialize object of type %s." % type(obj))
+
+
+def _decode(obj):
+    if len(obj) == 1:
+        key, value = list(obj.items())[0]
+        if key == "!t":
+            return tuple(value)
+        if key == "!s":
+            return set(value)
+        if key == "!d":
+            return dict(value)
+        if key == "!b":
+            return base64.b64decode(value)
+    return obj
+
+
+def serialize(obj):
+    return PREFIX + json.dumps(_encode(obj), separators=(",", ":"))
+
+
+def is_serialized(data_string):
+
+    """Returns True if 'data_string' is in the current format, as opposed to
+    the legacy repr() format.
+
+    """
+
+    return data_string.startswith(PREFIX)
+
+
+def _literal(node):
+    # Like ast.literal_eval, but also accepting the 'set([...])' notation
+    # used by Python 2.
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and \
+        node.func.id in ("set", "frozenset") and not node.keywords and \
+        len(node.args) <= 1:
+        items = _literal(node.args[0]) if node.args else []
+        return set(items) if node.func.id == "set" else frozenset(items)
+    if isinstance(node, ast.Tuple):
+        return tuple(_literal(x) for x in node.elts)
+    if isinstance(node, ast.List):
+        return [_literal(x) for x in node.elts]
+    if isinstance(node, ast.Set):
+        return set(_literal(x) for x in node.elts)
+    if isinstance(node, ast.Dict):
+        return dict((_literal(key), _literal(value)) for key, value \
+            in zip(node.keys, node.values))
+    return ast.literal_eval(node)
+
+
+def _literal_eval(data_string):
+    try:
+        tree = ast.parse(data_string, mode="eval")
+    except SyntaxError:
+        # Python 2 long integers.
+        tree = ast.parse(re_long_int.sub(r"\1", data_string), mode="eval")
+    return _literal(tree.body)
+
+
+def deserialize(data_string):
+    if data_string.startswith(PREFIX):
+        return json.loads(data_string[len(PREFIX):], object_hook=_decode)
+    data_string = data_string.strip()
+    match = re_byte_array.match(data_string)
+    if match:
+        data = _literal_eval(match.group(1))
+        if isinstance(data, str):
+            data = data.encode("latin-1")
+        return data
+    return _literal_eval(data_string)
@@ -56,12 +56,6 @@ class Schedule(PlotStatisticsPage):
         else:
             raise AttributeError("Invalid variant")
         self.main_widget().set_progress_text(_("Calculating statistics..."))
-        self.main_widget().set_progress_range(len(self.x))
-        self.main_widget().set_progress_update_interval(3)
-        self.y = []
-        for day in self.x:
-            self.y.append(\
-                self.scheduler().card_count_scheduled_n_days_from_now(n=day))
-            self.main_widget().increase_progress(1)
+        self.y = self.scheduler().card_counts_scheduled_n_days_from_now(self.x)
         self.main_widget().close_progress()
 
@@ -2,6 +2,8 @@
 # tag_tree.py <Peter.Bienstman@UGent.be>
 #
 
+import itertools
+
 from mnemosyne.libmnemosyne.translator import _
 from mnemosyne.libmnemosyne.component import Component
 
@@ -46,21 +48,24 @@ class TagTree(Component, dict):
         # Preprocess tag names such that each tag results in a leaf of the
         # tree, i.e. if you have tags like "A::B" and "A", rename the latter
         # to "A::Untagged".
+        # To do this in a single pass, collect all the names which are
+        # followed by :: in another tag name.
         tags = self.database().tags()
-        tag_names = [tag.name for tag in tags]
-        preprocessed_tag_name_for = {}
+        parent_tag_names = set()
         for tag in tags:
-            preprocessed_tag_name_for[tag] = tag.name
-            for other_tag_name in tag_names:
-                if other_tag_name.startswith(tag.name + "::") \
-                    and other_tag_name != tag.name:
-                    preprocessed_tag_name_for[tag] = \
-                        tag.name + "::" + _("Untagged")
-                    break
-        # Build the actual tag tree.
+            index = tag.name.find("::")
+            while index != -1:
+                parent_tag_names.add(tag.name[:index])
+                index = tag.name.find("::", index + 1)
+        # Build the actual tag tree. Also keep track of all the nodes a tag
+        # belongs to, for use in '_recount'.
+        self._nodes_for_tag_id = {}
         for tag in tags:
-            name = preprocessed_tag_name_for[tag]
+            name = tag.name
+            if name in parent_tag_names:
+                name += "::" + _("Untagged")
             self.tag_for_node[name] = tag
+            nodes = self._nodes_for_tag_id[tag._id] = []
             parent = "__ALL__"
             partial_tag = ""
             for node in name.split("::"):
@@ -72,19 +77,25 @@ class TagTree(Component, dict):
                     self[partial_tag] = []
                     self.display_name_for_node[partial_tag] = \
                         node.replace("::" + _("Untagged"), "")
+                nodes.append(partial_tag)
                 parent = partial_tag
         if "__UNTAGGED__" in self.display_name_for_node:
             self.display_name_for_node["__UNTAGGED__"] = _("Untagged")
 
     def _recount(self):
-        for node in dict(self):
-            if node == "__ALL__":
-                self.card_count_for_node[node] = \
-                    self.database().card_count()
-            else:
-                self.card_count_for_node[node] = \
-                    self.database().card_count_for_tags(\
-                    self.tags_in_subtree(node), active_only=False)
+        # Go over the tags of each card in a single query, rather than doing
+        # one query per node. A card with several tags in a subtree should
+        # only be counted once there.
+        for node in self:
+            self.card_count_for_node[node] = 0
+        self.card_count_for_node["__ALL__"] = self.database().card_count()
+        for _card_id, rows in itertools.groupby(\
+            self.database().card_and_tag_ids(), key=lambda row: row[0]):
+            nodes = set()
+            for row in rows:
+                nodes.update(self._nodes_for_tag_id.get(row[1], ()))
+            for node in nodes:
+                self.card_count_for_node[node] += 1
 
     def tags_in_subtree(self, node):
         tags = []
@@ -116,21 +127,21 @@ class TagTree(Component, dict):
             return
         if new_name == "__UNTAGGED__": # Forbidden.
             new_name = "Untagged"
-        for tag in self.tags_in_subtree(node):
+        tags = self.tags_in_subtree(node)
+        for tag in tags:
             tag.name = tag.name.replace(node, new_name, 1)
             # Corner cases when new_name is empty.
             if tag.name == "":
                 tag.name = "__UNTAGGED__"
             if tag.name.startswith("::"):
                 tag.name = tag.name[2:]
-            self.database().update_tag(tag)
+        self.database().update_tags(tags)
         self.database().save()
         self._rebuild()
         self._recount()
 
     def delete_subtree(self, node):
-        for tag in self.tags_in_subtree(node):
-            self.database().delete_tag(tag)
+        self.database().delete_tags(self.tags_in_subtree(node))
         self.database().save()
         self._rebuild()
         self._recount()
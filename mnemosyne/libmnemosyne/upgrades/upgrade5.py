@@ -0,0 +1,44 @@
+#
+# upgrade5.py <Peter.Bienstman@UGent.be>
+#
+
+from mnemosyne.libmnemosyne.component import Component
+from mnemosyne.libmnemosyne.serialization import serialize, deserialize
+from mnemosyne.libmnemosyne.serialization import is_serialized
+
+
+class Upgrade5(Component):
+
+    """Upgrade to SQL format 5, storing structured data in the format of the
+    'serialization' module instead of as Python literals.
+
+    """
+
+    columns_for_table = {
+        "facts": ["extra_data"],
+        "cards": ["extra_data"],
+        "tags": ["extra_data"],
+        "fact_views": ["q_fact_keys", "a_fact_keys", "q_fact_key_decorators",
+            "a_fact_key_decorators", "extra_data"],
+        "card_types": ["fact_keys_and_names", "unique_fact_keys",
+            "required_fact_keys", "fact_view_ids", "keyboard_shortcuts",
+            "extra_data"]}
+
+    def run(self):
+        db = self.database()
+        for table, columns in self.columns_for_table.items():
+            for column in columns:
+                self._convert(table, column)
+        # Criteria from plugins are free to use a format of their own, so we
+        # only convert the default ones.
+        self._convert("criteria", "data", "type='default'")
+        db.save()
+
+    def _convert(self, table, column, condition="1"):
+        con = self.database().con
+        new_values = [(serialize(deserialize(value)), rowid) for rowid, value \
+            in con.execute("select rowid, %s from %s where %s and %s!=''" \
+            % (column, table, condition, column)) \
+            if value is not None and not is_serialized(value)]
+        con.executemany("update %s set %s=? where rowid=?" % (table, column),
+            new_values)
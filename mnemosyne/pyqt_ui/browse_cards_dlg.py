@@ -14,11 +14,13 @@ from mnemosyne.libmnemosyne.card import Card
 from mnemosyne.libmnemosyne.translator import _
 from mnemosyne.pyqt_ui.qwebengineview2 import QWebEngineView2
 from mnemosyne.libmnemosyne.component import Component
+from mnemosyne.libmnemosyne.serialization import deserialize
 from mnemosyne.pyqt_ui.tag_tree_wdgt import TagsTreeWdgt
 from mnemosyne.pyqt_ui.ui_browse_cards_dlg import Ui_BrowseCardsDlg
 from mnemosyne.pyqt_ui.card_type_tree_wdgt import CardTypesTreeWdgt
 from mnemosyne.libmnemosyne.ui_components.dialogs import BrowseCardsDialog
 from mnemosyne.libmnemosyne.criteria.default_criterion import DefaultCriterion
+from mnemosyne.libmnemosyne.databases.SQLite_search import SEARCH_RANK
 from mnemosyne.pyqt_ui.convert_card_type_keys_dlg import \
      ConvertCardTypeKeysDlg
 from mnemosyne.pyqt_ui.tip_after_starting_n_times import \
@@ -53,6 +55,7 @@ class CardModel(QtSql.QSqlTableModel, Component):
     def __init__(self, **kwds):
         super().__init__(**kwds)
         self.search_string = ""
+        self.rank = None
         self.adjusted_now = self.scheduler().adjusted_now()
         try:
             self.date_format = locale.nl_langinfo(locale.D_FMT)
@@ -77,6 +80,14 @@ class CardModel(QtSql.QSqlTableModel, Component):
             self.font_colour_for_card_type_id[card_type_id] = QtGui.QColor(\
                 self.config()["font_colour"][card_type_id][first_key])
 
+    def orderByClause(self):
+        # Unless the user chose to sort the table, show the best search
+        # results first.
+        clause = super().orderByClause()
+        if not clause and self.rank:
+            clause = "ORDER BY " + self.rank
+        return clause
+
     def data(self, index, role=QtCore.Qt.DisplayRole):
         if role == QtCore.Qt.TextColorRole:
             card_type_id_index = self.index(index.row(), CARD_TYPE_ID)
@@ -212,7 +223,7 @@ class QA_Delegate(QtWidgets.QStyledItemDelegate, Component):
                 if extra_data == "":
                     card.extra_data = {}
                 else:
-                    card.extra_data = eval(extra_data)
+                    card.extra_data = deserialize(extra_data)
                 break
 
         # Let's not add tags to speed things up, they don't affect the card
@@ -702,6 +713,10 @@ class BrowseCardsDlg(QtWidgets.QDialog, BrowseCardsDialog,
             QtWidgets.QMessageBox.warning(None, _("Mnemosyne"),
                 _("Database error: ") + qt_db.lastError().text())
             sys.exit(1)
+        # The SQLite library used by Qt does not necessarily support the
+        # full text index of the database.
+        self.qt_has_search_index = self.database().has_search_index and \
+            QtSql.QSqlQuery().exec_("select rowid from cards_fts limit 0")
 
     def unload_qt_database(self):
         # Don't save state twice when closing dialog.
@@ -844,13 +859,21 @@ _("You chose to sort this table. Operations in the card browser could now be slo
             else:
                 filter += "_id in (" + ",".join(active__card_ids) + ")"
         # Search string.
-        search_string = self.search_box.text().replace("'", "''")
-        self.card_model.search_string = search_string
+        search_string = self.search_box.text()
+        self.card_model.search_string = search_string.replace("'", "''")
+        self.card_model.rank = None
         if search_string:
             if filter:
                 filter += " and "
-            filter += "(question like '%%%s%%' or answer like '%%%s%%')" \
-                % (search_string, search_string)
+            filter += self.database().search_condition(search_string,
+                use_search_index=self.qt_has_search_index)
+            if self.qt_has_search_index:
+                statements = \
+                    self.database().search_rank_statements(search_string)
+                for sql in statements:
+                    QtSql.QSqlQuery().exec_(sql)
+                if statements:
+                    self.card_model.rank = SEARCH_RANK
         self.card_model.setFilter(filter)
         self.card_model.select()
         self.update_card_counters()
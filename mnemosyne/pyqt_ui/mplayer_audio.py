@@ -20,6 +20,8 @@ class MplayerAudio(Filter):
 
     """Play sound externally in mplayer."""
 
+    has_side_effects = True
+
     def run(self, text, card, fact_key, **render_args):
         if "no_side_effects" in render_args and \
             render_args["no_side_effects"] == True:
@@ -98,6 +98,118 @@ def activate():
     c._tag_ids_forbidden = set()
     mnemosyne.database().set_current_criterion(c)
 
+number_of_card_types = 200
+number_of_criteria = 200
+
+def create_card_types_and_criteria():
+    from mnemosyne.libmnemosyne.criteria.default_criterion import \
+     DefaultCriterion
+    card_type = mnemosyne.card_type_with_id("3")
+    for i in range(number_of_card_types):
+        mnemosyne.controller().clone_card_type(card_type, "clone" + str(i))
+    for i in range(number_of_criteria):
+        c = DefaultCriterion(mnemosyne.component_manager)
+        c.name = "criterion" + str(i)
+        c._tag_ids_active = set([mnemosyne.database().\
+            get_or_create_tag_with_name("default")._id])
+        c.deactivated_card_type_fact_view_ids = \
+            set([(card_type.id, card_type.fact_views[0].id)])
+        mnemosyne.database().add_criterion(c)
+    mnemosyne.database().save()
+
+def load_database():
+    path = mnemosyne.database().path()
+    mnemosyne.database().unload()
+    mnemosyne.database().load(path)
+
+def parse_stored_data():
+    # Compare the current format to the repr/eval it replaced.
+    from mnemosyne.libmnemosyne.serialization import deserialize
+    data = [deserialize(cursor[0]) for cursor in mnemosyne.database().con.\
+        execute("select fact_keys_and_names from card_types union all "
+        "select data from criteria where type='default'")]
+    strings = [repr(x) for x in data]
+    t = time.time()
+    for s in strings:
+        eval(s)
+    print("eval:", time.time() - t)
+    from mnemosyne.libmnemosyne.serialization import serialize
+    strings = [serialize(x) for x in data]
+    t = time.time()
+    for s in strings:
+        deserialize(s)
+    print("deserialize:", time.time() - t)
+
+number_of_synthetic_cards = 500000
+
+def create_synthetic_database():
+    # Bypasses the object layer, as creating this many cards through the
+    # controller takes too long. Half of the cards are unseen, a few percent
+    # are being learned and the rest are memorised with random intervals.
+    import random
+    db = mnemosyne.database()
+    db.new(mnemosyne.config()["last_database"])
+    now = int(time.time())
+    cards = []
+    for i in range(number_of_synthetic_cards):
+        r = random.random()
+        if r < 0.5:
+            grade, last_rep, next_rep, lapses = -1, -1, -1, 0
+        elif r < 0.52:
+            grade = random.choice([0, 1])
+            last_rep = next_rep = now - random.randint(0, 300) * 24 * 60 * 60
+            lapses = random.choice([0, 0, 1, 2])
+        else:
+            grade = random.randint(2, 5)
+            last_rep = now - random.randint(0, 300) * 24 * 60 * 60
+            next_rep = last_rep + random.randint(1, 400) * 24 * 60 * 60
+            lapses = random.randint(0, 3)
+        cards.append(("id" + str(i), i // 2, grade, next_rep, last_rep,
+            lapses, int(random.random() < 0.9)))
+    db.con.executemany("""insert into cards(id, card_type_id, _fact_id,
+        fact_view_id, grade, next_rep, last_rep, lapses, active)
+        values(?,'1',?,'1.1',?,?,?,?,?)""", cards)
+    db.save()
+
+def scheduler_queries():
+    # Run this on the database from 'create_synthetic_database'.
+    db = mnemosyne.database()
+    now = mnemosyne.scheduler().adjusted_now()
+    queries = [
+        ("due", lambda: db.cards_due_for_ret_rep(now, "interval", 50)),
+        ("due random", lambda: db.cards_due_for_ret_rep(now, "random", 50)),
+        ("relearn", lambda: db.cards_to_relearn(1, "-interval")),
+        ("new memorising", lambda: db.cards_new_memorising(1)),
+        ("unseen", lambda: db.cards_unseen(limit=50)),
+        ("unseen random", lambda: db.cards_unseen("random", 50)),
+        ("learn ahead", lambda: db.cards_learn_ahead(now, "next_rep", 50)),
+        ("scheduled count", lambda: [db.scheduled_count(now)])]
+    for name, query in queries:
+        t = time.time()
+        for i in range(10):
+            list(query())
+        print("%-16s %8.2f ms" % (name, (time.time() - t) * 100))
+
+def component_lookups():
+    # Hook, filter and renderer lookups as done for every repetition and
+    # every render.
+    component_manager = mnemosyne.component_manager
+    card_type = mnemosyne.card_type_with_id("1")
+    clone = mnemosyne.controller().clone_card_type(card_type, "1 clone")
+    lookups = [
+        ("hook", lambda: component_manager.all("hook", "after_repetition")),
+        ("filter", lambda: component_manager.all("filter")),
+        ("renderer", lambda: component_manager.current("renderer",
+            used_for=card_type.__class__)),
+        ("renderer clone", lambda: component_manager.current("renderer",
+            used_for=clone.__class__))]
+    for name, lookup in lookups:
+        t = time.time()
+        for i in range(100000):
+            lookup()
+        print("%-16s %8.2f ms" % (name, (time.time() - t) * 1000))
+    mnemosyne.controller().delete_card_type(clone)
+
 def finalise():
     mnemosyne.finalise()
 
@@ -143,7 +255,12 @@ tests = ["startup()", "create_database()", "queue()", "new_question()", "display
 #tests = ["startup()", "queue()", "finalise()"]
 #tests = ["startup()", "activate()"]
 #tests = ["startup()", "finalise()"]
+#tests = ["startup()", "create_card_types_and_criteria()", "load_database()",
+#    "parse_stored_data()", "finalise()"]
 #tests = ["test_setup()", "test_run()"]
+#tests = ["startup()", "create_synthetic_database()", "scheduler_queries()",
+#    "queue()", "finalise()"]
+#tests = ["startup()", "component_lookups()", "finalise()"]
 
 for test in tests:
     cProfile.run(test, "mnemosyne_profile." + test.replace("()", ""))
@@ -152,5 +269,10 @@ for test in tests:
     print()
     p = pstats.Stats('mnemosyne_profile.' + test.replace("()", ""))
     p.strip_dirs().sort_stats('cumulative').print_stats(number_of_calls)
+    print(("Object cache hits: ", mnemosyne.database().object_cache_hits()))
+
+# Slowest queries over all the tests above.
+from mnemosyne.libmnemosyne.databases._sqlite3 import profiler
+profiler.dump(number_of_calls)
 
 # 5.2 0.92
\ No newline at end of file
@@ -59,6 +59,8 @@ class MyClient(Client):
              "SM2Mnemosyne"),
             ("mnemosyne.libmnemosyne.stopwatch",
              "Stopwatch"), 
+            ("mnemosyne.libmnemosyne.clock",
+             "Clock"),
             ("mnemosyne.libmnemosyne.card_types.front_to_back",
              "FrontToBack"),
             ("mnemosyne.libmnemosyne.card_types.both_ways",
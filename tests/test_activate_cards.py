@@ -405,4 +405,29 @@ class TestActivateCards(MnemosyneTest):
                      "b": "answer4"}
         self.controller().create_new_cards(fact_data, card_type_1,
             grade=-1, tag_names=["dummy::b"])
-        assert self.database().active_count() == 2
\ No newline at end of file
+        assert self.database().active_count() == 2
+
+    def test_changed_count(self):
+        card_type_2 = self.card_type_with_id("2")
+        for i in range(3):
+            fact_data = {"f": str(i), "b": "b"}
+            self.controller().create_new_cards(fact_data, card_type_2,
+                grade=-1, tag_names=["tag" + str(i)])
+        applier = self.mnemosyne.component_manager.current(\
+            "criterion_applier", used_for=DefaultCriterion)
+        c = DefaultCriterion(self.mnemosyne.component_manager)
+        c._tag_ids_active = set([self.database().\
+            get_or_create_tag_with_name("tag0")._id])
+        assert applier.apply_to_database(c) == 4
+        assert applier.apply_to_database(c) == 0
+        assert self.database().active_count() == 2
+        c.deactivated_card_type_fact_view_ids = \
+            set([(card_type_2.id, card_type_2.fact_views[0].id)])
+        assert applier.apply_to_database(c) == 1
+        assert self.database().active_count() == 1
+        c.deactivated_card_type_fact_view_ids = set()
+        c._tag_ids_active = set(tag._id for tag in self.database().tags())
+        c._tag_ids_forbidden = set([self.database().\
+            get_or_create_tag_with_name("tag1")._id])
+        assert applier.apply_to_database(c) == 3
+        assert self.database().active_count() == 4
@@ -382,3 +382,52 @@ class TestAddCards(MnemosyneTest):
         self.controller().save_file()
         assert self.database().con.execute(\
             "select count() from data_for_fact where key='n'").fetchone()[0] == 0
+
+    def test_bulk(self):
+        card_type_1 = self.card_type_with_id("1")
+        card_type_2 = self.card_type_with_id("2")
+        self.controller().create_new_cards({"f": "existing", "b": "b"},
+            card_type_1, grade=-1, tag_names=["default"])
+        result = self.controller().create_new_cards_in_bulk([
+            ({"f": "q1", "b": "a1"}, card_type_1, -1, ["a", "a::b"]),
+            ({"f": "q2", "b": "a2"}, card_type_2, 3, []),
+            ({"f": "existing", "b": "other"}, card_type_1, -1, []),
+            ({"f": "q1", "b": "other"}, card_type_1, -1, []),
+            ({"f": "existing", "b": "b"}, card_type_2, -1, ["a::b"])])
+        assert result[2] is None
+        assert result[3] is None
+        assert [len(cards) for cards in result if cards] == [1, 2, 2]
+        db = self.database()
+        assert db.fact_count() == 4
+        assert db.card_count() == 6
+        # The cards read back from the database look the same.
+        db.clear_object_caches()
+        for cards in result[:2] + result[4:]:
+            for card in cards:
+                card_2 = db.card(card._id, is_id_internal=True)
+                assert card_2.id == card.id
+                assert card_2.fact.data == card.fact.data
+                assert card_2.grade == card.grade
+                assert card_2.tag_string() == card.tag_string()
+                assert db.con.execute("""select question, tags from cards
+                    where _id=?""", (card._id, )).fetchone() == \
+                    (card.question("plain_text"), card.tag_string())
+        assert result[0][0].tag_string() == "a::b"
+        assert result[1][0].grade == 3
+        assert result[1][0].next_rep != result[1][1].next_rep
+        assert db.con.execute("select count() from tags_for_card where "
+            "_card_id=?", (result[1][0]._id, )).fetchone()[0] == 1
+        assert db.con.execute("select count() from log where event_type=?",
+            (EventTypes.ADDED_FACT, )).fetchone()[0] == 4
+        assert db.con.execute("select count() from log where event_type=?",
+            (EventTypes.ADDED_CARD, )).fetchone()[0] == 6
+        assert db.con.execute("select count() from log where event_type=?",
+            (EventTypes.REPETITION, )).fetchone()[0] == 2
+        # Sister cards share their tags, other cards don't.
+        assert result[1][0].tags is result[1][1].tags
+        assert result[4][0].tags is not result[0][0].tags
+        # Without checking for duplicates.
+        result = self.controller().create_new_cards_in_bulk([
+            ({"f": "q1", "b": "a1"}, card_type_1, -1, [])],
+            check_for_duplicates=False)
+        assert db.fact_count() == 5
@@ -9,6 +9,7 @@ from nose.tools import raises
 
 from mnemosyne_test import MnemosyneTest
 from mnemosyne.libmnemosyne import Mnemosyne
+from mnemosyne.libmnemosyne.serialization import serialize
 from mnemosyne.libmnemosyne.ui_components.dialogs import ImportDialog
 from mnemosyne.libmnemosyne.ui_components.main_widget import MainWidget
 
@@ -88,7 +89,7 @@ class TestAnkiImport(MnemosyneTest):
         assert card.easiness == 2.5
 
         criterion = self.database().criterion(id=2, is_id_internal=True)
-        assert criterion.data_to_string() == "(set(), {2}, set())"
+        assert criterion.data_to_string() == serialize((set(), {2}, set()))
         assert criterion.name == "Deck 1"
         assert len(list(self.database().criteria())) == 3
 
@@ -110,3 +111,35 @@ class TestAnkiImport(MnemosyneTest):
         self.anki_importer().do_import(filename)
         self.review_controller().reset()
         self._test_database()
+
+    def test_compiled_template(self):
+        from anki.template import Template, CompiledTemplate
+        templates = ["{{Front}}<hr id=answer>{{Back}}",
+            "{{#Back}}has {{Back}}{{/Back}}{{^Back}}none{{/Back}}",
+            "{{text:Front}} {{Front}} {{Front}}}",
+            "{{cq-1:Text}} {{ca-2:Text}}",
+            "{{#cq:1:Text}}yes{{/cq:1:Text}}{{^ca:2:Text}}no{{/ca:2:Text}}",
+            "{{=<% %>=}}<%Front%>", "{{&Front}}", "{{Missing}}",
+            "{{Front}}}} {{Front}}} {{!comment}} {{{Back}}}"]
+        contexts = [{"Front": "f", "Back": "b", "Text": "{{c1::x}}"},
+            {"Front": "", "Back": "", "Text": "{{c2::x::hint}}"},
+            {"Front": "{{Back}}", "Back": "b\n}}", "Text": "t"},
+            {"Front": "a{", "Back": "{b", "Text": "{{c1::x}} {{c2::y}}"}]
+        for template in templates:
+            compiled_template = CompiledTemplate(template)
+            for context in contexts * 2:
+                assert compiled_template.render(context) == \
+                    Template(template, context).render()
+
+    def test_compiled_template_cache(self):
+        filename = os.path.join(os.getcwd(), "tests", "files", "anki1", "collection.anki2")
+        self.anki_importer().do_import(filename)
+        card = self.database().card("1502277582871", is_id_internal=False)
+        question = card.question()
+        assert "font-family: 'Algerian'" in question
+        assert card.question() == question
+        self.config().set_card_type_property("font",
+            "Arial,12,-1,5,50,0,0,0,0,0,Regular", card.card_type, "0")
+        assert "font-family: 'Arial'" in card.question()
+        card.fact_view.extra_data["qfmt"] = "new template {{Front}}"
+        assert "new template" in card.question()
@@ -332,3 +332,41 @@ class TestCardType(MnemosyneTest):
             card_type, ("1 clone"))
         assert self.config().card_type_property("font", card_type, 'f') == "myfont"
         assert self.config().card_type_property("background_colour", card_type) == "mycolour"
+
+    def test_component_resolution(self):
+        from mnemosyne.libmnemosyne.filter import Filter
+        from mnemosyne.libmnemosyne.card_types.front_to_back import FrontToBack
+        component_manager = self.mnemosyne.component_manager
+        card_type = self.controller().clone_card_type(\
+            self.card_type_with_id("1"), ("1 clone"))
+        assert component_manager.all("filter", card_type.__class__) == []
+        # Lookups without result don't share their list.
+        component_manager.all("filter", card_type.__class__).append(None)
+        assert component_manager.all("filter", card_type.__class__) == []
+        # Registering for the parent class invalidates the cache.
+        generation = component_manager.generation
+        parent_filter = Filter(component_manager)
+        parent_filter.used_for = FrontToBack
+        component_manager.register(parent_filter)
+        assert component_manager.generation > generation
+        assert component_manager.all("filter", card_type.__class__) == \
+            [parent_filter]
+        # Modifying the registered list in place is picked up.
+        extra_filter = Filter(component_manager)
+        component_manager.components[FrontToBack]["filter"].append(\
+            extra_filter)
+        assert component_manager.all("filter", card_type.__class__) == \
+            [parent_filter, extra_filter]
+        component_manager.components[FrontToBack]["filter"].pop()
+        # A component for the exact class takes preference.
+        clone_filter = Filter(component_manager)
+        clone_filter.used_for = card_type.__class__
+        component_manager.register(clone_filter)
+        assert component_manager.all("filter", card_type.__class__) == \
+            [clone_filter]
+        assert component_manager.current("filter", card_type.__class__) == \
+            clone_filter
+        component_manager.unregister(clone_filter)
+        assert component_manager.all("filter", card_type.__class__) == []
+        component_manager.unregister(parent_filter)
+        assert component_manager.all("filter", FrontToBack) == []
@@ -14,8 +14,12 @@ from mnemosyne.libmnemosyne.ui_components.main_widget import MainWidget
 
 class Widget(MainWidget):
 
+    cancel_delete = False
+
     def show_question(self, question, option0, option1, option2):
         if question.startswith("This will delete cards and their history"):
+            if self.cancel_delete:
+                return 1  # Cancel.
             return 0  # Proceed and delete":
         if question.startswith("Can't preserve history when converting"):
             return 0  # Reset learning history
@@ -212,6 +216,28 @@ class TestConvertCards(MnemosyneTest):
         new_card.question()
         new_card.answer()
 
+    def test_2_to_1_cancel(self):
+        fact_data = {"f": "question",
+                     "b": "answer"}
+        card_type = self.card_type_with_id("2")
+        card = self.controller().create_new_cards(fact_data, card_type,
+                                          grade=-1, tag_names=["default"])[0]
+        fact = card.fact
+        new_card_type = self.card_type_with_id("1")
+        self.main_widget().cancel_delete = True
+        assert self.controller().edit_card_and_sisters(card, fact_data,
+            new_card_type, new_tag_names=["default"], correspondence=[]) == -1
+        self.controller().change_card_type([fact], card_type, new_card_type,
+            correspondence=[])
+        self.main_widget().cancel_delete = False
+        # The cancelled conversion does not leave changes in the cards which
+        # are shared with the database.
+        assert card.card_type.id == "2"
+        for sister_card in self.database().cards_from_fact(fact):
+            assert sister_card.card_type.id == "2"
+            assert sister_card.fact_view.id in ["2.1", "2.2"]
+        assert self.database().card_count() == 2
+
     def test_1_to_3_a(self):
         fact_data = {"f": "question",
                      "b": "answer"}
@@ -5,6 +5,8 @@
 import os
 import sys
 import shutil
+import sqlite3
+import threading
 
 from nose.tools import raises
 
@@ -51,6 +53,176 @@ class TestDatabase(MnemosyneTest):
         self.mnemosyne.initialise(os.path.abspath("dot_test"),  automatic_upgrades=False)
         self.review_controller().reset()
 
+    def test_wal_mode(self):
+        self.config()["wal_mode"] = True
+        self.database().release_connection()
+        assert self.database().con.execute(\
+            "pragma journal_mode").fetchone()[0] == "wal"
+        card_type = self.card_type_with_id("1")
+        self.controller().create_new_cards({"f": "1", "b": "b"}, card_type,
+            grade=-1, tag_names=["default"])
+        self.database().save()
+        self.controller().create_new_cards({"f": "2", "b": "b"}, card_type,
+            grade=-1, tag_names=["default"], save=False)
+        assert self.database().read_con is self.database().con
+        results = []
+        def read():
+            results.append(self.database().read_con is self.database().con)
+            # Only sees committed changes.
+            results.append(self.database().card_count())
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        assert results == [False, 1]
+        assert self.database().card_count() == 2
+        self.database().release_connection()
+
+    def test_query_profiler(self):
+        from mnemosyne.libmnemosyne.databases._sqlite3 import profiler, \
+             normalise_sql
+        assert normalise_sql(""" select  1
+            from\tcards where name='a  b' """) == \
+            "select 1 from cards where name='a  b'"
+        profiler.reset()
+        self.database().con.execute("select count() from cards")
+        self.database().con.execute("""select count()
+            from cards""")
+        assert profiler.stats["select count() from cards"][0] == 2
+        assert list(profiler.stats.keys()) == ["select count() from cards"]
+        profiler.dump()
+
+    def test_search(self):
+        db = self.database()
+        assert db.has_search_index
+        card_type = self.card_type_with_id("1")
+        card_1 = self.controller().create_new_cards({"f": "quick brown fox",
+            "b": "b"}, card_type, grade=-1, tag_names=["animals"])[0]
+        card_2 = self.controller().create_new_cards({"f": "brown quick",
+            "b": "fox fox"}, card_type, grade=-1, tag_names=["default"])[0]
+        assert sorted(db.internal_ids_of_cards_matching("qui")) == \
+            [card_1._id, card_2._id]
+        assert db.internal_ids_of_cards_matching("fox")[0] == card_2._id
+        assert db.internal_ids_of_cards_matching("\"quick brown\"") == \
+            [card_1._id]
+        assert db.internal_ids_of_cards_matching("anim") == [card_1._id]
+        assert db.internal_ids_of_cards_matching("o'b \"") == []
+        assert len(db.internal_ids_of_cards_matching("  ")) == 2
+        # The index follows changes to the cards.
+        fact = card_1.fact
+        fact.data["f"] = "slow"
+        db.update_fact(fact)
+        db.update_card(card_1)
+        assert db.internal_ids_of_cards_matching("quick") == [card_2._id]
+        assert db.internal_ids_of_cards_matching("slow") == [card_1._id]
+        self.controller().delete_facts_and_their_cards([card_2.fact])
+        assert db.internal_ids_of_cards_matching("quick") == []
+        condition = db.search_condition("slo")
+        assert "match" in condition
+        assert db.con.execute("select _id from cards where " + \
+            condition).fetchall() == [(card_1._id, )]
+        # Wildcards.
+        assert "like" in db.search_condition("s_ow")
+        assert db.internal_ids_of_cards_matching("s_ow") == [card_1._id]
+        # Without FTS5.
+        db._fts5_available = lambda : False
+        db.create_search_index_if_needed()
+        assert not db.has_search_index
+        assert "like" in db.search_condition("slo")
+        card_3 = self.controller().create_new_cards({"f": "slower",
+            "b": "b"}, card_type, grade=-1, tag_names=["default"])[0]
+        assert db.internal_ids_of_cards_matching("slow") == \
+            [card_1._id, card_3._id]
+        assert db.internal_ids_of_cards_matching("anim") == [card_1._id]
+        del db._fts5_available
+        db.create_search_index_if_needed()
+        assert db.has_search_index
+        assert sorted(db.internal_ids_of_cards_matching("slow")) == \
+            [card_1._id, card_3._id]
+
+    def test_search_rank(self):
+        from mnemosyne.libmnemosyne.databases.SQLite_search import \
+             SEARCH_RANK
+        db = self.database()
+        card_type = self.card_type_with_id("1")
+        card_1 = self.controller().create_new_cards({"f": "a fox",
+            "b": "b"}, card_type, grade=-1, tag_names=["default"])[0]
+        card_2 = self.controller().create_new_cards({"f": "fox fox fox",
+            "b": "b"}, card_type, grade=-1, tag_names=["default"])[0]
+        card_3 = self.controller().create_new_cards({"f": "dog",
+            "b": "b"}, card_type, grade=-1, tag_names=["default"])[0]
+        for search_string in ["fox", "fox b"]:
+            for sql in db.search_rank_statements(search_string):
+                db.con.execute(sql)
+            assert [cursor[0] for cursor in db.con.execute(\
+                "select _id from cards where %s order by %s" % \
+                (db.search_condition(search_string), SEARCH_RANK))] == \
+                db.internal_ids_of_cards_matching(search_string) == \
+                [card_2._id, card_1._id]
+        # Searches which don't use the index can't be ranked.
+        assert db.search_rank_statements("f_x") == []
+        assert db.search_rank_statements("b") == []
+
+    def test_scheduler_indexes(self):
+        from mnemosyne.libmnemosyne.databases._sqlite3 import profiler
+        db = self.database()
+        # Indexes get created for databases which don't have them yet.
+        db.con.execute("drop index i_cards_interval")
+        path = db.path()
+        db.unload()
+        db.load(path)
+        assert db.con.execute("""select count() from sqlite_master where
+            type='index' and name in ('i_cards_due', 'i_cards_interval',
+            'i_cards_grade')""").fetchone()[0] == 3
+        # All the queries of 'rebuild_queue' use an index.
+        profiler.reset()
+        for sort_key in ["interval", "random"]:
+            list(db.cards_due_for_ret_rep(0, sort_key=sort_key, limit=50))
+        list(db.cards_to_relearn(1, sort_key="-interval"))
+        list(db.cards_new_memorising(1))
+        for sort_key in ["", "random"]:
+            list(db.cards_unseen(sort_key=sort_key, limit=50))
+        list(db.cards_learn_ahead(0, sort_key="next_rep", limit=50))
+        db.scheduled_count(0)
+        db.non_memorised_count()
+        db.card_count_scheduled_between(0, 1)
+        for sql in list(profiler.stats):
+            for row in db.con.execute("explain query plan " + sql,
+                [0] * sql.count("?")):
+                assert row[3] != "SCAN cards"
+
+    def test_search_inside_words(self):
+        db = self.database()
+        card_type = self.card_type_with_id("1")
+        card_1 = self.controller().create_new_cards({"f": "biology",
+            "b": "b"}, card_type, grade=-1, tag_names=["default"])[0]
+        card_2 = self.controller().create_new_cards({"f": "\u6211\u5728"
+            "\u7814\u7a76\u6240\u5de5\u4f5c", "b": "b"}, card_type,
+            grade=-1, tag_names=["default"])[0]
+        searches = [("ology", [card_1._id]), ("OLOG b", [card_1._id]),
+            ("\u7814\u7a76", [card_2._id]),
+            ("\u7814\u7a76\u6240", [card_2._id]),
+            ("\u5728\u7814\u7a76\u6240\u5de5", [card_2._id]),
+            ("\u7814\u7a76 \u6240\u5de5", [card_2._id]),
+            ("\u7814\u7a76\u5de5", []), ("default", [card_1._id, card_2._id])]
+        for search_string, _ids in searches:
+            assert sorted(db.internal_ids_of_cards_matching(search_string)) \
+                == _ids
+            for use_search_index in [True, False]:
+                condition = db.search_condition(search_string,
+                    use_search_index=use_search_index)
+                assert [cursor[0] for cursor in db.con.execute(\
+                    "select _id from cards where " + condition + \
+                    " order by _id")] == _ids
+        assert "match" in db.search_condition("\u7814\u7a76\u6240")
+        # Without the index.
+        db._fts5_available = lambda : False
+        db.create_search_index_if_needed()
+        for search_string, _ids in searches:
+            assert sorted(db.internal_ids_of_cards_matching(search_string)) \
+                == _ids
+        del db._fts5_available
+        db.create_search_index_if_needed()
+
     def test_release(self):
         self.database().release_connection()
         self.database().release_connection()
@@ -159,8 +331,119 @@ class TestDatabase(MnemosyneTest):
             "select count() from log where event_type=?",
             (EventTypes.EDITED_CARD, )).fetchone()[0] == 1
 
+    def test_update_tag_strings(self):
+        db = self.database()
+        card_type = self.card_type_with_id("1")
+        card_1 = self.controller().create_new_cards({"f": "1", "b": "b"},
+            card_type, grade=-1, tag_names=["a10", "B", "a2"])[0]
+        card_2 = self.controller().create_new_cards({"f": "2", "b": "b"},
+            card_type, grade=-1, tag_names=["a2"])[0]
+        tag = db.get_or_create_tag_with_name("a2")
+        tag.name = "a11"
+        db.update_tag(tag)
+        card_1 = db.card(card_1._id, is_id_internal=True)
+        card_2 = db.card(card_2._id, is_id_internal=True)
+        for card in [card_1, card_2]:
+            assert db.con.execute("select tags from cards where _id=?",
+                (card._id, )).fetchone()[0] == card.tag_string()
+        assert card_1.tag_string() == "a10, a11, B"
+        db.delete_tag(tag)
+        assert db.con.execute("select tags from cards where _id=?",
+            (card_2._id, )).fetchone()[0] == ""
+        # Cards having __UNTAGGED__ together with another tag.
+        untagged = db.get_or_create_tag_with_name("__UNTAGGED__")
+        db.con.execute("""insert into tags_for_card(_tag_id, _card_id)
+            values(?,?)""", (untagged._id, card_1._id))
+        db.save()
+        db.defragment()
+        assert db.con.execute("""select count() from tags_for_card where
+            _tag_id=?""", (untagged._id, )).fetchone()[0] == 1
+
     def test_empty_argument(self):
         assert self.database().tags_from_cards_with_internal_ids([]) == []
+        assert list(self.database().cards_with_ids([],
+            is_id_internal=True)) == []
+        assert list(self.database().facts_with_ids([],
+            is_id_internal=False)) == []
+
+    def test_cards_with_ids(self):
+        fact_data = {"f": "question",
+                     "p_1": "pronunciation",
+                     "m_1": "answer"}
+        card_type = self.card_type_with_id("3")
+        cards = self.controller().create_new_cards(fact_data, card_type,
+            grade=-1, tag_names=["a", "b"])
+        fact_data = {"f": "question2",
+                     "b": "answer2"}
+        card_type = self.card_type_with_id("1")
+        cards += self.controller().create_new_cards(fact_data, card_type,
+            grade=-1, tag_names=[])
+        self.database().max_batch_size = 2
+        _card_ids = [card._id for card in reversed(cards)] + [-1]
+        new_cards = list(self.database().cards_with_ids(_card_ids,
+            is_id_internal=True))
+        assert len(new_cards) == 3
+        for card, new_card in zip(reversed(cards), new_cards):
+            old_card = self.database().card(card._id, is_id_internal=True)
+            assert new_card == old_card
+            assert new_card.fact == old_card.fact
+            assert new_card.fact.data == old_card.fact.data
+            assert new_card.fact_view == old_card.fact_view
+            assert new_card.tag_string() == old_card.tag_string()
+            assert set(tag.id for tag in new_card.tags) == \
+                set(tag.id for tag in old_card.tags)
+            assert new_card.next_rep == old_card.next_rep
+            assert new_card.extra_data == old_card.extra_data
+        ids = [card.id for card in cards]
+        assert [card.id for card in self.database().cards_with_ids(ids,
+            is_id_internal=False)] == ids
+        fact_ids = [cards[2].fact.id, "unknown", cards[0].fact.id]
+        facts = list(self.database().facts_with_ids(fact_ids,
+            is_id_internal=False))
+        assert [fact.id for fact in facts] == [fact_ids[0], fact_ids[2]]
+        assert facts[0].data == {"f": "question2", "b": "answer2"}
+
+    def test_identity_map(self):
+        fact_data = {"f": "question",
+                     "b": "answer"}
+        card_type = self.card_type_with_id("1")
+        card = self.controller().create_new_cards(fact_data, card_type,
+            grade=-1, tag_names=["a"])[0]
+        db = self.database()
+        hits = db.object_cache_hits()
+        assert db.card(card._id, is_id_internal=True) is card
+        assert db.card(card.id, is_id_internal=False) is card
+        assert db.fact(card.fact._id, is_id_internal=True) is card.fact
+        assert db.object_cache_hits() == hits + 3
+        # Cards changed behind the object layer are reloaded.
+        tag = db.get_or_create_tag_with_name("b")
+        db.add_tag_to_cards_with_internal_ids(tag, [card._id])
+        new_card = db.card(card._id, is_id_internal=True)
+        assert new_card is not card
+        assert "b" in new_card.tag_string()
+        db.clear_object_caches()
+        assert db.card(card._id, is_id_internal=True) is not new_card
+        db.delete_card(new_card)
+        assert db.card_count() == 0
+        assert len(db._card_cache) == 0
+
+    def test_identity_map_eviction(self):
+        self.database()._card_cache.max_size = 2
+        card_type = self.card_type_with_id("1")
+        cards = []
+        for i in range(3):
+            fact_data = {"f": "question%d" % i,
+                         "b": "answer"}
+            cards += self.controller().create_new_cards(fact_data, card_type,
+                grade=-1, tag_names=[])
+        assert len(self.database()._card_cache) == 2
+        card = self.database().card(cards[0]._id, is_id_internal=True)
+        assert card is not cards[0]
+        assert card == cards[0]
+        assert self.database().card(cards[2]._id, \
+            is_id_internal=True) is cards[2]
+        assert self.database().card(cards[1].id, \
+            is_id_internal=False) is not cards[1]
 
     def test_clones(self):
         fact_data = {"f": "question",
@@ -335,6 +618,21 @@ class TestDatabase(MnemosyneTest):
         assert self.config()["last_database"] == new_name
         assert new_name != expand_path(new_name, self.config().data_dir)
 
+    def test_save_as_wal_mode(self):
+        self.config()["wal_mode"] = True
+        self.database().release_connection()
+        card_type = self.card_type_with_id("1")
+        for i in range(20):
+            self.controller().create_new_cards({"f": str(i), "b": "b"},
+                card_type, grade=-1, tag_names=["default"])
+        new_name = self.config()["last_database"] + ".bak"
+        self.database().save(new_name)
+        # The copy also contains what is still in the write-ahead log.
+        con = sqlite3.connect(expand_path(new_name, self.config().data_dir))
+        assert con.execute("select count() from cards").fetchone()[0] == 20
+        con.close()
+        self.database().release_connection()
+
     def test_duplicates_for_fact(self):
         fact_data = {"f": "question",
                      "b": "answer"}
@@ -427,6 +725,52 @@ class TestDatabase(MnemosyneTest):
         assert "default-0.db" not in backups
         self.restart()
 
+    def test_backup(self):
+        card_type = self.card_type_with_id("1")
+        self.controller().create_new_cards({"f": "1", "b": "b"}, card_type,
+            grade=-1, tag_names=["default"])
+        backup_1 = self.database().backup()
+        assert backup_1.endswith(".db.gz")
+        # Nothing changed, so no need for a new backup.
+        assert self.database().backup() == backup_1
+        self.controller().create_new_cards({"f": "2", "b": "b"}, card_type,
+            grade=-1, tag_names=["default"])
+        backup_2 = self.database().backup()
+        assert backup_2 != backup_1
+        backup_dir = os.path.join(self.config().data_dir, "backups")
+        assert len(os.listdir(backup_dir)) == 2
+        self.database().restore(backup_1)
+        assert self.database().card_count() == 1
+        # Older backups are not compressed.
+        old_backup = os.path.join(backup_dir, "default-old.db")
+        self.database().save()
+        shutil.copy(self.database().path(), old_backup)
+        self.database().restore(backup_2)
+        assert self.database().card_count() == 2
+        self.database().restore(old_backup)
+        assert self.database().card_count() == 1
+
+    def test_backup_in_background(self):
+        card_type = self.card_type_with_id("1")
+        self.controller().create_new_cards({"f": "1", "b": "b"}, card_type,
+            grade=-1, tag_names=["default"])
+        assert self.database().finish_backup() is None
+        assert self.database().backup(in_background=True) is None
+        backup_1 = self.database().finish_backup(wait=True)
+        assert backup_1.endswith(".db.gz")
+        assert self.database().finish_backup(wait=True) is None
+        assert self.database().backup() == backup_1
+        self.controller().create_new_cards({"f": "2", "b": "b"}, card_type,
+            grade=-1, tag_names=["default"])
+        self.database().backup(in_background=True)
+        backup_2 = self.database().finish_backup(wait=True)
+        assert backup_2 != backup_1
+        backup_dir = os.path.join(self.config().data_dir, "backups")
+        assert sorted(os.listdir(backup_dir)) == \
+            sorted([os.path.basename(backup_1), os.path.basename(backup_2)])
+        self.database().restore(backup_2)
+        assert self.database().card_count() == 2
+
     def test_link_inverse_cards(self):
         fact_data = {"f": "question",
                      "b": "answer"}
@@ -2,9 +2,55 @@
 # test_escape_to_html.py <Peter.Bienstman@UGent.be>
 #
 
+import random
+
 from mnemosyne.libmnemosyne.filters.escape_to_html import EscapeToHtml
 
 
+def reference_escape_to_html(text):
+
+    """The original, quadratic implementation."""
+
+    lower_text = text.lower()
+    linebreak_positions = []
+    escape_breaks = True
+    for i in range(len(text)):
+        for tag in ["ul", "table", "latex", "script", "textarea"]:
+            if lower_text[i:].startswith("<" + tag):
+                escape_breaks = False
+            if lower_text[i:].startswith("</" + tag):
+                escape_breaks = True
+        if (lower_text[i] == "\n" or lower_text[i] == "\r") \
+            and escape_breaks:
+            linebreak_positions.append(i)
+    for linebreak_position in linebreak_positions:
+        text = text[:linebreak_position] + text[linebreak_position:]\
+            .replace("\n", "<br>", 1).replace("\r", "<br>", 1)
+    hanging = []
+    open = 0
+    pending = 0
+    for i in range(len(text)):
+        if text[i] == "<":
+            if open != 0:
+                hanging.append(pending)
+                pending = i
+                continue
+            open += 1
+            pending = i
+        elif text[i] == ">":
+            if open > 0:
+                open -= 1
+    if open != 0:
+        hanging.append(pending)
+    new_text = ""
+    for i in range(len(text)):
+        if i in hanging:
+            new_text += "&lt;"
+        else:
+            new_text += text[i]
+    return new_text
+
+
 class TestEscapeToHtml:
 
     def test_1(self):
@@ -44,4 +90,21 @@ class TestEscapeToHtml:
         in_string = "<table>\n</table>"
         assert "<br>" not in EscapeToHtml(None).run(in_string, None, None)
         in_string = "<table></table>\n"
-        assert "<br>" in EscapeToHtml(None).run(in_string, None, None)
\ No newline at end of file
+        assert "<br>" in EscapeToHtml(None).run(in_string, None, None)
+
+    def test_same_as_reference(self):
+        in_strings = ["<1", "<1>", "a\nb", "<><", "<<>", "<latex>\n</latex>",
+            "<latex></latex>\n", "<ul>\n</ul>", "<ul></ul>\n",
+            "<table>\n</table>", "<table></table>\n", "a\r\nb\r\nc",
+            "a\r<latex>\n</latex>\nb", "\u0130\na\nb"]
+        pieces = ["a", "bc", " ", "<", ">", "\n", "\r", "\r\n", "<b>",
+            "</b>", "<latex>", "</latex>", "<UL>", "</ul>", "<table",
+            "</TABLE>", "<script>", "</script>", "<textarea>",
+            "</textarea>", "<$>", "\u0130", "<br>", "<<", ">>"]
+        rng = random.Random(0)
+        for i in range(2000):
+            in_strings.append("".join(rng.choice(pieces) \
+                for j in range(rng.randint(0, 40))))
+        for in_string in in_strings:
+            assert EscapeToHtml(None).run(in_string, None, None) == \
+                reference_escape_to_html(in_string), repr(in_string)
@@ -2,6 +2,8 @@
 # test_filter.py <Peter.Bienstman@UGent.be>
 #
 
+import os
+import sys
 import subprocess as sp
 
 from nose.tools import raises
@@ -100,3 +102,63 @@ class TestFilter(MnemosyneTest):
             # Should not raise an exception
             f._call_cmd(['dummy', 'cmd'],
                         'dot_test/default.db_media/latex_out.txt')
+
+    def set_latex_stubs(self, log_file):
+        # 'latex' copies its input to the dvi file, and logs its run.
+        # 'dvipng' copies the dvi file to the png file.
+        self.config()["latex"] = [sys.executable, "-c",
+            "import shutil, sys; sys.argv[1] == '-version' or " + \
+            "(shutil.copy(sys.argv[1], 'tmp.dvi'), " + \
+            "open(%r, 'a').write('x'))" % log_file]
+        self.config()["dvipng"] = [sys.executable, "-c",
+            "import shutil; shutil.copy('tmp.dvi', 'tmp1.png')"]
+
+    def test_latex_stub(self):
+        log_file = os.path.abspath(os.path.join("dot_test", "latex_runs"))
+        self.set_latex_stubs(log_file)
+        cwd = os.getcwd()
+        f = Latex(self.mnemosyne.component_manager)
+        text = "<$>x^2</$> <latex>a<b</latex> <$$>y</$$> <$>x^2</$>"
+        result = f.run(text, None, None)
+        assert os.getcwd() == cwd
+        assert result.count("<img src=\"_latex/") == 4
+        assert result.count("<center>") == 1
+        # The two identical formulas are only rendered once.
+        assert len(open(log_file).read()) == 3
+        latex_dir = os.path.join(os.path.abspath("dot_test"),
+            "default.db_media", "_latex")
+        img_names = os.listdir(latex_dir)
+        assert len(img_names) == 3
+        contents = "".join(open(os.path.join(latex_dir, img_name)).read() \
+            for img_name in img_names)
+        assert "$x^2$" in contents
+        assert "a<b" in contents
+        assert "\\begin{displaymath}y\\end{displaymath}" in contents
+        # Existing images are not rendered again.
+        f.run(text, None, None)
+        assert len(open(log_file).read()) == 3
+
+    def test_latex_batch(self):
+        log_file = os.path.abspath(os.path.join("dot_test", "latex_runs"))
+        self.set_latex_stubs(log_file)
+        card_type = self.card_type_with_id("1")
+        for i in range(10):
+            fact_data = {"f": "<$>x^%d</$>" % (i % 5),
+                         "b": "<latex>%d</latex>" % i}
+            self.controller().create_new_cards(fact_data, card_type,
+                grade=-1, tag_names=["default"], check_for_duplicates=False)
+        self.database().dynamically_create_media_files()
+        assert len(open(log_file).read()) == 15
+        f = Latex(self.mnemosyne.component_manager)
+        img_files = f.create_latex_img_files(["$x^0$", "$x^4$", "9"])
+        latex_dir = os.path.join(os.path.abspath("dot_test"),
+            "default.db_media")
+        for img_file in img_files.values():
+            assert os.path.exists(os.path.join(latex_dir, img_file))
+        assert len(open(log_file).read()) == 15
+        # Failing latex.
+        self.config()["dvipng"] = [sys.executable, "-c", "pass"]
+        img_files = f.create_latex_img_files(["$z$", "$w$"])
+        assert img_files == {"$z$": None, "$w$": None}
+        assert not [name for name in os.listdir(\
+            os.path.join(latex_dir, "_latex")) if name.startswith("tmp")]
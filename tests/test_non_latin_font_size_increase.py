@@ -2,9 +2,46 @@
 # test_non_latin_font_size_increase.py <Peter.Bienstman@UGent.be>
 #
 
+import random
+
 from mnemosyne_test import MnemosyneTest
 from mnemosyne.libmnemosyne.filters.escape_to_html import EscapeToHtml
 
+
+def reference_font_size_increase(filter, text, non_latin_size):
+
+    """The original, character by character implementation."""
+
+    new_text = ""
+    in_tag = False
+    in_protect = 0
+    in_unicode_substring = False
+    for i in range(len(text)):
+        if not filter.is_in_latin_plane(text[i]) and not in_protect:
+            if in_tag or in_unicode_substring == True:
+                new_text += text[i]
+            else:
+                in_unicode_substring = True
+                new_text += "<font style=\"font-size:" + \
+                    str(non_latin_size) + "pt\">" + text[i]
+        else:
+            if text[i] == "<":
+                in_tag = True
+            elif text[i] == ">":
+                in_tag = False
+            if text[i:].startswith("<protect>"):
+                in_protect += 1
+            elif text[i:].startswith("</protect>"):
+                in_protect = max(0, in_protect - 1)
+            if in_unicode_substring == True:
+                in_unicode_substring = False
+                new_text += "</font>" + text[i]
+            else:
+                new_text += text[i]
+    if not filter.is_in_latin_plane(text[-1]) and not in_protect:
+        new_text += "</font>"
+    return new_text.replace("<protect>", "").replace("</protect>", "")
+
     
 class TestNonLatinFontSizeIncrease(MnemosyneTest):
 
@@ -61,3 +98,23 @@ class TestNonLatinFontSizeIncrease(MnemosyneTest):
 
         self.config()["non_latin_font_size_increase"] = 2
         assert """<font style=\"font-size:14pt\">""" + chr(40960) + "</font>" in card.question()
+
+    def test_same_as_reference(self):
+        from mnemosyne.libmnemosyne.filters.non_latin_font_size_increase \
+             import NonLatinFontSizeIncrease
+        fact_data = {"f": "question",
+                     "b": "answer"}
+        card_type = self.card_type_with_id("1")
+        card = self.controller().create_new_cards(fact_data, card_type,
+                                              grade=-1, tag_names=[])[0]
+        self.config()["non_latin_font_size_increase"] = 2
+        filter = self.render_chain().filter(NonLatinFontSizeIncrease)
+        pieces = ["a", "bc", " ", "<", ">", "<b>", "</b>", "<protect>",
+            "</protect>", "<img src=\"", "\">", chr(40960), chr(0x4E2D),
+            chr(0x4FF), chr(0x1E00), chr(0x1F01), "\u00e9", "\u0410"]
+        rng = random.Random(0)
+        for i in range(2000):
+            text = "".join(rng.choice(pieces) \
+                for j in range(rng.randint(1, 30)))
+            assert filter.run(text, card, "f") == \
+                reference_font_size_increase(filter, text, 14), repr(text)
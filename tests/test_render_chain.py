@@ -3,6 +3,7 @@
 #
 
 import os
+import sys
 
 from mnemosyne_test import MnemosyneTest
 from mnemosyne.libmnemosyne.filter import Filter
@@ -132,6 +133,11 @@ class TestRenderChain(MnemosyneTest):
         self.render_chain().unregister_renderer(type(1))
 
     def test_latex(self):
+        # Stub 'latex' and 'dvipng' which copy the input to the image.
+        self.config()["latex"] = [sys.executable, "-c",
+            "import shutil, sys; shutil.copy(sys.argv[1], 'tmp.dvi')"]
+        self.config()["dvipng"] = [sys.executable, "-c",
+            "import shutil; shutil.copy('tmp.dvi', 'tmp1.png')"]
         fact_data = {"f": "<latex>1<2</latex>",
                      "b": "answer"}
         card_type_1 = self.card_type_with_id("1")
@@ -139,8 +145,121 @@ class TestRenderChain(MnemosyneTest):
             grade=-1, tag_names=["default"])[0]
         card.question()
 
-        filename = os.path.join(os.path.abspath("dot_test"),
-            "default.db_media", "_latex", "tmp.tex")
+        latex_dir = os.path.join(os.path.abspath("dot_test"),
+            "default.db_media", "_latex")
+        filename = os.path.join(latex_dir, os.listdir(latex_dir)[0])
         contents = "".join(open(filename).readlines())
         assert '<' in contents
         assert "&lt;" not in contents
+
+    def test_cache(self):
+        fact_data = {"f": "question",
+                     "b": "answer"}
+        card_type_1 = self.card_type_with_id("1")
+        card = self.controller().create_new_cards(fact_data, card_type_1,
+            grade=-1, tag_names=["default"])[0]
+        render_chain = self.render_chain()
+        hits = render_chain.cache_hits
+        question = card.question()
+        assert card.question() == question
+        assert render_chain.cache_hits == hits + 1
+        # Editing the fact changes the key.
+        fact_data = {"f": "new question",
+                     "b": "answer"}
+        self.controller().edit_card_and_sisters(card, fact_data,
+            card_type_1, ["default"], {})
+        assert "new question" in card.question()
+        # Changing the configuration invalidates the cache.
+
+        class ConfigFilter(Filter):
+            def run(self, text, card, fact_key, **render_args):
+                return text + "_%d" % self.config()["day_starts_at"]
+
+        render_chain.register_filter(ConfigFilter)
+        assert "question_3" in card.question()
+        self.config()["day_starts_at"] = 4
+        assert "question_4" in card.question()
+        render_chain.unregister_filter(ConfigFilter)
+        assert render_chain.cache_hit_rate() > 0
+
+        class MyFilter(Filter):
+            has_side_effects = True
+            runs = 0
+            def run(self, text, card, fact_key, **render_args):
+                if not render_args.get("no_side_effects", False):
+                    MyFilter.runs += 1
+                return text
+
+        render_chain.register_filter(MyFilter)
+        card.question()
+        card.question()
+        assert MyFilter.runs == 2
+        hits = render_chain.cache_hits
+        card.question(no_side_effects=True)
+        card.question(no_side_effects=True)
+        assert render_chain.cache_hits == hits + 1
+        render_chain.unregister_filter(MyFilter)
+
+    def test_pipeline(self):
+        card_type_1 = self.card_type_with_id("1")
+        render_chain = self.render_chain()
+        renderer, filters, side_effects = \
+            render_chain.pipeline_for_card_type(card_type_1)
+        assert render_chain.pipeline_for_card_type(card_type_1) \
+               is render_chain.pipeline_for_card_type(card_type_1)
+        assert list(filters) == render_chain._filters
+
+        class MyRenderer(Renderer):
+            used_for = card_type_1
+            def render(self, fact_data, fields, card_type, **render_args):
+                return "666"
+
+        # A clone uses the renderer of its parent.
+        card_type_1_clone = self.controller().clone_card_type(\
+            card_type_1, "1 clone")
+        assert render_chain.renderer_for_card_type(card_type_1_clone) \
+               is renderer
+        render_chain.register_renderer(MyRenderer)
+        assert isinstance(render_chain.renderer_for_card_type(\
+            card_type_1_clone), MyRenderer)
+        render_chain.unregister_renderer(MyRenderer)
+        assert render_chain.renderer_for_card_type(card_type_1_clone) \
+               is renderer
+
+        class MyFilter(Filter):
+            has_side_effects = True
+            def run(self, text, card, fact_key, **render_args):
+                return text
+
+        render_chain.register_filter(MyFilter)
+        renderer, filters, side_effects = \
+            render_chain.pipeline_for_card_type(card_type_1)
+        assert isinstance(filters[-1], MyFilter)
+        assert side_effects == True
+        render_chain.unregister_filter(MyFilter)
+        assert render_chain.pipeline_for_card_type(card_type_1)[2] == False
+        # Registering components, e.g. card types, invalidates the table.
+        pipeline = render_chain.pipeline_for_card_type(card_type_1)
+        self.controller().clone_card_type(card_type_1, "1 clone 2")
+        assert render_chain.pipeline_for_card_type(card_type_1) \
+               is not pipeline
+
+    def test_rename_card_type(self):
+        card_type_1 = self.card_type_with_id("1")
+        card_type = self.controller().clone_card_type(card_type_1, "name")
+
+        class NameRenderer(Renderer):
+            used_for = card_type
+            def render(self, fact_data, fields, card_type, **render_args):
+                return card_type.name
+
+        render_chain = self.render_chain()
+        render_chain.register_renderer(NameRenderer)
+        card = self.controller().create_new_cards({"f": "f", "b": "b"},
+            card_type, grade=-1, tag_names=["default"])[0]
+        assert card.question() == "name"
+        # Renaming does not change the fact data or the configuration, but
+        # it registers the card type again.
+        self.controller().rename_card_type(card_type, "new name")
+        assert card.question() == "new name"
+        render_chain.unregister_renderer(NameRenderer)
@@ -11,6 +11,9 @@ from mnemosyne.libmnemosyne import Mnemosyne
 from mnemosyne.libmnemosyne.criteria.default_criterion import DefaultCriterion
 from mnemosyne.libmnemosyne.ui_components.review_widget import ReviewWidget
 
+HOUR = 60 * 60 # Seconds in an hour.
+DAY = 24 * HOUR # Seconds in a day.
+
 expected_scheduled_count = None
 
 class MyReviewWidget(ReviewWidget):
@@ -177,3 +180,32 @@ class TestReviewController(MnemosyneTest):
         self.review_controller().grade_answer(3)
         assert self.review_controller().scheduled_count == 3
         assert self.review_controller().counters()[0] == 3
+
+    def test_interval_previews(self):
+        card_type = self.card_type_with_id("1")
+        fact_data = {"f": "1", "b": "b"}
+        card = self.controller().create_new_cards(fact_data, card_type,
+            grade=4, tag_names=[])[0]
+        card.next_rep = 0
+        card.ret_reps_since_lapse = 2
+        self.database().update_card(card)
+        sch = self.scheduler()
+        previews = sch.interval_previews(card)
+        assert previews == [sch.grade_answer(card, grade, dry_run=True) \
+            for grade in range(0, 6)]
+        assert previews[0] == 0
+        assert sch.interval_previews(card) is previews
+        # Showing the card again later changes the actual interval.
+        sch.stopwatch().start_time = card.last_rep + 20 * DAY
+        later_previews = sch.interval_previews(card)
+        assert later_previews is not previews
+        assert later_previews == [sch.grade_answer(card, grade, \
+            dry_run=True) for grade in range(0, 6)]
+        assert later_previews[5] > previews[5]
+        sch.stopwatch().start()
+        for show_intervals in ["tooltips", "buttons"]:
+            self.config()["show_intervals"] = show_intervals
+            self.review_controller().show_new_question()
+            self.review_controller().show_answer()
+            self.review_controller().grade_answer(5)
+        assert sch.interval_previews(card) is not previews
@@ -8,6 +8,7 @@ import time
 import datetime
 import calendar
 from mnemosyne_test import MnemosyneTest
+from mnemosyne.libmnemosyne.schedulers.card_queue import CardQueue
 
 HOUR = 60 * 60 # Seconds in an hour.
 DAY = 24 * HOUR # Seconds in a day.
@@ -615,7 +616,8 @@ class TestScheduler(MnemosyneTest):
         card_1 = self.controller().create_new_cards(fact_data, card_type,
                                               grade=-1, tag_names=["default"])[0]
 
-        self.scheduler()._card_ids_in_queue = [card_0._id, card_1._id, card_1._id]
+        self.scheduler()._card_ids_in_queue = \
+            CardQueue([card_0._id, card_1._id, card_1._id])
         assert self.scheduler().is_prefetch_allowed(card_to_grade=card_0) == False
 
     def test_prefetch_2(self):
@@ -629,7 +631,8 @@ class TestScheduler(MnemosyneTest):
         card_1 = self.controller().create_new_cards(fact_data, card_type,
                                               grade=-1, tag_names=["default"])[0]
 
-        self.scheduler()._card_ids_in_queue = [card_0._id, card_1._id, card_0._id]
+        self.scheduler()._card_ids_in_queue = \
+            CardQueue([card_0._id, card_1._id, card_0._id])
         self.review_controller().show_new_question()
         self.review_controller().show_answer()
         self.review_controller().grade_answer(0)
@@ -762,3 +765,108 @@ class TestScheduler(MnemosyneTest):
             self.review_controller().grade_answer(0)
 
         assert len(showed_cards) == 4
+
+    def test_refill_size(self):
+        card_type = self.card_type_with_id("1")
+        for i in range(120):
+            fact_data = {"f": str(i), "b": "b"}
+            card = self.controller().create_new_cards(fact_data, card_type,
+                     grade=5, tag_names=["default"])[0]
+            card.next_rep = 0
+            self.database().update_card(card)
+        sch = self.scheduler()
+        sch.reset()
+        # The number of cards fetched grows while the queue keeps running
+        # out in the same stage.
+        for queue_length in [50, 100, 120, 120]:
+            sch._card_ids_in_queue = CardQueue()
+            sch._fact_ids_in_queue = set()
+            sch.rebuild_queue()
+            assert len(sch._card_ids_in_queue) == queue_length
+        assert sch._refill_size == sch.max_refill_size
+        sch.reset()
+        sch.rebuild_queue()
+        assert len(sch._card_ids_in_queue) == 50
+
+    def test_card_queue(self):
+        queue = CardQueue([1, 2, 1, 3])
+        assert len(queue) == 4
+        assert 1 in queue
+        queue.remove(1)
+        assert list(queue) == [2, 1, 3]
+        assert queue.first() == 2
+        queue.append(2)
+        queue.remove_all(2)
+        assert 2 not in queue
+        assert list(queue) == [1, 3]
+        assert queue.pop_first() == 1
+        assert 1 not in queue
+        assert queue.distinct_card_ids() == set([3])
+        queue.shuffle()
+        assert list(queue) == [3]
+        try:
+            queue.remove(1)
+            assert False
+        except ValueError:
+            pass
+
+    def test_avoid_sister_cards(self):
+        import random
+        from mnemosyne.libmnemosyne.card_types.cloze import ClozePlugin
+        for plugin in self.plugins():
+            if isinstance(plugin, ClozePlugin):
+                plugin.activate()
+                break
+        card_type = self.card_type_with_id("5")
+        fact_data = {"text": "[a] [b] [c] [d] [e] [f]"}
+        cards = self.controller().create_new_cards(fact_data, card_type,
+                     grade=-1, tag_names=["default"])
+        assert len(cards) == 6
+        card = cards[0]
+        db = self.database()
+        now = self.scheduler().midnight_UTC(int(time.time()))
+        random.seed(0)
+        for i in range(100):
+            for sister_card in cards[1:]:
+                sister_card.grade = random.choice([-1, 0, 2, 3, 5])
+                sister_card.active = random.random() < 0.8
+                sister_card.next_rep = now + random.randint(0, 6) * DAY \
+                    + random.choice([0, 0, HOUR, -HOUR])
+                db.update_card(sister_card)
+            next_rep = now + random.randint(-1, 4) * DAY
+            # Reference: the original day by day algorithm.
+            expected = next_rep
+            while db.sister_card_count_scheduled_between(\
+                card, expected, expected + DAY):
+                expected += DAY
+            card.next_rep = next_rep
+            self.scheduler().avoid_sister_cards(card)
+            assert card.next_rep == expected
+
+    def test_clock(self):
+        from mnemosyne.libmnemosyne.clock import Clock
+
+        class FakeClock(Clock):
+
+            def time(self):
+                return 1325419200 # 2012/1/1 12:00 UTC.
+
+        clock = FakeClock(self.mnemosyne.component_manager)
+        self.mnemosyne.component_manager.register(clock)
+        assert self.scheduler().clock() == clock
+        card_type = self.card_type_with_id("1")
+        fact_data = {"f": "1", "b": "b"}
+        card = self.controller().create_new_cards(fact_data, card_type,
+            grade=-1, tag_names=["default"])[0]
+        self.scheduler().grade_answer(card, 2)
+        assert card.last_rep == 1325419200
+        assert self.scheduler().adjusted_now() == \
+            self.scheduler().adjusted_now(1325419200)
+        for i in range(0, 400 * DAY, 7 * HOUR):
+            timestamp = 1325419200 + i
+            assert clock.offset_west_of_UTC(timestamp) == \
+                clock._uncached_offset_west_of_UTC(timestamp)
+        clock.invalidate()
+        assert clock.offset_west_of_UTC() == \
+            clock._uncached_offset_west_of_UTC(1325419200)
+        self.mnemosyne.component_manager.unregister(clock)
@@ -0,0 +1,99 @@
+#
+# test_serialization.py <Peter.Bienstman@UGent.be>
+#
+
+import os
+import sqlite3
+
+from nose.tools import raises
+
+from mnemosyne_test import MnemosyneTest
+from mnemosyne.libmnemosyne.serialization import serialize, deserialize
+from mnemosyne.libmnemosyne.serialization import is_serialized
+
+
+class TestSerialization(MnemosyneTest):
+
+    def test_round_trip(self):
+        for data in [{}, {"a": 1, "b": [1.5, None, True]}, {1: "x", 2: "y"},
+            (set(), {2, 4}, {("5", "5.1")}), [("f", "Front"), ("b", "Back")],
+            {"!t": 1}, b"\x00\xff", "", 0]:
+            data_string = serialize(data)
+            assert is_serialized(data_string)
+            assert deserialize(data_string) == data
+            assert type(deserialize(data_string)) == type(data)
+
+    def test_sets_are_sorted(self):
+        assert serialize({3, 1, 2}) == serialize({2, 3, 1})
+
+    def test_legacy(self):
+        assert deserialize("(set(), {2}, {('5', '5.1')})") == \
+            (set(), {2}, {("5", "5.1")})
+        assert deserialize("{u'a': 12L}") == {"a": 12}
+        assert deserialize("(set([]), set([1]), set([(u'1', u'1.1')]))") == \
+            (set(), {1}, {("1", "1.1")})
+        assert deserialize("PyQt5.QtCore.QByteArray(b'\\x01\\xd9')") == \
+            b"\x01\xd9"
+        assert not is_serialized("[1, 2]")
+
+    @raises(ValueError)
+    def test_no_code_execution(self):
+        deserialize("__import__('os').getcwd()")
+
+    def test_upgrade(self):
+        card_type = self.card_type_with_id("1")
+        card_type = self.controller().clone_card_type(card_type, "my_1")
+        fact_data = {"f": "question", "b": "answer"}
+        card = self.controller().create_new_cards(fact_data, card_type,
+            grade=-1, tag_names=["default"])[0]
+        card.extra_data = {"a": (1, 2)}
+        self.database().update_card(card)
+        fact_view_ids = [fact_view.id for fact_view in card_type.fact_views]
+        filename = self.database().path()
+        self.mnemosyne.finalise()
+        # Store everything as an older version would have done.
+        con = sqlite3.connect(filename)
+        con.execute("update cards set extra_data=?",
+            (repr(card.extra_data), ))
+        con.execute("""update card_types set fact_keys_and_names=?,
+            fact_view_ids=?""", (repr(card_type.fact_keys_and_names),
+            repr(fact_view_ids)))
+        con.execute("update criteria set data=?",
+            (repr((set(), {2}, set())), ))
+        con.execute("update global_variables set value=? where key=?",
+            ("4", "version"))
+        con.commit()
+        con.close()
+        self.restart()
+        con = self.database().con
+        for table, column in [("cards", "extra_data"),
+            ("card_types", "fact_keys_and_names"),
+            ("card_types", "fact_view_ids"), ("fact_views", "q_fact_keys"),
+            ("criteria", "data")]:
+            for cursor in con.execute("select %s from %s" % (column, table)):
+                assert is_serialized(cursor[0])
+        assert con.execute("""select value from global_variables where
+            key=?""", ("version", )).fetchone()[0] == "5"
+        card = self.database().card(card._id, is_id_internal=True)
+        assert card.extra_data == {"a": (1, 2)}
+        card_type = self.card_type_with_id("1::my_1")
+        assert card_type.fact_keys_and_names == \
+            self.card_type_with_id("1").fact_keys_and_names
+        assert len(card_type.fact_views) == 1
+        assert self.database().current_criterion()._tag_ids_active == {2}
+
+    def test_config_upgrade(self):
+        self.config()["font"] = {"1": {"f": "Arial"}}
+        self.config().save()
+        filename = os.path.join(self.config().config_dir, "config.db")
+        con = sqlite3.connect(filename)
+        con.execute("update config set value=? where key=?",
+            (repr({"1": {"f": "Arial"}}), "font"))
+        con.commit()
+        con.close()
+        self.restart()
+        assert self.config()["font"] == {"1": {"f": "Arial"}}
+        con = sqlite3.connect(filename)
+        assert is_serialized(con.execute("select value from config where key=?",
+            ("font", )).fetchone()[0])
+        con.close()
@@ -94,6 +94,30 @@ class TestStatistics(MnemosyneTest):
         for i in range(1, 11):
             page.prepare_statistics(i)
 
+    def test_schedule_forecast(self):
+        card_type = self.card_type_with_id("1")
+        now = self.scheduler().adjusted_now()
+        for i in range(40):
+            fact_data = {"f": str(i), "b": "b"}
+            card = self.controller().create_new_cards(fact_data, card_type,
+                grade=-1, tag_names=["default"])[0]
+            card.grade = i % 5
+            card.active = (i % 7 != 0)
+            card.next_rep = now + (i % 12 - 2) * DAY + (i % 3) * HOUR
+            self.database().update_card(card)
+        days = list(range(-3, 11))
+        counts = [self.scheduler().card_count_scheduled_n_days_from_now(n) \
+            for n in days]
+        assert sum(counts) != 0
+        assert self.scheduler().card_counts_scheduled_n_days_from_now(days) \
+            == counts
+        assert self.scheduler().card_counts_scheduled_n_days_from_now(\
+            [5, 3, 9]) == [counts[8], counts[6], counts[12]]
+        assert self.scheduler().scheduled_non_memorised_and_active_count() \
+            == (self.scheduler().scheduled_count(),
+                self.scheduler().non_memorised_count(),
+                self.scheduler().active_count())
+
     @raises(AttributeError)
     def test_schedule_page_2(self):
         from mnemosyne.libmnemosyne.statistics_pages.schedule import Schedule
@@ -19,6 +19,7 @@ from mnemosyne_test import MnemosyneTest
 
 from mnemosyne.libmnemosyne import Mnemosyne
 from mnemosyne.libmnemosyne.fact import Fact
+from mnemosyne.libmnemosyne.serialization import serialize
 from mnemosyne.libmnemosyne.ui_components.main_widget import MainWidget
 from mnemosyne.libmnemosyne.criteria.default_criterion import DefaultCriterion
 
@@ -1432,7 +1433,7 @@ class TestSync(object):
         assert card.easiness == 2.5
 
         criterion = self.client.database.criterion(id=2, is_id_internal=True)
-        assert criterion.data_to_string() == "(set(), {2}, set())"
+        assert criterion.data_to_string() == serialize((set(), {2}, set()))
         assert criterion.name == "Deck 1"
         assert len(list(self.client.database.criteria())) == 3
 
@@ -2672,7 +2673,7 @@ class TestSync(object):
             db = self.mnemosyne.database()
             criterion = db.criterion(self.criterion_id,
                 is_id_internal=False)
-            assert criterion.data_to_string() == "(set(), {2, 4}, set())"
+            assert criterion.data_to_string() == serialize((set(), {2, 4}, set()))
 
         self.server = MyServer()
         self.server.test_server = test_server
@@ -2716,7 +2717,7 @@ class TestSync(object):
             db = self.mnemosyne.database()
             criterion = db.criterion(self.criterion_id,
                 is_id_internal=False)
-            assert criterion.data_to_string() == "(set(), {2, 4}, {3})"
+            assert criterion.data_to_string() == serialize((set(), {2, 4}, {3}))
 
         self.server = MyServer()
         self.server.test_server = test_server
@@ -2762,7 +2763,7 @@ class TestSync(object):
             db = self.mnemosyne.database()
             criterion = db.criterion(self.criterion_id,
                 is_id_internal=False)
-            assert criterion.data_to_string() == "(set(), {2}, {3, 4})"
+            assert criterion.data_to_string() == serialize((set(), {2}, {3, 4}))
 
         self.server = MyServer()
         self.server.test_server = test_server
@@ -2809,7 +2810,7 @@ class TestSync(object):
             db = self.mnemosyne.database()
             criterion = db.criterion(self.criterion_id,
                 is_id_internal=False)
-            assert criterion.data_to_string() == "(set(), {2}, set())"
+            assert criterion.data_to_string() == serialize((set(), {2}, set()))
 
         self.server = MyServer()
         self.server.test_server = test_server
@@ -2853,7 +2854,7 @@ class TestSync(object):
             db = self.mnemosyne.database()
             criterion = db.criterion(self.criterion_id,
                 is_id_internal=False)
-            assert criterion.data_to_string() == "(set(), {2}, set())"
+            assert criterion.data_to_string() == serialize((set(), {2}, set()))
 
         self.server = MyServer()
         self.server.test_server = test_server
@@ -2895,7 +2896,7 @@ class TestSync(object):
             db = self.mnemosyne.database()
             criterion = db.criterion(self.criterion_id,
                 is_id_internal=False)
-            assert criterion.data_to_string() == "({('1::1 cloned', '1::1 cloned.1')}, {2}, set())"
+            assert criterion.data_to_string() == serialize(({('1::1 cloned', '1::1 cloned.1')}, {2}, set()))
 
         self.server = MyServer()
         self.server.test_server = test_server
@@ -2962,7 +2963,7 @@ class TestSync(object):
             db = self.mnemosyne.database()
             criterion = db.criterion(self.criterion_id,
                 is_id_internal=False)
-            assert criterion.data_to_string() == "({('5', '5.1')}, {3}, {4})"
+            assert criterion.data_to_string() == serialize(({('5', '5.1')}, {3}, {4}))
 
         self.server = MyServer()
         self.server.test_server = test_server
@@ -3016,7 +3017,7 @@ class TestSync(object):
             criterion = db.criterion(self.criterion_id,
                 is_id_internal=False)
             print (criterion.data_to_string())
-            assert criterion.data_to_string() == "({('5', '5.1')}, {3}, set())"
+            assert criterion.data_to_string() == serialize(({('5', '5.1')}, {3}, set()))
 
         self.server = MyServer()
         self.server.test_server = test_server
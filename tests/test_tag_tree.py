@@ -362,3 +362,49 @@ class TestTagTree(MnemosyneTest):
         self.tree = TagTree(self.mnemosyne.component_manager)
         self.tree.delete_subtree("forbidden")
         assert self.database().active_count() == 1
+
+    def test_count_3(self):
+        card_type = self.card_type_with_id("2")
+        tag_names = [["a"], ["a::b", "a::c::d"], ["a:::b"], [],
+            ["a::b::c", "z"], ["a::c"], ["a::c::d", "a::c::e"]]
+        for i, names in enumerate(tag_names):
+            fact_data = {"f": str(i), "b": "b"}
+            self.controller().create_new_cards(fact_data, card_type,
+                grade=-1, tag_names=names)
+        from mnemosyne.libmnemosyne.tag_tree import TagTree
+        self.tree = TagTree(self.mnemosyne.component_manager)
+        assert sorted(self.tree["__ALL__"]) == ["__UNTAGGED__", "a", "z"]
+        assert sorted(self.tree["a"]) == \
+            ["a:::b", "a::Untagged", "a::b", "a::c"]
+        assert self.tree.card_count_for_node["__ALL__"] == 14
+        # Compare to counting each node separately.
+        for node in self.tree.nodes():
+            assert self.tree.card_count_for_node[node] == \
+                self.database().card_count_for_tags(\
+                self.tree.tags_in_subtree(node), active_only=False)
+        assert self.tree.card_count_for_node["a"] == 12
+        assert self.tree.card_count_for_node["a::b"] == 4
+
+    def test_subtree_log_entries(self):
+        from openSM2sync.log_entry import EventTypes
+        card_type = self.card_type_with_id("1")
+        for i, tag_names in enumerate([["a::b", "z"], ["a::c"], ["a::c::d"]]):
+            fact_data = {"f": str(i), "b": "b"}
+            self.controller().create_new_cards(fact_data, card_type,
+                grade=-1, tag_names=tag_names)
+        from mnemosyne.libmnemosyne.tag_tree import TagTree
+        self.tree = TagTree(self.mnemosyne.component_manager)
+        con = self.database().con
+        log_count = lambda event_type: con.execute(\
+            "select count() from log where event_type=?",
+            (event_type, )).fetchone()[0]
+        self.tree.rename_node("a", "x")
+        assert log_count(EventTypes.EDITED_TAG) == 3
+        assert sorted(cursor[0] for cursor in con.execute(\
+            "select tags from cards")) == ["x::b, z", "x::c", "x::c::d"]
+        self.tree.delete_subtree("x")
+        assert log_count(EventTypes.DELETED_TAG) == 3
+        assert sorted(cursor[0] for cursor in con.execute(\
+            "select tags from cards")) == ["", "", "z"]
+        assert self.tree.card_count_for_node["__UNTAGGED__"] == 2
+        assert self.tree.card_count_for_node["z"] == 1